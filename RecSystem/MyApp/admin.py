@@ -2,9 +2,23 @@ from django.contrib import admin
 
 # Register your models here.
 from django.contrib import admin
-from .models import UserProfile
+from .models import UserProfile, DatafileAlias
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('username', 'office_email' )
     search_fields = ('username', 'office_email')
+
+
+@admin.register(DatafileAlias)
+class DatafileAliasAdmin(admin.ModelAdmin):
+    list_display = ('name_clean', 'matched_datafile', 'score', 'is_override', 'master_version', 'updated_at')
+    list_filter = ('is_override',)
+    search_fields = ('name_clean', 'matched_datafile')
+    readonly_fields = ('score', 'master_version', 'updated_at')
+
+    def save_model(self, request, obj, form, change):
+        # A hand-edited match is pinned so re-matching against a new master never replaces it
+        if 'matched_datafile' in form.changed_data:
+            obj.is_override = True
+        super().save_model(request, obj, form, change)
@@ -0,0 +1,99 @@
+import logging
+from typing import Callable, Dict, Iterable, Tuple
+
+from django.db import DatabaseError, transaction
+from django.db.models import Count, Max
+
+from .metrics import cache_lookup
+from .models import DatafileAlias
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Datafile alias store----------------
+# -----------------------------------------------------------------------------------------------------
+# The distinct report datafile names barely change from day to day, so their fuzzy matches are kept
+# in the DatafileAlias table. An entry is reused while it was computed against the current master
+# version (sha256 of the workbook) or is a manual override from the admin; everything else is
+# re-matched and written back.
+# Stores built from these matches (the report store's names, the rollups) also key on
+# overrides_version(), so an admin edit reaches names that were matched before it.
+
+# Stay well below SQLite's bound-parameter limit for IN (...) lookups
+LOOKUP_BATCH = 500
+
+Match = Tuple[str, float, bool]  # (matched_datafile, score, is_override)
+
+
+def _batches(items, size=LOOKUP_BATCH):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def load_aliases(names: Iterable[str], master_version: str) -> Dict[str, Match]:
+    """Return the still-valid stored matches for `names`."""
+    names = list(names)
+    known = {}
+    for batch in _batches(names):
+        rows = DatafileAlias.objects.filter(name_clean__in=batch).values_list(
+            'name_clean', 'matched_datafile', 'score', 'master_version', 'is_override'
+        )
+        for name, matched, score, version, is_override in rows:
+            if is_override or version == master_version:
+                known[name] = (matched, score, is_override)
+    return known
+
+
+def overrides_version() -> str:
+    """Changes whenever an admin override is added, edited, removed or turned off."""
+    try:
+        state = DatafileAlias.objects.filter(is_override=True).aggregate(count=Count('id'), last=Max('updated_at'))
+    except DatabaseError:
+        return ''
+    return f"{state['count']}:{state['last'].isoformat() if state['last'] else ''}"
+
+
+def save_aliases(matches: Dict[str, Tuple[str, float]], master_version: str) -> None:
+    if not matches:
+        return
+    objs = [
+        DatafileAlias(name_clean=name, matched_datafile=matched, score=score, master_version=master_version)
+        for name, (matched, score) in matches.items()
+    ]
+    with transaction.atomic():
+        # Overrides are never part of `matches`, so stale automatic rows are the only ones replaced
+        DatafileAlias.objects.bulk_create(
+            objs,
+            batch_size=LOOKUP_BATCH,
+            update_conflicts=True,
+            unique_fields=['name_clean'],
+            update_fields=['matched_datafile', 'score', 'master_version', 'updated_at'],
+        )
+
+
+def resolve_matches(names: Iterable[str], master_version: str,
+                    match_new: Callable[[list], Dict[str, Tuple[str, float]]]) -> Dict[str, Match]:
+    """Match each distinct name, running `match_new` only on names without a valid stored alias.
+
+    `match_new` takes a list of names and returns {name: (best_match, score)}.
+    """
+    names = list(dict.fromkeys(names))
+    try:
+        known = load_aliases(names, master_version)
+    except DatabaseError:
+        # e.g. migrations not applied yet: match everything, nothing is persisted
+        logger.warning("Datafile alias table unavailable; matching all names", exc_info=True)
+        return {name: (*match, False) for name, match in match_new(names).items()}
+
+    unseen = [name for name in names if name not in known]
+    cache_lookup('alias', hit=True, count=len(names) - len(unseen))
+    cache_lookup('alias', hit=False, count=len(unseen))
+    if unseen:
+        new_matches = match_new(unseen)
+        try:
+            save_aliases(new_matches, master_version)
+        except DatabaseError:
+            logger.warning("Could not store datafile aliases", exc_info=True)
+        known.update({name: (*match, False) for name, match in new_matches.items()})
+    return known
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+import tempfile
+from functools import wraps
+
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+
+from . import engine
+from .engine import config
+from .result_cache import result_key
+from .views import TOO_SLOW, result_cache
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------JSON API and exports----------------
+# -----------------------------------------------------------------------------------------------------
+# JSON endpoints next to the recommendations, unused datafiles and best files pages, answered by the
+# same query functions as the pages. Lists are paginated with an opaque cursor (data version + offset),
+# so a client paging through a result never mixes two data versions.
+# The export endpoints stream CSV in chunks, or build an .xlsx with openpyxl's write-only workbook.
+# Like the pages they are async views: the snapshot and the result frame are awaited on
+# engine.offload's pools within request_deadline, and the frame is kept in the pages' result cache
+# under its filters (paging and format aside), so paging through a result computes it once.
+# pandas is imported inside the functions (annotations are strings), so loading urls stays cheap.
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+CSV_CHUNK_ROWS = 5000
+
+
+class BadRequest(ValueError):
+    status = 400
+
+
+class NotFound(BadRequest):
+    status = 404
+
+
+class StaleCursor(BadRequest):
+    status = 409
+
+
+# Query parameters that page or format a result without changing it
+PRESENTATION_PARAMS = {'cursor', 'page_size', 'format'}
+
+
+def _login_required(view):
+    # Same check as the home page: the custom session login
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not await request.session.aget('username'):
+            return JsonResponse({'error': 'Please log in first.'}, status=401)
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def _result(build, request, deadline):
+    """(snapshot, (rows, summary fields)) of `build` for the request's filters."""
+    if not config.master_path or not config.report_url or not config.campaign_url:
+        raise BadRequest('Report/Campaign URL or master data file not configured in .env.')
+    snapshot = await engine.offload.snapshot(deadline)
+    params = {name: request.GET.get(name) for name in request.GET if name not in PRESENTATION_PARAMS}
+    key = result_key(build.__name__, snapshot.data_version, params)
+    result = await engine.offload.cached(
+        result_cache, key, snapshot.data_version, lambda: build(snapshot, params), deadline)
+    return snapshot, result
+
+
+def _int_param(params, name, default, minimum=0):
+    try:
+        value = int(params.get(name, default))
+    except (TypeError, ValueError):
+        raise BadRequest(f"'{name}' must be an integer.")
+    if value < minimum:
+        raise BadRequest(f"'{name}' must be at least {minimum}.")
+    return value
+
+
+# ----- cursor pagination -----
+def encode_cursor(version: str, offset: int) -> str:
+    raw = json.dumps({'v': version, 'o': offset}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return str(data['v']), int(data['o'])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise BadRequest('Invalid cursor.')
+
+
+def records(frame: pd.DataFrame) -> list:
+    # NaN -> null, timestamps -> ISO strings, numpy scalars -> JSON numbers
+    return json.loads(frame.to_json(orient='records', date_format='iso', double_precision=15))
+
+
+def paginate(request, frame: pd.DataFrame, version: str) -> dict:
+    page_size = min(_int_param(request.GET, 'page_size', DEFAULT_PAGE_SIZE, minimum=1), MAX_PAGE_SIZE)
+    offset = 0
+    cursor = request.GET.get('cursor')
+    if cursor:
+        cursor_version, offset = decode_cursor(cursor)
+        if cursor_version != version:
+            raise StaleCursor('The data changed since this cursor was issued; start again without a cursor.')
+    end = offset + page_size
+    return {
+        'data_version': version,
+        'count': len(frame),
+        'results': records(frame.iloc[offset:end]),
+        'next_cursor': encode_cursor(version, end) if end < len(frame) else None,
+    }
+
+
+# ----- result frames: (rows, summary fields) -----
+def recommendation_frame(snapshot, params):
+    min_engagement_str = params.get('min_engagement', '')
+    try:
+        min_engagement = float(min_engagement_str) / 100 if min_engagement_str else 0
+    except ValueError:
+        raise BadRequest("'min_engagement' must be a number.")
+    sort_by = params.get('sort_by', 'revenue')
+    if sort_by not in ('revenue', 'epc', 'cpm', 'performance'):
+        raise BadRequest("'sort_by' must be one of revenue, epc, cpm, performance.")
+    grouped_files, _ = engine.queries.query_recommendations(
+        snapshot,
+        campaign_name=params.get('campaign_name', '').lower().strip(),
+        min_engagement=min_engagement,
+        sort_by=sort_by,
+        limit=_int_param(params, 'limit', 10, minimum=1),
+    )
+    # One row per recommended file, campaigns in ranking order
+    rows = [
+        {'campaign_rank': campaign_rank, 'file_rank': file_rank, **record}
+        for campaign_rank, group in enumerate(grouped_files, start=1)
+        for file_rank, record in enumerate(group['files'], start=1)
+    ]
+    import pandas as pd
+
+    return pd.DataFrame(rows), {}
+
+
+def unused_frame(snapshot, params):
+    campaign_id = params.get('campaign_id', '').strip()
+    if not campaign_id:
+        raise BadRequest("'campaign_id' is required.")
+    if not snapshot.usage_index.has_dates:
+        raise BadRequest('No valid date column found in report data.')
+    unused_datafiles, summary = engine.queries.query_unused(
+        snapshot, campaign_id,
+        params.get('isp', 'All'), params.get('file_series', 'All'), _int_param(params, 'days', 15),
+    )
+    if 'error' in summary:
+        raise NotFound(summary['error'])
+    import pandas as pd
+
+    return pd.DataFrame({'matched_datafile': unused_datafiles}), summary
+
+
+def best_files_frame(snapshot, params):
+    grouped, record_count, unique_files = engine.queries.query_best_files(
+        snapshot, params.get('sponsor', 'All'), params.get('category', 'All'), params.get('isp', 'All'),
+        _int_param(params, 'exclude_days', 0), limit=None,
+    )
+    return grouped.reset_index(drop=True), {'record_count': record_count, 'unique_files': unique_files}
+
+
+def _api_view(build, name):
+    @_login_required
+    async def view(request):
+        try:
+            snapshot, (frame, extra) = await _result(build, request, engine.offload.new_deadline())
+            body = paginate(request, frame, snapshot.data_version)
+        except BadRequest as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+        except engine.fetch.FetchError as e:
+            return JsonResponse({'error': f'Could not fetch the report/campaign feeds: {e}'}, status=502)
+        except engine.offload.DeadlineExceeded:
+            return JsonResponse({'error': TOO_SLOW}, status=504)
+        return JsonResponse({**extra, **body})
+    view.__name__ = f'{name}_api'
+    return view
+
+
+recommendations_api = _api_view(recommendation_frame, 'recommendations')
+unused_ds_api = _api_view(unused_frame, 'unused_ds')
+best_files_api = _api_view(best_files_frame, 'best_files')
+
+
+# ----- exports -----
+def _csv_chunks(frame: pd.DataFrame):
+    # CSV_CHUNK_ROWS rows at a time (header with the first); the full file never exists as one string
+    for start in range(0, max(len(frame), 1), CSV_CHUNK_ROWS):
+        chunk = frame.iloc[start:start + CSV_CHUNK_ROWS]
+        yield chunk.to_csv(header=start == 0, index=False, date_format='%Y-%m-%d')
+
+
+def _excel_value(value):
+    import pandas as pd
+
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value.item() if hasattr(value, 'item') else value
+
+
+def _xlsx_file(frame: pd.DataFrame, sheet: str):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(title=sheet[:31])
+    worksheet.append(list(frame.columns))
+    for row in frame.itertuples(index=False, name=None):
+        worksheet.append([_excel_value(value) for value in row])
+    # Spooled to disk past 10 MB, then sent in blocks by FileResponse
+    output = tempfile.SpooledTemporaryFile(max_size=10 * 1024 * 1024)
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def _export_view(build, name):
+    @_login_required
+    async def view(request):
+        export_format = request.GET.get('format', 'csv').lower()
+        if export_format not in ('csv', 'xlsx'):
+            return JsonResponse({'error': "'format' must be csv or xlsx."}, status=400)
+        deadline = engine.offload.new_deadline()
+        try:
+            _, (frame, _) = await _result(build, request, deadline)
+            if export_format == 'xlsx':
+                output = await engine.offload.run(_xlsx_file, frame, name, deadline=deadline)
+                return FileResponse(output, as_attachment=True, filename=f'{name}.xlsx')
+        except BadRequest as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+        except engine.fetch.FetchError as e:
+            return JsonResponse({'error': f'Could not fetch the report/campaign feeds: {e}'}, status=502)
+        except engine.offload.DeadlineExceeded:
+            return JsonResponse({'error': TOO_SLOW}, status=504)
+
+        response = StreamingHttpResponse(_csv_chunks(frame), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{name}.csv"'
+        return response
+    view.__name__ = f'{name}_export'
+    return view
+
+
+recommendations_export = _export_view(recommendation_frame, 'recommendations')
+unused_ds_export = _export_view(unused_frame, 'unused_datafiles')
+best_files_export = _export_view(best_files_frame, 'best_files')
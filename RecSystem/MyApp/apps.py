@@ -1,6 +1,41 @@
+import logging
+import os
+import sys
+import threading
+
 from django.apps import AppConfig
 
+logger = logging.getLogger(__name__)
+
+
+def _serving() -> bool:
+    # manage.py: only the runserver process that serves requests (the reloader's child, or --noreload);
+    # anything else (gunicorn, uwsgi, ...) is a web worker
+    argv = [os.path.basename(arg) for arg in sys.argv]
+    if argv and argv[0] == 'manage.py':
+        if 'runserver' not in argv:
+            return False
+        return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in argv
+    return True
+
+
+def _warm_up():
+    from .engine import pipeline
+
+    try:
+        pipeline.warm_up()
+    except Exception:
+        # The first request builds it then (and shows the error)
+        logger.exception('Warm-up failed')
+
 
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'MyApp'
+
+    def ready(self):
+        from . import signals  # registers the DatafileAlias receivers
+        from .engine import config
+
+        if config.warm_up and _serving():
+            threading.Thread(target=_warm_up, name='warm-up', daemon=True).start()
@@ -0,0 +1,30 @@
+import importlib
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Data engine----------------
+# -----------------------------------------------------------------------------------------------------
+# Everything behind the analytics pages, kept out of views.py:
+#   config        .env settings (light: no pandas)
+#   pipeline      feeds + master -> matched, merged, aggregated frames -> data_snapshot
+#   queries       what each page shows, from a snapshot
+#   cube          per-slicer rollups of file_stats behind the top offers and best files pages
+#   rollups       day/week/month/season tables behind the season page, updated incrementally
+#   offload       thread pools and deadlines for the async pages
+#   dates, fetch, feed_stream, ingest, master_cache, matching, normalize, publish, aggregates,
+#   usage_index, fact_store, schema, snapshot    the building blocks
+# Submodules import pandas, rapidfuzz and requests, so none is imported here: `engine.pipeline`
+# etc. loads on first attribute access. Django boot (manage.py commands, worker start) only pays
+# for them when a page or command actually needs data.
+
+SUBMODULES = {
+    'aggregates', 'config', 'cube', 'dates', 'fact_store', 'feed_stream', 'fetch', 'ingest', 'master_cache',
+    'matching', 'normalize', 'offload', 'pipeline', 'publish', 'queries', 'rollups', 'schema', 'snapshot',
+    'usage_index',
+}
+
+
+def __getattr__(name):
+    if name in SUBMODULES:
+        return importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
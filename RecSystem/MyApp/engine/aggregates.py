@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Campaign x datafile aggregate table----------------
+# -----------------------------------------------------------------------------------------------------
+# Built once per data version from a merged row-level frame, one row per distinct
+# (campaign_name, matched_datafile, ISP Name, sponsor, category). The views filter and roll up this
+# table instead of the raw rows:
+#   rows                      number of merged rows in the group
+#   <metric>_sum              revenue, clicks, sent, cpm, epc, perf summed (means are sum / rows)
+#   last_send_date            max of the rows' last_send_date
+#   first_row, first_<col>    position and values of the group's first row, for pages that show
+#                             "the" row of a campaign/datafile pair
+# Missing keys (NaN) are groups of their own, so "All" filters still see every row.
+
+PAIR_KEYS = ['campaign_name', 'matched_datafile']
+DIMENSIONS = ['ISP Name', 'sponsor', 'category']
+SUM_COLUMNS = ['revenue', 'clicks', 'sent', 'cpm', 'epc', 'perf']
+FIRST_COLUMNS = ['revenue', 'cpm', 'epc', 'perf', 'DF Count', 'last_send_date']
+
+
+def _numeric(frame, col):
+    if col not in frame.columns:
+        return pd.Series(0.0, index=frame.index)
+    return pd.to_numeric(frame[col], errors='coerce').fillna(0)
+
+
+def build_pair_stats(merged_df: pd.DataFrame) -> pd.DataFrame:
+    """Aggregate a merged frame whose metric columns are already prepared (epc, cpm, ...)."""
+    keys = [col for col in PAIR_KEYS + DIMENSIONS if col in merged_df.columns]
+    rows = pd.DataFrame({col: merged_df[col].to_numpy() for col in keys})
+    for col in ['revenue', 'clicks', 'sent', 'cpm', 'epc']:
+        rows[col] = _numeric(merged_df, col).to_numpy()
+    rows['perf'] = rows['revenue'] / rows['sent'].replace(0, 1)
+    if 'last_send_date' in merged_df.columns:
+        rows['last_send_date'] = merged_df['last_send_date'].to_numpy()
+    if 'DF Count' in merged_df.columns:
+        rows['DF Count'] = merged_df['DF Count'].to_numpy()
+
+    # Groups in order of first appearance, NaN keys kept; drop_duplicates lists the same groups
+    # in the same order, giving each group's first row
+    grouped = rows.groupby(keys, sort=False, dropna=False, observed=True)
+    stats = grouped[SUM_COLUMNS].sum()
+    stats.columns = [f'{col}_sum' for col in SUM_COLUMNS]
+    stats.insert(0, 'rows', grouped.size().to_numpy())
+    if 'last_send_date' in rows.columns:
+        stats['last_send_date'] = grouped['last_send_date'].max().to_numpy()
+    stats = stats.reset_index()
+
+    rows['first_row'] = np.arange(len(rows))
+    first = rows.drop_duplicates(subset=keys)
+    stats['first_row'] = first['first_row'].to_numpy()
+    for col in FIRST_COLUMNS:
+        if col in first.columns:
+            stats[f'first_{col}'] = first[col].to_numpy()
+    return stats
+
+
+def rollup(stats: pd.DataFrame, by) -> pd.DataFrame:
+    """Sums and rows of `stats` per `by`, with cpm/epc/perf means over the underlying rows."""
+    grouped = stats.groupby(by, observed=True).agg(
+        rows=('rows', 'sum'),
+        **{f'{col}_sum': (f'{col}_sum', 'sum') for col in SUM_COLUMNS},
+    )
+    for col in SUM_COLUMNS:
+        grouped[col] = grouped[f'{col}_sum']
+    for col in ['cpm', 'epc', 'perf']:
+        grouped[col] = grouped[f'{col}_sum'] / grouped['rows']
+    return grouped.reset_index()
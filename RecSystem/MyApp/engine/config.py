@@ -0,0 +1,97 @@
+import logging
+from pathlib import Path
+from typing import Dict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Configuration (.env)----------------
+# -----------------------------------------------------------------------------------------------------
+# .env is read once, from the working directory, when the engine is first imported. Only the setting
+# names are logged: values hold feed URLs and credentials.
+
+# Enhanced function to parse .env file
+def load_env(env_path: str = '.env') -> Dict[str, str]:
+    config = {}
+    if not Path(env_path).exists():
+        print(f"Warning: {env_path} not found. Using empty config.")
+        return config
+    
+    with open(env_path, 'r', encoding='utf-8') as f:
+        in_multiline = False
+        current_key = None
+        current_value = []
+        
+        for line_num, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue  # Skip empty or comment lines
+            
+            # Handle multiline values (basic, ends at next key or EOF)
+            if in_multiline:
+                if '=' in line and not line.startswith(' ' * (len(current_key) + 1)):  # New key starts
+                    config[current_key] = ' '.join(current_value).strip().strip('"\'')
+                    current_key = None
+                    in_multiline = False
+                else:
+                    current_value.append(line)
+                    continue
+            
+            if '=' in line:
+                parts = line.split('=', 1)
+                key = parts[0].strip()
+                value_part = parts[1].strip()
+                
+                # Handle quoted values
+                if (value_part.startswith('"') and value_part.endswith('"')) or \
+                   (value_part.startswith("'") and value_part.endswith("'")):
+                    value = value_part[1:-1]
+                else:
+                    value = value_part
+                
+                if value.endswith('\\'):  # Simple multiline indicator
+                    in_multiline = True
+                    current_key = key
+                    current_value = [value[:-1]]  # Remove \
+                else:
+                    config[key] = value
+            else:
+                print(f"Warning: Invalid line {line_num}: {line}")
+    
+    # Handle any pending multiline
+    if current_key:
+        config[current_key] = ' '.join(current_value).strip().strip('"\'')
+    
+    return config
+
+config = load_env()
+logger.info("Loaded %d settings from .env: %s", len(config), ', '.join(config))
+
+report_url = config.get('report_url')
+campaign_url = config.get('campaign_url')
+master_path = config.get('master_path')
+# rapidfuzz worker threads for batch datafile matching (-1 = all cores)
+match_workers = int(config.get('match_workers', -1))
+
+# Seconds a snapshot stays valid before the feeds are fetched again (0 = until invalidated:
+# manage.py invalidate_snapshot, or an edit to the datafile aliases)
+snapshot_ttl = float(config.get('snapshot_ttl', 300))
+
+# Local working data (report store, ...); defaults to RecSystem/data_cache
+cache_dir = Path(config.get('cache_dir') or settings.BASE_DIR / 'data_cache')
+
+# Rewritten to make every worker's snapshot stale (see engine/snapshot.py)
+snapshot_stamp = cache_dir / 'snapshot.stamp'
+
+# Where the best files / unused datafiles queries run: 'pandas' (in memory) or 'sqlite' (fact store)
+query_backend = config.get('query_backend', 'pandas').lower()
+
+# Async pages: threads running the pandas queries, and seconds a page waits for data before giving up
+query_workers = int(config.get('query_workers', 4))
+request_deadline = float(config.get('request_deadline', 30))
+
+# Build the data snapshot (and fuzzy index) when a web worker starts, not on its first request
+warm_up = config.get('warm_up', 'false').lower() in ('1', 'true', 'yes')
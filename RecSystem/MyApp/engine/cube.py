@@ -0,0 +1,126 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .aggregates import DIMENSIONS, SUM_COLUMNS
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Offer cube----------------
+# -----------------------------------------------------------------------------------------------------
+# file_stats rolled up for every slicer combination of the top offers / best files pages: for each
+# target
+#   offer        campaign_name
+#   file         matched_datafile
+# and each subset of DIMENSIONS (ISP Name, sponsor, category), the target's sums per value of that
+# subset. A dimension left out of the subset is the "All" level. Stored as two frames:
+#   cube         target keys (NaN where not part of the target), rows and the <metric>_sum columns;
+#                one contiguous block per (target, dimension values)
+#   cube_blocks  target, level (bit i set: DIMENSIONS[i] is filtered on), the dimension values
+#                (NaN at the All level), start/stop of the block in `cube`
+# Slicer values are never NaN (NaN is only reached through All), so NaN dimension groups only
+# exist at the levels that roll them up. OfferCube indexes the blocks; a slicer combination is a
+# dict lookup and top-k is a partial selection (argpartition) over one block.
+# The offers of given files are not part of the cube (file x offer at every level is several times
+# file_stats): OfferCube keeps file_stats' row positions per datafile and sums those few rows instead.
+
+TARGETS = {
+    'offer': ['campaign_name'],
+    'file': ['matched_datafile'],
+}
+KEY_COLUMNS = ['matched_datafile', 'campaign_name']
+METRIC_COLUMNS = ['rows', *[f'{col}_sum' for col in SUM_COLUMNS]]
+
+
+def build_cube(file_stats: pd.DataFrame):
+    """(cube, cube_blocks) of a file_stats table (see the banner)."""
+    dims = [col for col in DIMENSIONS if col in file_stats.columns]
+    parts, blocks = [], []
+    start = 0
+    for target, keys in TARGETS.items():
+        for level in range(2 ** len(dims)):
+            by = [col for bit, col in enumerate(dims) if level >> bit & 1]
+            source = file_stats.dropna(subset=by) if by else file_stats
+            # Sorted by the level's dimensions first, so each combination is one contiguous block
+            part = source.groupby([*by, *keys], dropna=False, observed=True)[METRIC_COLUMNS].sum().reset_index()
+            if by:
+                sizes = part.groupby(by, sort=False, observed=True).size()
+                values = sizes.index.to_frame(index=False)
+            else:
+                sizes = pd.Series([len(part)])
+                values = pd.DataFrame(index=range(1))
+            stops = start + np.cumsum(sizes.to_numpy())
+            values = values.assign(target=target, level=level, start=stops - sizes.to_numpy(), stop=stops)
+            blocks.append(values)
+            parts.append(part.drop(columns=by))
+            start += len(part)
+    cube = pd.concat(parts, ignore_index=True)
+    cube_blocks = pd.concat(blocks, ignore_index=True)
+    cube = cube[[*KEY_COLUMNS, *METRIC_COLUMNS]]
+    cube_blocks = cube_blocks.reindex(columns=['target', 'level', *DIMENSIONS, 'start', 'stop'])
+    cube_blocks[['level', 'start', 'stop']] = cube_blocks[['level', 'start', 'stop']].astype('int64')
+    return cube, cube_blocks
+
+
+def top_positions(values: np.ndarray, k: Optional[int]) -> np.ndarray:
+    """Positions of the k largest values (None: all), largest first; only those k are sorted."""
+    if k is None or k >= len(values):
+        return np.argsort(-values, kind='stable')
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    part = np.argpartition(-values, k - 1)[:k]
+    return part[np.argsort(-values[part], kind='stable')]
+
+
+def page_metrics(frame: pd.DataFrame, keys) -> pd.DataFrame:
+    # rows + <metric>_sum columns -> the pages' columns; cpm/epc/perf are means over the underlying
+    # rows, as aggregates.rollup()
+    result = pd.DataFrame({col: frame[col].to_numpy() for col in keys})
+    result['rows'] = frame['rows'].to_numpy()
+    for col in SUM_COLUMNS:
+        result[col] = frame[f'{col}_sum'].to_numpy()
+    for col in ['cpm', 'epc', 'perf']:
+        result[col] = result[col] / result['rows']
+    return result
+
+
+class OfferCube:
+    """Block index over (cube, cube_blocks), and file_stats' rows per datafile."""
+
+    def __init__(self, cube: pd.DataFrame, cube_blocks: pd.DataFrame, file_stats: pd.DataFrame):
+        self.cube = cube
+        self.file_stats = file_stats
+        self._file_rows = file_stats.groupby('matched_datafile', observed=True).indices
+        self._blocks = {}
+        dims = {col: cube_blocks[col].astype(object).to_numpy() for col in DIMENSIONS}
+        for i, (target, level, start, stop) in enumerate(zip(
+                cube_blocks['target'].astype(str), cube_blocks['level'], cube_blocks['start'], cube_blocks['stop'])):
+            key = tuple(dims[col][i] if level >> bit & 1 else None for bit, col in enumerate(DIMENSIONS))
+            self._blocks[(target, *key)] = (int(start), int(stop))
+        self.options = {
+            col: ['All'] + sorted(pd.Series(dims[col]).dropna().astype(str).unique().tolist()) for col in DIMENSIONS
+        }
+
+    def block(self, target: str, isp='All', sponsor='All', category='All') -> pd.DataFrame:
+        """Rows of `target` for one slicer combination ('All' = rolled up), with the page metrics."""
+        key = tuple(None if value == 'All' else value for value in (isp, sponsor, category))
+        start, stop = self._blocks.get((target, *key), (0, 0))
+        return page_metrics(self.cube.iloc[start:stop], TARGETS[target])
+
+    def file_offers(self, files, isp='All', sponsor='All', category='All') -> pd.DataFrame:
+        """matched_datafile x campaign_name sums of the given files for one slicer combination."""
+        positions = [self._file_rows[name] for name in files if name in self._file_rows]
+        rows = self.file_stats.iloc[np.concatenate(positions) if positions else []]
+        for col, selected in zip(DIMENSIONS, (isp, sponsor, category)):
+            if selected != 'All' and col in rows.columns:
+                rows = rows[rows[col] == selected]
+        grouped = rows.groupby(TARGETS['file'] + TARGETS['offer'], observed=True)[METRIC_COLUMNS].sum()
+        return page_metrics(grouped.reset_index(), KEY_COLUMNS)
+
+    @staticmethod
+    def top(frame: pd.DataFrame, k: Optional[int], metric: str = 'revenue') -> pd.DataFrame:
+        """The k rows of `frame` with the largest `metric` (rows with a missing key left out)."""
+        valid = frame.dropna(subset=[col for col in KEY_COLUMNS if col in frame.columns])
+        positions = top_positions(valid[metric].to_numpy(dtype=float), k)
+        return valid.iloc[positions].reset_index(drop=True)
@@ -0,0 +1,81 @@
+import logging
+import threading
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from ..metrics import UNPARSEABLE_DATES
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Date parsing----------------
+# -----------------------------------------------------------------------------------------------------
+# Report feeds repeat a few hundred distinct date strings over every row, so parse_dates() parses
+# each distinct value once and maps the results back to the rows:
+#   strict    only the feed's DATE_FORMAT, as the recommendations / best files / season pages read
+#             offer_date (anything else is NaT)
+#   lenient   the unused datafiles page, which also reads other date columns: the KNOWN_FORMATS one
+#             after the other, then dateutil (day first) for the few values none of them matched
+# Parsed values are memoized per mode across calls (the pipeline parses the same column several
+# times per build, and every build mostly sees the same days). With `column` given, the rows whose
+# non-empty value stayed NaT are counted in recsystem_unparseable_dates_total{column, mode}; one
+# call per build and mode passes it, so a bad row counts once.
+# Finding the distinct values of an object column is most of the cost; the report's offer_date is
+# a categorical from ingest on (schema.DIMENSIONS), so later parses only factorize its codes.
+
+DATE_FORMAT = '%d-%m-%Y'
+KNOWN_FORMATS = [DATE_FORMAT, '%Y-%m-%d', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S', '%d-%m-%Y %H:%M:%S']
+MAX_CACHED = 100_000
+
+_cache = {True: {}, False: {}}  # strict -> {value: datetime64[ns]}
+_lock = threading.Lock()
+
+
+def _parse_unique(values: np.ndarray, strict: bool) -> np.ndarray:
+    parsed = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[ns]')
+    for fmt in [DATE_FORMAT] if strict else KNOWN_FORMATS:
+        todo = np.isnat(parsed)
+        if not todo.any():
+            break
+        parsed[todo] = pd.to_datetime(pd.Series(values[todo], dtype=object), format=fmt, errors='coerce').to_numpy()
+    todo = np.isnat(parsed)
+    if not strict and todo.any():
+        parsed[todo] = pd.to_datetime(pd.Series(values[todo], dtype=object), format='mixed', dayfirst=True,
+                                      errors='coerce').to_numpy()
+    return parsed
+
+
+def parse_dates(values: pd.Series, strict: bool = True, column: Optional[str] = None) -> pd.Series:
+    """`values` as datetime64[ns] (NaT where unparseable), same index; see the banner for `strict`."""
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return values
+    codes, uniques = pd.factorize(values)
+    uniques = np.asarray(uniques, dtype=object)
+
+    cache = _cache[strict]
+    with _lock:
+        known = [cache.get(value) for value in uniques]
+    missing = np.array([value is None for value in known], dtype=bool)
+    if missing.any():
+        fresh = _parse_unique(uniques[missing], strict)
+        with _lock:
+            if len(cache) + len(fresh) > MAX_CACHED:
+                cache.clear()
+            cache.update(zip(uniques[missing], fresh))
+        for position, value in zip(np.flatnonzero(missing), fresh):
+            known[position] = value
+    parsed = np.array(known, dtype='datetime64[ns]') if len(known) else np.array([], dtype='datetime64[ns]')
+
+    # -1 (missing value) picks the NaT appended at the end
+    result = np.append(parsed, np.datetime64('NaT', 'ns'))[codes]
+    if column is None:
+        return pd.Series(result, index=values.index, name=values.name)
+    failed = np.isnat(parsed) & (pd.Series(uniques, dtype=object).astype(str).str.strip() != '').to_numpy()
+    if failed.any():
+        count = int(np.bincount(codes[codes >= 0], minlength=len(uniques))[failed].sum())
+        UNPARSEABLE_DATES.inc(count, column=column, mode='strict' if strict else 'lenient')
+        logger.info("%s: %d values in no known date format (e.g. %r)", column, count, uniques[failed][0])
+    return pd.Series(result, index=values.index, name=values.name)
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import sqlite3
+import uuid
+from contextlib import closing
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------SQLite fact store----------------
+# -----------------------------------------------------------------------------------------------------
+# A local SQLite file (not the auth database) holding, per data version:
+#   facts         best files rows: report ⟕ campaign ⟕ ISP, one row per report row and ISP
+#   last_used     last send date per campaign/datafile (unused datafiles page)
+#   master_files  master 'Data File Clean' names with ISP Name and File Series
+#   meta          version and which filter columns exist
+# The best files and unused datafiles queries run as SQL, so only result rows reach pandas.
+# A new version is written to a temporary file and swapped in with os.replace; connections
+# already open keep reading the old file. In-process builds have no published version name, so
+# they are keyed on content_version() of the columns written: a rebuild that changed nothing keeps
+# the file instead of rewriting it.
+# This takes the two pages' filtering and grouping out of pandas; it does not make the data
+# larger-than-RAM safe: the snapshot still holds the full frames for the other pages.
+
+# Dimension columns have no declared type so values keep their own type, as pandas compares them;
+# NUMERIC metrics keep integer sums integers
+SCHEMA = """
+CREATE TABLE facts (
+    campaign_name, matched_datafile, sponsor, category, isp_name,
+    offer_date TEXT,
+    revenue NUMERIC, cpm NUMERIC, epc NUMERIC, clicks NUMERIC, sent NUMERIC
+);
+CREATE INDEX facts_campaign_date ON facts (campaign_name, offer_date);
+CREATE INDEX facts_datafile_date ON facts (matched_datafile, offer_date);
+CREATE INDEX facts_sponsor ON facts (sponsor);
+CREATE INDEX facts_category ON facts (category);
+CREATE INDEX facts_isp ON facts (isp_name);
+
+CREATE TABLE last_used (campaign_name, matched_datafile, last_date TEXT, PRIMARY KEY (campaign_name, last_date, matched_datafile));
+
+CREATE TABLE master_files (data_file_clean, isp_name, file_series);
+CREATE INDEX master_files_isp_series ON master_files (isp_name, file_series);
+
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# facts column -> best files frame column
+FACT_COLUMNS = {
+    'campaign_name': 'campaign_name',
+    'matched_datafile': 'matched_datafile',
+    'sponsor': 'sponsor',
+    'category': 'category',
+    'isp_name': 'ISP Name',
+}
+METRIC_COLUMNS = ['revenue', 'cpm', 'epc', 'clicks', 'sent']
+FILTER_COLUMNS = ['sponsor', 'category', 'isp_name']
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+INSERT_BATCH = 50_000
+
+
+def _sql_dates(values) -> pd.Series:
+    # ISO text sorts like the timestamps; NaT becomes NULL
+    dates = pd.to_datetime(pd.Series(values), errors='coerce')
+    return dates.dt.strftime(DATE_FORMAT).astype(object).where(dates.notna(), None)
+
+
+def _sql_values(values) -> pd.Series:
+    return pd.Series(values, dtype=object).where(pd.notna(values), None)
+
+
+class FactStore:
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+
+    def _meta(self) -> dict:
+        try:
+            with closing(self.connect()) as conn:
+                return dict(conn.execute('SELECT key, value FROM meta'))
+        except sqlite3.Error:
+            return {}
+
+    def version(self) -> Optional[str]:
+        return self._meta().get('version')
+
+    @staticmethod
+    def content_version(best_file_rows: pd.DataFrame, last_used: pd.DataFrame, master_df: pd.DataFrame) -> str:
+        """Hash of the columns sync() would write (row order included)."""
+        stored = [*FACT_COLUMNS.values(), 'offer_date', *METRIC_COLUMNS]
+        digest = hashlib.sha1()
+        for frame, columns in [
+            (best_file_rows, stored),
+            (last_used, ['campaign_name', 'matched_datafile', 'last_date']),
+            (master_df, ['Data File Clean', 'ISP Name', 'File Series']),
+        ]:
+            frame = frame[[col for col in columns if col in frame.columns]]
+            digest.update(json.dumps(list(frame.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+        return f'content-{digest.hexdigest()}'
+
+    def sync(self, version: str, best_file_rows: pd.DataFrame, last_used: pd.DataFrame,
+             master_df: pd.DataFrame) -> bool:
+        """Rewrite the store for `version` unless it already holds it. Returns True if written."""
+        if self.version() == version:
+            return False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f'{self.path.name}.{uuid.uuid4().hex}.tmp')
+        try:
+            conn = sqlite3.connect(tmp_path)
+            try:
+                conn.executescript(SCHEMA)
+                self._write_facts(conn, best_file_rows)
+                self._write_last_used(conn, last_used)
+                self._write_master(conn, master_df)
+                present = [col for col, source in FACT_COLUMNS.items() if source in best_file_rows.columns]
+                conn.executemany('INSERT INTO meta VALUES (?, ?)', [
+                    ('version', version),
+                    ('columns', json.dumps(present)),
+                ])
+                conn.commit()
+            finally:
+                conn.close()
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return True
+
+    @staticmethod
+    def _insert(conn, table, columns, frame):
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        for start in range(0, len(frame), INSERT_BATCH):
+            chunk = frame.iloc[start:start + INSERT_BATCH]
+            conn.executemany(sql, zip(*(chunk[col].tolist() for col in columns)))
+
+    def _write_facts(self, conn, rows: pd.DataFrame):
+        facts = pd.DataFrame(index=rows.index)
+        for col, source in FACT_COLUMNS.items():
+            facts[col] = _sql_values(rows[source]) if source in rows.columns else None
+        facts['offer_date'] = _sql_dates(rows['offer_date']) if 'offer_date' in rows.columns else None
+        for col in METRIC_COLUMNS:
+            # Same coercion as the page: non-numeric and missing values count as 0
+            facts[col] = pd.to_numeric(rows[col], errors='coerce').fillna(0) if col in rows.columns else 0.0
+        self._insert(conn, 'facts', list(facts.columns), facts)
+
+    def _write_last_used(self, conn, last_used: pd.DataFrame):
+        if 'last_date' not in last_used.columns:
+            return
+        frame = pd.DataFrame({
+            'campaign_name': _sql_values(last_used['campaign_name']),
+            'matched_datafile': _sql_values(last_used['matched_datafile']),
+            'last_date': _sql_dates(last_used['last_date']),
+        })
+        self._insert(conn, 'last_used', list(frame.columns), frame)
+
+    def _write_master(self, conn, master_df: pd.DataFrame):
+        frame = pd.DataFrame({
+            'data_file_clean': _sql_values(master_df['Data File Clean']),
+            'isp_name': _sql_values(master_df['ISP Name']),
+            'file_series': _sql_values(master_df['File Series']),
+        })
+        self._insert(conn, 'master_files', list(frame.columns), frame)
+
+    # ----- queries -----
+    def best_files(self, sponsor='All', category='All', isp='All', cutoff=None, limit=15):
+        """(top `limit` files by revenue (None = all), filtered row count, distinct files) for the best files page."""
+        meta = self._meta()
+        present = json.loads(meta.get('columns', '[]'))
+        where, params = [], []
+        for col, selected in zip(FILTER_COLUMNS, (sponsor, category, isp)):
+            if col in present and selected != "All":
+                where.append(f'{col} = ?')
+                params.append(selected)
+        if cutoff is not None:
+            # Files last sent on/after the cutoff are excluded; rows without a last send stay
+            where.append("""(matched_datafile IS NULL OR matched_datafile NOT IN (
+                SELECT matched_datafile FROM facts WHERE matched_datafile IS NOT NULL
+                GROUP BY matched_datafile HAVING MAX(offer_date) >= ?))""")
+            params.append(cutoff.strftime(DATE_FORMAT))
+        condition = ' AND '.join(where) or '1'
+
+        with closing(self.connect()) as conn:
+            record_count, unique_files = conn.execute(
+                f'SELECT COUNT(*), COUNT(DISTINCT matched_datafile) FROM facts WHERE {condition}', params
+            ).fetchone()
+            top = pd.read_sql_query(
+                f"""SELECT matched_datafile, SUM(revenue) AS revenue, AVG(cpm) AS cpm, AVG(epc) AS epc,
+                           SUM(clicks) AS clicks, SUM(sent) AS sent
+                    FROM facts WHERE {condition} AND matched_datafile IS NOT NULL
+                    GROUP BY matched_datafile ORDER BY revenue DESC, matched_datafile LIMIT ?""",
+                conn, params=params + [limit if limit else -1],
+            )
+        return top, record_count, unique_files
+
+    def unused_datafiles(self, campaign_name, cutoff, isp='All', file_series='All') -> list:
+        """Sorted master files (for the ISP / File Series selection) the campaign has not sent since `cutoff`."""
+        where, params = ['data_file_clean IS NOT NULL'], []
+        if isp != "All":
+            where.append('isp_name = ?')
+            params.append(isp)
+        if file_series != "All":
+            where.append('file_series = ?')
+            params.append(file_series)
+        params += [campaign_name, cutoff.strftime(DATE_FORMAT)]
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                f"""SELECT data_file_clean FROM master_files WHERE {' AND '.join(where)}
+                    EXCEPT
+                    SELECT matched_datafile FROM last_used WHERE campaign_name = ? AND last_date >= ?
+                    ORDER BY 1""",
+                params,
+            ).fetchall()
+        return [row[0] for row in rows]
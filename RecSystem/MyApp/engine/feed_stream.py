@@ -0,0 +1,203 @@
+import codecs
+import json
+import logging
+import re
+from array import array
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Streaming feed decoder----------------
+# -----------------------------------------------------------------------------------------------------
+# The report/campaign endpoints answer {"...": ..., "data": [{row}, {row}, ...]}. Instead of holding
+# the raw body, the decoded list of dicts and the DataFrame at the same time, the body is read in
+# chunks, the "data" array is walked one row at a time and each value goes straight into a
+# per-column buffer. Only the projected columns are kept. The numeric report columns are buffered as
+# packed int64/float64 arrays rather than lists of Python numbers, falling back to a list when a
+# value isn't a plain number (strings, null, ...), so the frame comes out the same either way.
+
+# Report columns the views read; everything else in the feed is dropped while decoding
+REPORT_COLUMNS = (
+    'offer_date', 'date', 'Offer Date', 'after_suppression_date', 'created_at',
+    'campaign_name', 'campaign_id', 'original_datafile',
+    'clicks', 'sent', 'revenue', 'cpm', 'epc', 'sponsor', 'category',
+)
+NUMERIC_COLUMNS = ('clicks', 'sent', 'revenue', 'cpm', 'epc')
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+DELIMITERS = ' \t\n\r,:]}'
+
+
+@dataclass
+class FeedStats:
+    bytes_read: int = 0
+    rows: int = 0
+
+
+class _JsonStream:
+    """Incremental reader over a byte-chunk iterator, decoding one JSON value at a time."""
+
+    def __init__(self, chunks: Iterable[bytes], stats: FeedStats):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json = json.JSONDecoder()
+        self.stats = stats
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _more(self) -> bool:
+        if self.eof:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            text = self.decoder.decode(b'', final=True)
+        else:
+            self.stats.bytes_read += len(chunk)
+            text = self.decoder.decode(chunk)
+        # Drop what was already consumed so the buffer stays around one chunk in size
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def peek(self) -> Optional[str]:
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._more():
+                return None
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Malformed feed: expected {char!r}, found {found!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.json.raw_decode(self.buf, self.pos)
+                # A value not yet followed by a delimiter (e.g. "15" of "15.5") may continue in the next chunk
+                if (end < len(self.buf) and self.buf[end] in DELIMITERS) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._more()
+
+
+def iter_rows(chunks: Iterable[bytes], stats: Optional[FeedStats] = None, key: str = 'data') -> Iterator[dict]:
+    """Yield the elements of the top-level `key` array of a JSON object read from byte chunks."""
+    stats = stats if stats is not None else FeedStats()
+    stream = _JsonStream(chunks, stats)
+    stream.expect('{')
+    if stream.peek() == '}':
+        return
+    while True:
+        name = stream.value()
+        stream.expect(':')
+        if name == key:
+            stream.expect('[')
+            if stream.peek() == ']':
+                stream.pos += 1
+            else:
+                while True:
+                    row = stream.value()
+                    stats.rows += 1
+                    yield row
+                    if stream.peek() == ',':
+                        stream.pos += 1
+                        continue
+                    stream.expect(']')
+                    break
+        else:
+            stream.value()  # other top-level members (status, paging, ...) are skipped
+        if stream.peek() == ',':
+            stream.pos += 1
+            continue
+        stream.expect('}')
+        return
+
+
+class _NumberBuffer:
+    """Column buffer for plain numbers: int64 while every value is an int, float64 (NaN for gaps) after."""
+
+    def __init__(self, n: int):
+        self.values = array('d', [np.nan]) * n if n else array('q')  # n: rows before the key was first seen
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def append(self, value) -> bool:
+        # False (nothing stored) for values pd.DataFrame wouldn't keep in an int64/float64 column
+        kind = type(value)
+        if kind is int:
+            if not INT64_MIN <= value <= INT64_MAX:
+                return False
+        elif kind is not float:
+            return False
+        elif self.values.typecode == 'q':
+            self.values = array('d', self.values)
+        self.values.append(value)
+        return True
+
+    def tolist(self) -> list:
+        return self.values.tolist()
+
+    def column(self) -> np.ndarray:
+        return np.frombuffer(self.values, dtype=np.int64 if self.values.typecode == 'q' else np.float64)
+
+
+def rows_to_frame(rows: Iterable[dict], columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Append each row's values into per-column buffers and build the DataFrame from them.
+
+    With `columns`, only those keys (compared stripped) are kept. Keys missing from a row become NaN, as they would
+    with pd.DataFrame(list_of_dicts). NUMERIC_COLUMNS start as typed buffers and turn into lists on the first
+    value that isn't a plain int/float.
+    """
+    wanted = set(columns) if columns is not None else None
+    buffers = {}
+    n = 0
+    for row in rows:
+        for name, value in row.items():
+            stripped = name.strip()  # feed names get stripped later
+            if wanted is not None and stripped not in wanted:
+                continue
+            buffer = buffers.get(name)
+            if buffer is None:  # key first seen on this row
+                buffer = buffers[name] = _NumberBuffer(n) if stripped in NUMERIC_COLUMNS else [np.nan] * n
+            if buffer.append(value) is False:
+                buffers[name] = buffer.tolist() + [value]
+        n += 1
+        for buffer in buffers.values():
+            if len(buffer) < n:
+                buffer.append(np.nan)
+    return pd.DataFrame(
+        {name: buffer.column() if isinstance(buffer, _NumberBuffer) else buffer for name, buffer in buffers.items()},
+        index=pd.RangeIndex(n),
+    )
+
+
+def load_feed(response, columns: Optional[Sequence[str]] = None, name: str = 'feed',
+              stats: Optional[FeedStats] = None) -> pd.DataFrame:
+    """Decode a streamed requests response ({"data": [...]}) into a DataFrame, column by column.
+
+    Bytes and rows processed are logged and, when given, accumulated into `stats`.
+    """
+    stats = stats if stats is not None else FeedStats()
+    chunks = response.iter_content(chunk_size=CHUNK_SIZE)
+    frame = rows_to_frame(iter_rows(chunks, stats), columns=columns)
+    logger.info("%s: %d rows, %d bytes, %d columns kept", name, stats.rows, stats.bytes_read, len(frame.columns))
+    return frame
@@ -0,0 +1,68 @@
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Sequence
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .feed_stream import FeedStats, load_feed
+from ..metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# What a failed feed download raises (connection errors, timeouts, HTTP error statuses)
+FetchError = requests.RequestException
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Feed fetch client----------------
+# -----------------------------------------------------------------------------------------------------
+# One requests.Session for the report and campaign endpoints: pooled keep-alive connections,
+# (connect, read) timeouts on every call, bounded retries with exponential backoff on connection
+# errors and 429/5xx answers, and gzip negotiated unless turned off. submit() runs a fetch on a
+# small thread pool so both feeds download at the same time.
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class FeedClient:
+    def __init__(self, connect_timeout: float = 5, read_timeout: float = 60, retries: int = 3,
+                 backoff: float = 0.5, gzip: bool = True, pool_size: int = 4):
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False,  # the last 5xx answer goes through raise_for_status()
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # requests decompresses gzip transparently while streaming
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate' if gzip else 'identity'
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='feed-fetch')
+
+    def get_frame(self, url: str, params: Optional[dict] = None, columns: Optional[Sequence[str]] = None,
+                  name: str = 'feed') -> pd.DataFrame:
+        """GET a {"data": [...]} feed and stream-decode it into a DataFrame."""
+        started = time.perf_counter()
+        stats = FeedStats()
+        with stage(f'fetch_{name}') as timing, \
+                self.session.get(url, params=params, timeout=self.timeout, stream=True) as resp:
+            resp.raise_for_status()  # Raise error on bad status
+            frame = load_feed(resp, columns=columns, name=name, stats=stats)
+            timing.rows = len(frame)
+        logger.info("%s fetched in %.2fs", name, time.perf_counter() - started)
+        return frame
+
+    def submit(self, url: str, params: Optional[dict] = None, columns: Optional[Sequence[str]] = None,
+               name: str = 'feed') -> Future:
+        return self.executor.submit(self.get_frame, url, params=params, columns=columns, name=name)
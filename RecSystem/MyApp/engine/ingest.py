@@ -0,0 +1,158 @@
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Optional
+
+import pandas as pd
+
+from .dates import DATE_FORMAT, parse_dates
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Incremental report ingestion----------------
+# -----------------------------------------------------------------------------------------------------
+# Keeps the datafile name table (normalized and fuzzy matched) in a local store, and with
+# `since_param` set the report rows too, together with a high-water mark on offer_date.
+#
+# With `since_param` set, a refresh asks the report endpoint only for rows from
+# (watermark - overlap_days) onwards and replaces that window in the store, so late edits to
+# recent days are picked up. Rows without a parseable offer_date belong to no window: the stored
+# ones are kept unless the fetch returned undated rows, which then replace them (an endpoint
+# can't filter them by date, so it sends all of them or none).
+# Without it, the full feed is fetched and is the new truth; the rows are not stored (there is
+# nothing to fetch incrementally), only the name table and the state.
+# Either way only datafile names that were never seen against the current master version are
+# normalized and matched; known names reuse their stored result.
+
+MATCH_COLUMNS = ['original_datafile_clean', 'matched_datafile', 'match_score']
+
+
+def _datafile_key(report_df: pd.DataFrame) -> pd.Series:
+    # normalize_series works on the str() form, so equal keys always clean to the same name
+    return report_df['original_datafile'].fillna('').astype(str)
+
+
+def _atomic_pickle(obj, path: Path) -> None:
+    tmp_path = path.with_name(f'{path.name}.{uuid.uuid4().hex}.tmp')
+    pd.to_pickle(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
+class ReportIngestor:
+    """Local report store with an offer_date watermark.
+
+    `fetch(params)` returns the raw report rows for the given query params (None = full feed).
+    """
+
+    def __init__(self, store_dir, fetch: Callable[[Optional[dict]], pd.DataFrame],
+                 since_param: Optional[str] = None, since_format: str = DATE_FORMAT, overlap_days: int = 2):
+        self.store_dir = Path(store_dir)
+        self.fetch = fetch
+        self.since_param = since_param
+        self.since_format = since_format
+        self.overlap_days = overlap_days
+
+    # ----- store -----
+    def _load(self):
+        try:
+            with open(self.store_dir / 'state.json', 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            rows = pd.read_pickle(self.store_dir / 'rows.pkl') if self.since_param else None
+            names = pd.read_pickle(self.store_dir / 'names.pkl')
+        except (OSError, ValueError):
+            return None, None, {}
+        return rows, names, state
+
+    def _save(self, rows: pd.DataFrame, names: pd.DataFrame, state: dict) -> None:
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        if self.since_param:
+            _atomic_pickle(rows, self.store_dir / 'rows.pkl')
+        else:
+            # Rows from an earlier windowed setup would be stale once the window mode returns
+            (self.store_dir / 'rows.pkl').unlink(missing_ok=True)
+        _atomic_pickle(names, self.store_dir / 'names.pkl')
+        tmp_path = self.store_dir / f'state.json.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.store_dir / 'state.json')
+
+    def clear(self) -> None:
+        for name in ('state.json', 'rows.pkl', 'names.pkl'):
+            try:
+                (self.store_dir / name).unlink()
+            except FileNotFoundError:
+                pass
+
+    # ----- refresh -----
+    @staticmethod
+    def _offer_dates(report_df: pd.DataFrame) -> pd.Series:
+        if 'offer_date' not in report_df.columns:
+            return pd.Series(pd.NaT, index=report_df.index)
+        return parse_dates(report_df['offer_date'])
+
+    @staticmethod
+    def _apply_matches(report_df: pd.DataFrame, names: Optional[pd.DataFrame], match) -> pd.DataFrame:
+        """Attach MATCH_COLUMNS, matching only names missing from `names`. Returns the name table."""
+        keys = _datafile_key(report_df)
+        known = names if names is not None else pd.DataFrame(columns=['key'] + MATCH_COLUMNS)
+        new_keys = keys[~keys.isin(known['key'])].unique()
+        if len(new_keys):
+            new = match(pd.DataFrame({'original_datafile': new_keys}))
+            new = new.rename(columns={'original_datafile': 'key'})[['key'] + MATCH_COLUMNS]
+            known = pd.concat([known, new], ignore_index=True) if len(known) else new
+        lookup = known.set_index('key')
+        for col in MATCH_COLUMNS:
+            report_df[col] = keys.map(lookup[col]).to_numpy()
+        return known
+
+    def refresh(self, match: Callable[[pd.DataFrame], pd.DataFrame], master_version: str = '',
+                alias_version: str = '') -> pd.DataFrame:
+        """Bring the store up to date and return all report rows with MATCH_COLUMNS.
+
+        `match(df)` adds MATCH_COLUMNS to a frame of distinct 'original_datafile' values.
+        `alias_version` is aliases.overrides_version(): stored names are matched again when it changes.
+        """
+        rows, names, state = self._load()
+        if state.get('master_version') != master_version or state.get('alias_version', '') != alias_version:
+            names = None  # matches were computed against another master or other overrides
+
+        watermark = state.get('watermark')
+        window_start = None
+        if rows is not None and self.since_param and watermark:
+            window_start = datetime.fromisoformat(watermark) - timedelta(days=self.overlap_days)
+            fetched = self.fetch({self.since_param: window_start.strftime(self.since_format)})
+        else:
+            fetched = self.fetch(None)
+        fetched = fetched.copy()
+        fetched.columns = fetched.columns.str.strip()
+
+        if window_start is not None:
+            # Rows before the window stay as stored; the window is replaced by the fetched rows
+            fetched_dates = self._offer_dates(fetched)
+            fetched = fetched[fetched_dates.isna() | (fetched_dates >= window_start)]
+            stored_dates = self._offer_dates(rows)
+            kept = stored_dates < window_start
+            if not fetched_dates.isna().any():
+                kept |= stored_dates.isna()  # undated rows: see the banner
+            kept = rows[kept]
+            report_df = pd.concat([kept, fetched], ignore_index=True)
+        else:
+            # Full feed: it is the new truth
+            report_df = fetched.reset_index(drop=True)
+        names = self._apply_matches(report_df, names, match)
+
+        # Keep only names still referenced, so the table tracks the feed
+        names = names[names['key'].isin(_datafile_key(report_df))].reset_index(drop=True)
+        latest = self._offer_dates(report_df).max()
+        state = {
+            'master_version': master_version,
+            'alias_version': alias_version,
+            'watermark': latest.isoformat() if pd.notna(latest) else watermark,
+            'rows': len(report_df),
+            'fetched_rows': len(fetched),
+            'refreshed_at': datetime.now().isoformat(),
+        }
+        self._save(report_df, names, state)
+        return report_df
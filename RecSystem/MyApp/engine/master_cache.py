@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..metrics import cache_lookup, stage
+from .normalize import normalize_series
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, compiles are not serialized
+    fcntl = None
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Compiled master data cache----------------
+# -----------------------------------------------------------------------------------------------------
+# Master_Data_File.xlsx is compiled into one .npy file per column inside a hidden directory next to
+# the workbook (e.g. "data sheets/.Master_Data_File.cache/"). Later loads memory-map those files
+# instead of parsing the workbook with openpyxl. Text columns are stored as integer codes into their
+# sorted distinct values and load as categoricals over the mapped codes, so every column's rows stay
+# shared between workers; only the distinct strings are built per process. The cache is rebuilt only when the workbook's
+# content changes: a changed mtime/size triggers a sha256 check, and an unchanged hash just
+# refreshes the recorded mtime.
+# Several workers may find the cache stale at once: compiling happens under an exclusive lock on
+# .<stem>.cache/.lock, and whoever gets it second re-reads meta.json and reuses the first one's
+# result. A column directory is never deleted or replaced while meta.json may point at it; a new
+# one is renamed into place, meta.json switched over, and only directories older than the current
+# one are pruned (readers that loaded the previous meta keep their mmaps, which outlive the unlink).
+#
+# Layout:
+#   .<stem>.cache/meta.json                  source mtime/size/sha256 and the column list
+#   .<stem>.cache/<sha256[:16]>.v<format>/   one <n>.npy per column (text: codes, -1 for nulls,
+#                                            + <n>.categories.npy with the sorted distinct values)
+
+# Bump when the on-disk layout or the precomputed columns change
+CACHE_FORMAT = 2
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def cache_dir_for(master_path) -> Path:
+    master_path = Path(master_path)
+    return master_path.with_name(f".{master_path.stem}.cache")
+
+
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_meta(cache_dir: Path) -> Optional[dict]:
+    try:
+        with open(cache_dir / 'meta.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('format') != CACHE_FORMAT:
+        return None
+    return meta
+
+
+def _write_meta(cache_dir: Path, meta: dict) -> None:
+    # Write then rename so readers never see a half-written meta.json
+    tmp_path = cache_dir / f'meta.json.{uuid.uuid4().hex}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, cache_dir / 'meta.json')
+
+
+@contextmanager
+def _compile_lock(cache_dir: Path):
+    cache_dir.mkdir(exist_ok=True)
+    with open(cache_dir / '.lock', 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _is_current(master_path: Path, cache_dir: Path, meta: Optional[dict]) -> bool:
+    if meta is None or not (cache_dir / meta['data_dir']).is_dir():
+        return False
+    stat = master_path.stat()
+    return (meta['source_mtime_ns'], meta['source_size']) == (stat.st_mtime_ns, stat.st_size)
+
+
+def _column_kind(series: pd.Series) -> str:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return 'datetime'
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        return 'numeric'
+    values = series.dropna()
+    if values.map(lambda v: isinstance(v, str)).all():
+        return 'text'
+    return 'object'  # mixed types: kept exactly, but not memory-mappable
+
+
+def _save_column(data_dir: Path, idx: int, series: pd.Series) -> dict:
+    kind = _column_kind(series)
+    entry = {'name': series.name, 'kind': kind, 'file': f'{idx}.npy'}
+    if kind == 'datetime':
+        np.save(data_dir / entry['file'], series.to_numpy(dtype='datetime64[ns]'))
+    elif kind == 'numeric':
+        np.save(data_dir / entry['file'], series.to_numpy())
+    elif kind == 'text':
+        codes, categories = pd.factorize(series, sort=True)
+        # The code width pandas picks for this many categories, so loading doesn't copy the codes
+        width = next(dtype for dtype in (np.int8, np.int16, np.int32, np.int64)
+                     if len(categories) < np.iinfo(dtype).max)
+        np.save(data_dir / entry['file'], codes.astype(width))
+        entry['categories'] = f'{idx}.categories.npy'
+        np.save(data_dir / entry['categories'], np.asarray(categories, dtype=str))  # fixed-width unicode
+    else:
+        np.save(data_dir / entry['file'], series.to_numpy(dtype=object), allow_pickle=True)
+    return entry
+
+
+def _load_column(data_dir: Path, entry: dict):
+    if entry['kind'] == 'object':
+        return np.load(data_dir / entry['file'], allow_pickle=True)
+    values = np.load(data_dir / entry['file'], mmap_mode='r')
+    if entry['kind'] != 'text':
+        return values
+    categories = np.load(data_dir / entry['categories']).astype(object)
+    return pd.Categorical.from_codes(values, categories=categories)
+
+
+def compile_master(master_path, sha256: Optional[str] = None) -> dict:
+    """Parse the master workbook once and write the columnar cache next to it.
+
+    Call with the compile lock held. Returns the new cache metadata.
+    """
+    master_path = Path(master_path)
+    cache_dir = cache_dir_for(master_path)
+    stat = master_path.stat()
+    sha256 = sha256 or file_sha256(master_path)
+
+    with stage('read_excel') as timing:
+        master_df = pd.read_excel(master_path)
+        timing.rows = len(master_df)
+    master_df.columns = master_df.columns.str.strip()
+    master_df['Data File Clean'] = normalize_series(master_df['Data File'].fillna(''))
+
+    # Columns go to a fresh directory; meta.json is switched over last
+    cache_dir.mkdir(exist_ok=True)
+    # Named by format too, so a format bump never reuses a directory written in the old layout
+    data_dir = cache_dir / f'{sha256[:16]}.v{CACHE_FORMAT}'
+    tmp_dir = cache_dir / f'{data_dir.name}.{uuid.uuid4().hex}.tmp'
+    tmp_dir.mkdir()
+    columns = [_save_column(tmp_dir, idx, master_df[col]) for idx, col in enumerate(master_df.columns)]
+    try:
+        os.replace(tmp_dir, data_dir)
+    except OSError:
+        # Same content already compiled (rename onto a non-empty directory fails): keep that one
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.utime(data_dir)
+
+    meta = {
+        'format': CACHE_FORMAT,
+        'source': master_path.name,
+        'source_mtime_ns': stat.st_mtime_ns,
+        'source_size': stat.st_size,
+        'source_sha256': sha256,
+        'data_dir': data_dir.name,
+        'rows': len(master_df),
+        'columns': columns,
+    }
+    _write_meta(cache_dir, meta)
+
+    # Drop column directories (and crashed compiles) older than the one just published
+    current = data_dir.stat().st_mtime_ns
+    for path in cache_dir.iterdir():
+        if path.is_dir() and path.name != data_dir.name and path.stat().st_mtime_ns < current:
+            shutil.rmtree(path, ignore_errors=True)
+    return meta
+
+
+def ensure_master_cache(master_path, force: bool = False) -> dict:
+    """Return up-to-date cache metadata, compiling the workbook only when its content changed."""
+    master_path = Path(master_path)
+    cache_dir = cache_dir_for(master_path)
+    meta = None if force else _read_meta(cache_dir)
+    if _is_current(master_path, cache_dir, meta):
+        cache_lookup('master', hit=True)
+        return meta
+
+    with _compile_lock(cache_dir):
+        # Another worker may have compiled while this one waited for the lock
+        meta = _read_meta(cache_dir)
+        if not force and _is_current(master_path, cache_dir, meta):
+            cache_lookup('master', hit=True)
+            return meta
+        sha256 = None
+        if not force and meta is not None and (cache_dir / meta['data_dir']).is_dir():
+            # Touched but maybe not edited (re-saved, copied): compare content before rebuilding
+            sha256 = file_sha256(master_path)
+            if sha256 == meta['source_sha256']:
+                stat = master_path.stat()
+                meta.update(source_mtime_ns=stat.st_mtime_ns, source_size=stat.st_size)
+                _write_meta(cache_dir, meta)
+                cache_lookup('master', hit=True)
+                return meta
+        cache_lookup('master', hit=False)
+        return compile_master(master_path, sha256=sha256)
+
+
+def load_master(master_path) -> Tuple[pd.DataFrame, str]:
+    """Load the master data file (stripped column names plus 'Data File Clean') from the cache.
+
+    Text columns come back as categoricals. Returns the frame and its version (the workbook's sha256).
+    """
+    meta = ensure_master_cache(master_path)
+    data_dir = cache_dir_for(master_path) / meta['data_dir']
+    columns = {idx: _load_column(data_dir, entry) for idx, entry in enumerate(meta['columns'])}
+    master_df = pd.DataFrame(columns, copy=False)
+    master_df.columns = [entry['name'] for entry in meta['columns']]
+    return master_df, meta['source_sha256']
@@ -0,0 +1,158 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Batch datafile matching----------------
+# -----------------------------------------------------------------------------------------------------
+# Scores every distinct report name against every master name in one rapidfuzz score-matrix call
+# (process.cdist, spread over all cores) instead of one process.extractOne call per report row.
+# The best column per row is the same choice extractOne picks: the first one with the top score.
+#
+# Past BLOCKING_MIN_CHOICES master names a full matrix gets too expensive, so a DatafileIndex
+# (character trigram inverted index, built once per master version) shortlists candidates first.
+# The shortlist reads at most POSTINGS_BUDGET postings and keeps MAX_CANDIDATES names; when that
+# cut something and no candidate reached the cutoff, the name is scored again against every master
+# name sharing a trigram with it, so the budget only bounds the work for names that do match.
+
+# Upper bound on score-matrix cells computed at once (float64 -> ~64 MB)
+MAX_MATRIX_CELLS = 8_000_000
+
+# Master size from which matching goes through the blocking index instead of the full matrix
+BLOCKING_MIN_CHOICES = 20_000
+
+# Candidates kept per name after trigram blocking
+MAX_CANDIDATES = 200
+
+# Posting-list entries read per name (rarest trigrams first)
+POSTINGS_BUDGET = 20_000
+
+
+def token_sort_key(s: str) -> str:
+    # Two strings have token_sort_ratio 100 exactly when these keys are equal
+    return ' '.join(sorted(s.split()))
+
+
+def _trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class DatafileIndex:
+    """Candidate-blocking index over the normalized master names, for token_sort_ratio matching.
+
+    Holds an exact-match table on the token-sorted form (score 100 without scoring anything) and
+    a trigram -> master ids inverted index plus key lengths used to shortlist fuzzy candidates.
+    """
+
+    def __init__(self, choices: List[str]):
+        self.choices = list(choices)
+        self.exact = {}
+        postings = defaultdict(list)
+        lengths = np.empty(len(self.choices), dtype=np.int32)
+        for idx, choice in enumerate(self.choices):
+            key = token_sort_key(choice)
+            self.exact.setdefault(key, idx)  # first choice wins ties, as in extractOne
+            lengths[idx] = len(key)
+            for gram in _trigrams(key):
+                postings[gram].append(idx)
+        self.lengths = lengths
+        self.postings = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def __len__(self):
+        return len(self.choices)
+
+    def candidates(self, name: str, score_cutoff: float, exhaustive: bool = False) -> Tuple[np.ndarray, bool]:
+        """(ids of the master names worth scoring against `name` in master order, whether the
+        budget or the candidate cap left any out). `exhaustive` reads every posting, uncapped."""
+        key = token_sort_key(name)
+        lists = sorted((self.postings[gram] for gram in _trigrams(key) if gram in self.postings), key=len)
+        if not lists:
+            return np.empty(0, dtype=np.int32), False
+
+        # Rarest trigrams first, stopping once enough postings are collected, so the work per
+        # name depends on how selective its trigrams are rather than on the master size
+        taken, total = [], 0
+        for ids in lists:
+            if taken and total + len(ids) > POSTINGS_BUDGET and not exhaustive:
+                break
+            taken.append(ids)
+            total += len(ids)
+        truncated = len(taken) < len(lists)
+        hits, shared = np.unique(np.concatenate(taken), return_counts=True)
+
+        # The Indel ratio can't reach the cutoff when the lengths are too far apart
+        length = len(key)
+        low = length * score_cutoff / (200 - score_cutoff)
+        high = length * (200 - score_cutoff) / score_cutoff if score_cutoff else np.inf
+        in_range = (self.lengths[hits] >= low) & (self.lengths[hits] <= high)
+        hits, shared = hits[in_range], shared[in_range]
+        if len(hits) > MAX_CANDIDATES and not exhaustive:
+            keep = np.argpartition(shared, -MAX_CANDIDATES)[-MAX_CANDIDATES:]
+            hits = np.sort(hits[keep])
+            truncated = True
+        return hits, truncated
+
+    def best_match(self, name: str, score_cutoff: float = 80) -> Tuple[str, float]:
+        exact = self.exact.get(token_sort_key(name))
+        if exact is not None:
+            return self.choices[exact], 100.0
+        ids, truncated = self.candidates(name, score_cutoff)
+        choice, score = self._best_of(name, ids)
+        if score < score_cutoff and truncated:
+            choice, score = self._best_of(name, self.candidates(name, score_cutoff, exhaustive=True)[0])
+        # Best candidate's score even below the cutoff (only the match is blanked), as best_matches
+        return (choice, score) if score >= score_cutoff else ('', score)
+
+    def _best_of(self, name: str, ids: np.ndarray) -> Tuple[str, float]:
+        if len(ids) == 0:
+            return '', 0
+        choice, score, _ = process.extractOne(name, [self.choices[i] for i in ids], scorer=fuzz.token_sort_ratio)
+        return choice, score
+
+
+_index_cache: Dict[str, DatafileIndex] = {}
+
+
+def get_index(choices: List[str], master_version: Optional[str] = None) -> DatafileIndex:
+    """Build the blocking index once per master version (the latest one is kept)."""
+    if master_version is None:
+        return DatafileIndex(choices)
+    index = _index_cache.get(master_version)
+    if index is None:
+        index = DatafileIndex(choices)
+        _index_cache.clear()
+        _index_cache[master_version] = index
+    return index
+
+
+def best_matches(names: Iterable[str], choices: List[str], score_cutoff: float = 80,
+                 workers: int = -1, scorer=fuzz.token_sort_ratio,
+                 index: Optional[DatafileIndex] = None) -> Dict[str, Tuple[str, float]]:
+    """Return {name: (best_choice, score)} for each distinct name.
+
+    Names whose best score is below `score_cutoff` map to ('', best score), like per-name
+    extractOne with the match blanked. `workers=-1` uses every core.
+    With an `index` the candidates are shortlisted per name instead of scoring the full matrix
+    (a name with no candidate at all maps to ('', 0)).
+    """
+    names = list(dict.fromkeys(names))
+    if not names or not choices:
+        return {name: ('', 0) for name in names}
+    if index is not None:
+        return {name: index.best_match(name, score_cutoff) for name in names}
+
+    best = {}
+    rows_per_chunk = max(1, MAX_MATRIX_CELLS // len(choices))
+    for start in range(0, len(names), rows_per_chunk):
+        chunk = names[start:start + rows_per_chunk]
+        # No cutoff in cdist: it would zero the scores below it, and the real score is kept
+        scores = process.cdist(chunk, choices, scorer=scorer, dtype=np.float64, workers=workers)
+        best_idx = scores.argmax(axis=1)
+        best_scores = scores[np.arange(len(chunk)), best_idx]
+        for name, idx, score in zip(chunk, best_idx, best_scores):
+            best[name] = (choices[idx], float(score)) if score >= score_cutoff else ('', float(score))
+    return best
@@ -0,0 +1,98 @@
+import re
+from functools import lru_cache
+
+import pandas as pd
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Datafile name normalization----------------
+# -----------------------------------------------------------------------------------------------------
+# One normalizer with three entry points that all return the same strings:
+#   normalize_string  - the reference implementation, one value at a time
+#   normalize_cached  - memoized per distinct (value, sponsors) pair
+#   normalize_series  - vectorized over a whole Series with pandas string operations
+
+sponsor_list = ['BSK','CFW','DAG','DFO','EFL','GWM','LLS','Madrivo','NIW','PDS','W4','W4E']
+
+TRAILING_NUMBER = re.compile(r'_\d+$')
+
+# A purely numeric '_'-separated part that is not a 4-digit 19xx/20xx year.
+# \Z (not $) so a trailing newline is never treated as a part boundary, matching str.split('_')
+NUMERIC_PART = r'(?!(?:19|20)\d\d(?:_|\Z))\d+'
+INNER_NUMERIC_PART = re.compile(rf'_{NUMERIC_PART}(?=_|\Z)')
+FIRST_NUMERIC_PART = re.compile(rf'^{NUMERIC_PART}(?:_|\Z)')
+
+
+def normalize_string(s, sponsors=None):
+    if not isinstance(s, str):
+        s = str(s)
+
+    s = s.lower().strip()
+
+    # Remove sponsor tags
+    if sponsors:
+        for sponsor in sponsors:
+            s = s.replace(f"_{sponsor.lower()}_", "_")
+            s = s.replace(f"_{sponsor.lower()}", "")
+
+    # Remove trailing numeric suffixes (e.g., _1703, _002, etc.)
+    s = TRAILING_NUMBER.sub('', s)
+
+    # Split into parts
+    parts = s.split('_')
+    cleaned_parts = []
+
+    for part in parts:
+        # Keep numbers that are internal (like 2024), skip meaningless numeric parts
+        if re.fullmatch(r'\d+', part):
+            # Skip only if it's not a year-like pattern (e.g., not 2024)
+            if not (len(part) == 4 and part.startswith(('19', '20'))):
+                continue
+        cleaned_parts.append(part)
+
+    return '_'.join(cleaned_parts)
+
+
+@lru_cache(maxsize=100_000)
+def _normalize_cached(s, sponsors):
+    return normalize_string(s, sponsors=sponsors)
+
+
+def normalize_cached(s, sponsors=None):
+    return _normalize_cached(s, tuple(sponsors) if sponsors else None)
+
+
+@lru_cache(maxsize=None)
+def _sponsor_pattern(sponsors):
+    # Any "_<sponsor>" occurrence; rows without one are untouched by the sponsor replacements
+    return re.compile('|'.join(re.escape(f"_{sponsor.lower()}") for sponsor in sponsors))
+
+
+def normalize_series(values: pd.Series, sponsors=None) -> pd.Series:
+    # Report feeds repeat the same few names across many rows: clean each distinct value once
+    codes, uniques = pd.factorize(values.astype(str))
+    cleaned = _normalize_unique(pd.Series(uniques, dtype=object), sponsors)
+    return pd.Series(cleaned.to_numpy()[codes], index=values.index, dtype=object)
+
+
+def _normalize_unique(s: pd.Series, sponsors=None) -> pd.Series:
+    s = s.str.lower().str.strip()
+
+    if sponsors and len(s):
+        sponsors = tuple(sponsors)
+        tagged = s.str.contains(_sponsor_pattern(sponsors))
+        if tagged.any():
+            # Same replacements, same order as normalize_string; the order matters (W4 vs W4E)
+            sub = s[tagged]
+            for sponsor in sponsors:
+                sub = sub.str.replace(f"_{sponsor.lower()}_", "_", regex=False)
+                sub = sub.str.replace(f"_{sponsor.lower()}", "", regex=False)
+            s = s.copy()
+            s[tagged.to_numpy()] = sub.to_numpy()
+
+    s = s.str.replace(TRAILING_NUMBER, '', regex=True)
+    # Dropping numeric parts: every non-first part takes its leading '_' with it, the first part
+    # its trailing one. Inner parts go first so a numeric first part is still checked afterwards
+    s = s.str.replace(INNER_NUMERIC_PART, '', regex=True)
+    s = s.str.replace(FIRST_NUMERIC_PART, '', regex=True)
+    return s
@@ -0,0 +1,74 @@
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ..metrics import cache_lookup
+from ..result_cache import MISSING
+from .config import query_workers, request_deadline
+from .pipeline import data_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Async offloading----------------
+# -----------------------------------------------------------------------------------------------------
+# The async pages keep the event loop free: pandas work runs on a bounded thread pool and every
+# await is capped by the request's deadline (a monotonic timestamp, request_deadline from .env).
+#   query pool      query_workers threads for the page queries (pandas releases the GIL in most
+#                   of its kernels; a process pool would have to pickle the snapshot)
+#   snapshot pool   one thread: rebuilds (feed fetches, matching, merge) run one at a time and
+#                   requests queued behind a rebuild get the fresh snapshot as soon as it is done
+# A request whose deadline passes gets DeadlineExceeded, but work already started carries on:
+# a rebuild still replaces the snapshot and a query still lands in the result cache, so the next
+# request is fast. While a rebuild is late, pages are answered from the previous snapshot after
+# at most STALE_WAIT seconds.
+
+query_executor = ThreadPoolExecutor(max_workers=query_workers, thread_name_prefix='query')
+snapshot_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='snapshot')
+
+STALE_WAIT = 2.0
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def new_deadline(seconds: float = request_deadline) -> float:
+    return time.monotonic() + seconds
+
+
+async def run(fn, *args, deadline: float, executor: ThreadPoolExecutor = query_executor):
+    """Await fn(*args) on `executor`, raising DeadlineExceeded once `deadline` has passed."""
+    future = asyncio.get_running_loop().run_in_executor(executor, functools.partial(fn, *args))
+    try:
+        return await asyncio.wait_for(future, max(deadline - time.monotonic(), 0))
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f'{getattr(fn, "__name__", "task")} did not finish in time') from None
+
+
+async def snapshot(deadline: float):
+    current = data_snapshot.peek()
+    if current is not None:
+        cache_lookup('snapshot', hit=True)
+        return current
+    previous = data_snapshot.latest
+    if previous is not None:
+        deadline = min(deadline, time.monotonic() + STALE_WAIT)
+    try:
+        return await run(data_snapshot.get, deadline=deadline, executor=snapshot_executor)
+    except DeadlineExceeded:
+        if previous is None:
+            raise
+        logger.warning('Snapshot rebuild is late, answering from data version %s', previous.data_version)
+        return previous
+
+
+async def cached(cache, key: str, data_version: str, compute, deadline: float):
+    # Hits are answered on the event loop; misses are computed (and stored) on the query pool
+    value = cache.lookup(key, data_version)
+    if value is MISSING:
+        value = await run(cache.compute, key, data_version, compute, deadline=deadline)
+    return value
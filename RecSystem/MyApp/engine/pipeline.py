@@ -0,0 +1,263 @@
+
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+from ..aliases import overrides_version, resolve_matches
+from ..metrics import stage
+from .aggregates import build_pair_stats
+from .cube import OfferCube, build_cube
+from .dates import parse_dates
+from .config import (cache_dir, campaign_url, config, master_path, match_workers, query_backend, report_url,
+                     snapshot_stamp, snapshot_ttl)
+from .fact_store import FactStore
+from .feed_stream import REPORT_COLUMNS
+from .fetch import FeedClient
+from .ingest import ReportIngestor
+from .master_cache import load_master
+from .matching import BLOCKING_MIN_CHOICES, best_matches, get_index
+from .normalize import normalize_series, sponsor_list
+from .publish import DatasetStore
+from .rollups import RollupStore, build_rollups
+from .schema import compact_frames
+from .snapshot import SnapshotStore
+from .usage_index import UsageIndex, build_last_used
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Data pipeline----------------
+# -----------------------------------------------------------------------------------------------------
+# Feeds + master workbook -> fuzzy-matched, merged and aggregated frames -> the shared data snapshot
+# the pages query. Built in-process on the snapshot TTL, or loaded from the version published by
+# `manage.py refresh_data`.
+
+
+# Fuzzy match (fixed unpacking and return both DataFrames)
+def fuzzy_match_datafiles(report_df, master_df, threshold=80, master_version=None, batch=True):
+    report_df['original_datafile_clean'] = normalize_series(report_df['original_datafile'].fillna(''), sponsors=sponsor_list)
+    if 'Data File Clean' not in master_df.columns:  # already precomputed by the master cache
+        master_df['Data File Clean'] = normalize_series(master_df['Data File'].fillna(''))
+    all_files = master_df['Data File Clean'].unique().tolist()
+
+    def match_new(names):
+        if batch:
+            # Large masters are shortlisted through the per-version blocking index; smaller ones
+            # get one multi-core score matrix over the distinct names
+            index = get_index(all_files, master_version) if len(all_files) >= BLOCKING_MIN_CHOICES else None
+            return best_matches(names, all_files, score_cutoff=threshold, workers=match_workers, index=index)
+        best = {}
+        for df_name in names:
+            result = process.extractOne(df_name, all_files, scorer=fuzz.token_sort_ratio)
+            if result:
+                # Robust unpack: handle 2 or 3 elements
+                best[df_name] = (result[0], result[1])
+            else:
+                best[df_name] = ('', 0)
+        return best
+
+    unique_names = report_df['original_datafile_clean'].unique().tolist()
+    if master_version:
+        # Stored aliases cover names already matched against this master; only new ones hit rapidfuzz
+        lookup = resolve_matches(unique_names, master_version, match_new)
+    else:
+        lookup = {name: (match, score, False) for name, (match, score) in match_new(unique_names).items()}
+
+    # Broadcast the per-name result back to every report row
+    matched = {name: (match if is_override or score >= threshold else '') for name, (match, score, is_override) in lookup.items()}
+    scores = {name: score for name, (match, score, is_override) in lookup.items()}
+    report_df['matched_datafile'] = report_df['original_datafile_clean'].map(matched)
+    report_df['match_score'] = report_df['original_datafile_clean'].map(scores)
+    return report_df, master_df
+
+# Pooled session shared by both feeds: timeouts, retries with backoff, gzip
+feed_client = FeedClient(
+    connect_timeout=float(config.get('fetch_connect_timeout', 5)),
+    read_timeout=float(config.get('fetch_read_timeout', 60)),
+    retries=int(config.get('fetch_retries', 3)),
+    backoff=float(config.get('fetch_backoff', 0.5)),
+    gzip=config.get('fetch_gzip', 'true').lower() in ('1', 'true', 'yes'),
+)
+
+def fetch_report(params=None):
+    # Streamed: rows are decoded straight into column buffers, keeping only the columns the views use
+    return feed_client.get_frame(report_url, params=params, columns=REPORT_COLUMNS, name='report')
+
+# Refreshes fetch from the offer_date watermark and keep the report rows locally when the endpoint
+# supports a date parameter (report_since_param); otherwise the full feed is fetched each time and
+# only the matched datafile names are kept
+report_ingestor = ReportIngestor(
+    cache_dir / 'report_store',
+    fetch=fetch_report,
+    since_param=config.get('report_since_param') or None,
+    since_format=config.get('report_since_format', '%d-%m-%Y'),
+    overlap_days=int(config.get('report_overlap_days', 2)),
+)
+
+# Day/week/month/season rollups behind the season page, updated from the report store's window
+rollup_store = RollupStore(cache_dir / 'rollups.pkl', overlap_days=int(config.get('report_overlap_days', 2)))
+
+def build_enriched(report_df, campaign_df, master_df):
+    # report ⋈ campaign ⋈ master ⋈ last_send with the metric columns, as the recommendations page reads it
+    report = report_df.copy()
+    campaign = campaign_df.copy()
+
+    # Clean
+    report['offer_date'] = parse_dates(report['offer_date'], column='offer_date')
+    report['campaign_name'] = report['campaign_name'].astype(str).str.lower().str.strip()
+    campaign['campaign_name'] = campaign['campaign_name'].astype(str).str.lower().str.strip()
+
+    merged = pd.merge(report, campaign, on='campaign_name', how='inner')
+    merged = pd.merge(merged, master_df, left_on='matched_datafile', right_on='Data File Clean', how='left')
+
+    last_send = (
+        merged.dropna(subset=['campaign_name', 'matched_datafile', 'offer_date'])
+        .groupby(['campaign_name', 'matched_datafile'], observed=True)['offer_date']
+        .max()
+        .reset_index()
+        .rename(columns={'offer_date': 'last_send_date'})
+    )
+    merged = pd.merge(merged, last_send, on=['campaign_name', 'matched_datafile'], how='left')
+
+    # Compute metrics
+    merged['clicks'] = pd.to_numeric(merged.get('clicks', 0), errors='coerce').fillna(0)
+    merged['sent'] = pd.to_numeric(merged.get('sent', 0), errors='coerce').fillna(0)
+    merged['revenue'] = pd.to_numeric(merged.get('revenue', 0), errors='coerce').fillna(0)
+    merged['epc'] = merged['revenue'] / merged['clicks'].replace(0, 1)
+    merged['engagement'] = (merged['clicks'] / merged['sent'].replace(0, 1)) * 100
+    merged['cpm'] = pd.to_numeric(merged['cpm'], errors='coerce').fillna(0)
+    return merged
+
+def build_best_file_rows(report_df, campaign_df, master_df):
+    # Row-level frame behind the best files page: report ⟕ campaign ⟕ ISP, last send per datafile
+    report_df = report_df.copy()
+
+    # Parse offer_date
+    if 'offer_date' in report_df.columns:
+        report_df['offer_date'] = parse_dates(report_df['offer_date'])
+
+    # Merge report and campaign
+    merged_df = pd.merge(report_df, campaign_df, on='campaign_name', how='left')
+
+    # Merge with master for ISP
+    isp_merge = master_df[['Data File Clean', 'ISP Name']].drop_duplicates()
+    merged_df = pd.merge(
+        merged_df,
+        isp_merge,
+        left_on='matched_datafile',
+        right_on='Data File Clean',
+        how='left'
+    )
+
+    # Compute last send date
+    if 'offer_date' in merged_df.columns and 'matched_datafile' in merged_df.columns:
+        last_send_df = (
+            merged_df.dropna(subset=['matched_datafile', 'offer_date'])
+            .groupby('matched_datafile', observed=True)['offer_date']
+            .max()
+            .reset_index(name='last_send_date')
+        )
+        merged_df = pd.merge(merged_df, last_send_df, on='matched_datafile', how='left')
+    return merged_df
+
+def add_aggregates(data):
+    # Campaign x datafile tables the pages are answered from (versions published before they
+    # existed get them on load)
+    if 'pair_stats' not in data:
+        data['pair_stats'] = build_pair_stats(data['enriched_df'])
+    if 'file_stats' not in data:
+        data['file_stats'] = build_pair_stats(
+            build_best_file_rows(data['report_df'], data['campaign_df'], data['master_df']))
+    if 'last_used' not in data:
+        data['last_used'] = build_last_used(data['report_df'])
+    if 'cube' not in data:
+        data['cube'], data['cube_blocks'] = build_cube(data['file_stats'])
+    if 'rollups' not in data:
+        data['rollups'] = build_rollups(data['report_df'], data['campaign_df'], data['master_df'])
+    return data
+
+def build_data():
+    # Fetch, clean and fuzzy match once; the views only filter and aggregate the result
+    # The campaign feed downloads in the background while the report is fetched and matched
+    campaign_future = feed_client.submit(campaign_url, name='campaign')
+
+    # Memory-mapped columnar cache of the workbook, recompiled only when the file changes
+    with stage('load_master') as timing:
+        master_df, master_version = load_master(master_path)
+        timing.rows = len(master_df)
+
+    # Only datafile names not seen before against this master are normalized and matched
+    def match(names_df):
+        with stage('match', rows=len(names_df)):
+            return fuzzy_match_datafiles(names_df, master_df, master_version=master_version)[0]
+    # Admin overrides re-resolve stored names (and rebuild the rollups) when they change
+    alias_version = overrides_version()
+    with stage('ingest') as timing:
+        report_df = report_ingestor.refresh(match, master_version, alias_version)
+        timing.rows = len(report_df)
+    if 'offer_date' in report_df.columns:
+        # Hashed once here; every parse_dates() below then works on the category codes
+        report_df['offer_date'] = report_df['offer_date'].astype('category')
+
+    campaign_df = campaign_future.result()
+    campaign_df.columns = campaign_df.columns.str.strip()
+
+    with stage('merge') as timing:
+        enriched_df = build_enriched(report_df, campaign_df, master_df)
+        timing.rows = len(enriched_df)
+    with stage('rollups') as timing:
+        rollups = rollup_store.update(report_df, campaign_df, master_df, master_version, alias_version)
+        timing.rows = len(rollups)
+    with stage('aggregate', rows=len(enriched_df)):
+        data = add_aggregates({
+            'report_df': report_df,
+            'campaign_df': campaign_df,
+            'master_df': master_df,
+            'enriched_df': enriched_df,
+            'rollups': rollups,
+        })
+    # Categorical names and downcast integers for every frame, published or held in memory
+    with stage('compact'):
+        return compact_frames(data)
+
+# Versions published by `manage.py refresh_data`. Once one exists the views only read the current
+# version; without any, the pipeline runs in-process on the snapshot TTL as before
+dataset_store = DatasetStore(cache_dir / 'published', keep=int(config.get('publish_keep', 3)))
+
+fact_store = FactStore(cache_dir / 'facts.sqlite3')
+
+def build_data_snapshot():
+    with stage('load_published'):
+        data = dataset_store.load()
+    # Both are no-ops for versions published with aggregates and compact dtypes (the mapped columns stay shared)
+    data = compact_frames(add_aggregates(data)) if data else build_data()
+    with stage('usage_index', rows=len(data['last_used'])):
+        data['usage_index'] = UsageIndex(data['last_used'], data['master_df'])
+    data['offer_cube'] = OfferCube(data.pop('cube'), data.pop('cube_blocks'), data['file_stats'])
+    if query_backend == 'sqlite':
+        # A published version already in the store costs one meta read; the rows (a full merge) are
+        # only built for a version that is not, and in-process builds write only when they changed
+        source = data.get('source')
+        if source is None or fact_store.version() != source:
+            with stage('fact_store_sync'):
+                rows = build_best_file_rows(data['report_df'], data['campaign_df'], data['master_df'])
+                fact_store.sync(
+                    source or fact_store.content_version(rows, data['last_used'], data['master_df']),
+                    rows,
+                    data['last_used'],
+                    data['master_df'],
+                )
+    return data
+
+data_snapshot = SnapshotStore(build_data_snapshot, ttl=snapshot_ttl, probe=dataset_store.current_version,
+                               stamp=snapshot_stamp)
+
+
+def warm_up():
+    # Everything the first request would otherwise wait for: the snapshot (and fact store) and,
+    # when this process matches names itself, the master's blocking index
+    with stage('warm_up'):
+        data_snapshot.get()
+        if dataset_store.current_version() is None:
+            master_df, master_version = load_master(master_path)
+            all_files = master_df['Data File Clean'].unique().tolist()
+            if len(all_files) >= BLOCKING_MIN_CHOICES:
+                get_index(all_files, master_version)
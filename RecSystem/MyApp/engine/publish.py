@@ -0,0 +1,234 @@
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_object_dtype
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Published dataset versions----------------
+# -----------------------------------------------------------------------------------------------------
+# manage.py refresh_data builds the merged dataset outside the request cycle and publishes it here:
+#
+#   <root>/<version>/manifest.json             frames, their column files and the category lists
+#   <root>/<version>/<frame>/<n>.npy           one file per column
+#   <root>/<version>/categories/<n>.npy        category list of each categorical dtype, once
+#   <root>/<version>/text/<n>.npy              distinct values of each text column name, once
+#   <root>/CURRENT                             name of the version the views read
+#
+# A version directory is written under a temporary name and renamed into place, then CURRENT is
+# swapped with os.replace, so readers only ever see complete versions. The newest `keep` versions
+# stay on disk for rollback.
+#
+# Column files are memory-mapped read-only on load, so every worker process maps the same page
+# cache instead of holding a private copy of the frames:
+#   array      numeric, bool and datetime64 columns: the values
+#   category   the codes; the categories are loaded once per dtype and shared by every column
+#   text       str columns (with nulls): int32 codes into the distinct values of that column name.
+#              Each worker keeps the distinct strings and one pointer per row, not a string per row
+#   pickle     anything else (mixed objects, extension dtypes): a private copy
+# Versions written before this layout (one <frame>.pkl each) still load.
+
+CURRENT_FILE = 'CURRENT'
+MANIFEST_FILE = 'manifest.json'
+CATEGORIES_DIR = 'categories'
+TEXT_DIR = 'text'
+
+
+def _text_null(series: pd.Series) -> Optional[str]:
+    # 'none'/'nan' for object columns of str values with one kind of null, else None
+    values = series.to_numpy(dtype=object)
+    mask = pd.isna(values)
+    if not all(isinstance(value, str) for value in values[~mask]):
+        return None
+    nulls = values[mask]
+    if all(value is None for value in nulls):
+        return 'none'
+    if all(isinstance(value, float) for value in nulls):
+        return 'nan'
+    return None
+
+
+class _TextPool:
+    """Distinct values of the text columns of one name, shared by every frame that has the column."""
+
+    def __init__(self, number: int):
+        self.number = number
+        self.values = pd.Index([], dtype=object)
+
+    def codes(self, series: pd.Series) -> np.ndarray:
+        values = series.to_numpy(dtype=object)
+        codes = self.values.get_indexer(values)  # -1: null or not seen yet
+        new = (codes == -1) & ~pd.isna(values)
+        if new.any():
+            self.values = self.values.append(pd.Index(pd.unique(values[new]), dtype=object))
+            codes[new] = self.values.get_indexer(values[new])
+        return codes.astype(np.int32)
+
+
+def _save_column(frame_dir: Path, idx: int, series: pd.Series, dtypes: dict, pools: dict) -> dict:
+    entry = {'name': series.name, 'file': f'{idx}.npy'}
+    dtype = series.dtype
+    null = _text_null(series) if is_object_dtype(dtype) else None
+    if isinstance(dtype, pd.CategoricalDtype):
+        entry.update(kind='category', categories=dtypes.setdefault(dtype, len(dtypes)))
+        np.save(frame_dir / entry['file'], series.cat.codes.to_numpy())
+    elif isinstance(dtype, np.dtype) and dtype.kind in 'biufmM':
+        entry['kind'] = 'array'
+        np.save(frame_dir / entry['file'], series.to_numpy())
+    elif null is not None:
+        pool = pools.setdefault(series.name, _TextPool(len(pools)))
+        entry.update(kind='text', values=pool.number, null=null)
+        np.save(frame_dir / entry['file'], pool.codes(series))
+    else:
+        entry.update(kind='pickle', file=f'{idx}.pkl')
+        series.reset_index(drop=True).to_pickle(frame_dir / entry['file'])
+    return entry
+
+
+def _load_column(frame_dir: Path, entry: dict, dtypes: list, pools: list):
+    if entry['kind'] == 'pickle':
+        return pd.read_pickle(frame_dir / entry['file']).array
+    # A plain ndarray view of the mapping (results of operations on it are not memmaps then)
+    values = np.asarray(np.load(frame_dir / entry['file'], mmap_mode='r'))
+    if entry['kind'] == 'category':
+        return pd.Categorical.from_codes(values, dtype=dtypes[entry['categories']], validate=False)
+    if entry['kind'] == 'text':
+        # Code -1 (null) picks the trailing None
+        text = pools[entry['values']].take(values)
+        if entry['null'] == 'nan':
+            text[values < 0] = np.nan
+        return text
+    return values
+
+
+def _save_frame(version_dir: Path, name: str, frame: pd.DataFrame, dtypes: dict, pools: dict) -> dict:
+    entry = {'rows': len(frame), 'columns': len(frame.columns)}
+    index = frame.index
+    if not (isinstance(index, pd.RangeIndex) and frame.columns.is_unique
+            and all(isinstance(col, str) for col in frame.columns)):
+        # Only plain frames are split into columns
+        frame.to_pickle(version_dir / f'{name}.pkl')
+        return entry
+    frame_dir = version_dir / name
+    frame_dir.mkdir()
+    entry['index'] = [index.start, index.stop, index.step]
+    entry['files'] = [_save_column(frame_dir, idx, frame[col], dtypes, pools) for idx, col in enumerate(frame.columns)]
+    return entry
+
+
+def _load_frame(version_dir: Path, name: str, entry: dict, dtypes: list, pools: list) -> pd.DataFrame:
+    if 'files' not in entry:
+        return pd.read_pickle(version_dir / f'{name}.pkl')
+    frame_dir = version_dir / name
+    columns = {column['name']: _load_column(frame_dir, column, dtypes, pools) for column in entry['files']}
+    # copy=False keeps one block per column, each a view of its file
+    return pd.DataFrame(columns, index=pd.RangeIndex(*entry['index']), copy=False)
+
+
+class DatasetStore:
+    def __init__(self, root, keep: int = 3):
+        self.root = Path(root)
+        self.keep = max(keep, 2)  # current + at least one to roll back to
+
+    def versions(self) -> List[str]:
+        if not self.root.exists():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if p.is_dir() and (p / MANIFEST_FILE).exists())
+
+    def current_version(self) -> Optional[str]:
+        try:
+            version = (self.root / CURRENT_FILE).read_text(encoding='utf-8').strip()
+        except OSError:
+            return None
+        return version or None
+
+    def _set_current(self, version: str) -> None:
+        tmp_path = self.root / f'{CURRENT_FILE}.{uuid.uuid4().hex}.tmp'
+        tmp_path.write_text(version, encoding='utf-8')
+        os.replace(tmp_path, self.root / CURRENT_FILE)
+
+    def publish(self, frames: Dict[str, pd.DataFrame], meta: Optional[dict] = None) -> str:
+        """Write `frames` as a new version, make it current and prune old versions."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Sortable by name = chronological
+        version = f"{datetime.now():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:6]}"
+        tmp_dir = self.root / f'.{version}.tmp'
+        tmp_dir.mkdir()
+        try:
+            # Category lists and text values are written once and shared by all frames
+            dtypes, pools = {}, {}  # CategoricalDtype -> number, column name -> _TextPool
+            entries = {name: _save_frame(tmp_dir, name, frame, dtypes, pools) for name, frame in frames.items()}
+            (tmp_dir / CATEGORIES_DIR).mkdir()
+            for dtype, number in dtypes.items():
+                np.save(tmp_dir / CATEGORIES_DIR / f'{number}.npy', dtype.categories.to_numpy(), allow_pickle=True)
+            (tmp_dir / TEXT_DIR).mkdir()
+            for pool in pools.values():
+                np.save(tmp_dir / TEXT_DIR / f'{pool.number}.npy', pool.values.to_numpy(), allow_pickle=True)
+            manifest = {
+                'version': version,
+                'published_at': datetime.now().isoformat(),
+                'frames': entries,
+                'categories': [{'ordered': bool(dtype.ordered)} for dtype in dtypes],
+                'text': len(pools),
+                **(meta or {}),
+            }
+            with open(tmp_dir / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+            os.rename(tmp_dir, self.root / version)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self._set_current(version)
+        self.prune()
+        return version
+
+    def read_manifest(self, version: str) -> dict:
+        with open(self.root / version / MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def load(self, version: Optional[str] = None) -> Optional[dict]:
+        """Frames of `version` (default: current) as {name: DataFrame, 'source': version}, or None.
+
+        Columns are read-only views of the mapped files: copy before writing to them.
+        """
+        version = version or self.current_version()
+        if version is None:
+            return None
+        manifest = self.read_manifest(version)
+        version_dir = self.root / version
+        dtypes = [
+            pd.CategoricalDtype(np.load(version_dir / CATEGORIES_DIR / f'{number}.npy', allow_pickle=True),
+                                ordered=entry['ordered'])
+            for number, entry in enumerate(manifest.get('categories', []))
+        ]
+        pools = [
+            np.append(np.load(version_dir / TEXT_DIR / f'{number}.npy', allow_pickle=True), None)
+            for number in range(manifest.get('text', 0))
+        ]
+        loaded = {name: _load_frame(version_dir, name, entry, dtypes, pools)
+                  for name, entry in manifest['frames'].items()}
+        loaded['source'] = version
+        return loaded
+
+    def rollback(self) -> str:
+        """Make the version published before the current one current again."""
+        versions = self.versions()
+        current = self.current_version()
+        older = [v for v in versions if current is None or v < current]
+        if not older:
+            raise ValueError('No earlier published version to roll back to.')
+        self._set_current(older[-1])
+        return older[-1]
+
+    def prune(self) -> None:
+        current = self.current_version()
+        for version in self.versions()[:-self.keep]:
+            if version != current:
+                shutil.rmtree(self.root / version, ignore_errors=True)
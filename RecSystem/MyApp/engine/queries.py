@@ -0,0 +1,285 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from ..metrics import timed
+from .aggregates import rollup
+from .config import query_backend
+from .cube import OfferCube, top_positions
+from .pipeline import fact_store
+from .rollups import METRICS as ROLLUP_METRICS, bucket_start, season_label
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Page queries----------------
+# -----------------------------------------------------------------------------------------------------
+# What the recommendations, unused datafiles, best files, top offers and season pages (and their
+# JSON API/exports) show, computed from a DataSnapshot.
+
+def recommend_campaigns_with_datafiles(merged_df, sort_by, top_n_campaigns=10, top_n_files=5):
+    merged_df = merged_df.copy()
+    merged_df['clicks'] = pd.to_numeric(merged_df.get('clicks', 0), errors='coerce').fillna(0)
+    merged_df['sent'] = pd.to_numeric(merged_df.get('sent', 0), errors='coerce').fillna(0)
+    merged_df['revenue'] = pd.to_numeric(merged_df.get('revenue', 0), errors='coerce').fillna(0)
+    merged_df['cpm'] = pd.to_numeric(merged_df['cpm'], errors='coerce').fillna(0)
+    merged_df['epc'] = merged_df['revenue'] / merged_df['clicks'].replace(0, 1)
+    if sort_by == 'performance':
+        merged_df['perf'] = merged_df['revenue'] / merged_df['sent'].replace(0, 1)
+
+    # Determine aggregation for campaigns
+    if sort_by == 'revenue':
+        agg_dict = {'revenue': 'sum'}
+        sort_col = 'revenue'
+        file_sort_col = 'revenue'
+        file_agg = 'sum'
+    elif sort_by == 'epc':
+        agg_dict = {'epc': 'mean'}
+        sort_col = 'epc'
+        file_sort_col = 'epc'
+        file_agg = 'mean'
+    elif sort_by == 'cpm':
+        agg_dict = {'cpm': 'mean'}
+        sort_col = 'cpm'
+        file_sort_col = 'cpm'
+        file_agg = 'mean'
+    elif sort_by == 'performance':
+        agg_dict = {'perf': 'mean'}
+        sort_col = 'perf'
+        file_sort_col = 'perf'
+        file_agg = 'mean'
+
+    top_campaigns = (
+        merged_df.groupby('campaign_name', observed=True)
+        .agg(agg_dict)
+        .reset_index()
+        .sort_values(by=sort_col, ascending=False)
+        .head(top_n_campaigns)
+    )
+
+    # Top files for every selected campaign in one pass (no per-campaign scan of merged_df)
+    file_cols = list(dict.fromkeys(['matched_datafile', 'cpm', 'DF Count', 'last_send_date', file_sort_col]))
+    top_names = top_campaigns['campaign_name']
+    files = merged_df.loc[merged_df['campaign_name'].isin(top_names), ['campaign_name'] + file_cols]
+    files = files.dropna(subset=['matched_datafile'])
+    # Each campaign/file pair is represented by its first row
+    files = files.drop_duplicates(subset=['campaign_name', 'matched_datafile'])
+    return top_campaigns, group_top_files(files, top_names, file_sort_col, top_n_files)
+
+def group_top_files(files, top_names, file_sort_col, top_n_files):
+    # files: one row per campaign/file pair of the top campaigns
+    files = (
+        files.sort_values(
+            by=['campaign_name', file_sort_col, 'matched_datafile'],
+            ascending=[True, False, True],
+            kind='mergesort',
+        )
+        .groupby('campaign_name', sort=False, observed=True)
+        .head(top_n_files)
+    )
+
+    # Template-ready groups, in campaign ranking order
+    files_by_campaign = {camp: [] for camp in top_names}
+    for record in files.to_dict('records'):
+        files_by_campaign[record['campaign_name']].append(record)
+    return [{'campaign_name': camp, 'files': camp_files} for camp, camp_files in files_by_campaign.items()]
+
+def recommend_from_pair_stats(pair_stats, sort_by, top_n_campaigns=10, top_n_files=5):
+    # Same ranking as recommend_campaigns_with_datafiles, from the campaign x datafile aggregates
+    sort_col = {'revenue': 'revenue', 'epc': 'epc', 'cpm': 'cpm', 'performance': 'perf'}[sort_by]
+    top_campaigns = (
+        rollup(pair_stats, 'campaign_name')[['campaign_name', sort_col]]
+        .sort_values(by=sort_col, ascending=False)
+        .head(top_n_campaigns)
+    )
+
+    # Each campaign/file pair is represented by its first row; pair_stats is in first-row order
+    file_cols = list(dict.fromkeys(['cpm', 'DF Count', 'last_send_date', sort_col]))
+    top_names = top_campaigns['campaign_name']
+    first = pair_stats[pair_stats['campaign_name'].isin(top_names)].dropna(subset=['matched_datafile'])
+    first = first.drop_duplicates(subset=['campaign_name', 'matched_datafile'])
+    files = first[['campaign_name', 'matched_datafile']].copy()
+    for col in file_cols:
+        files[col] = first[f'first_{col}']
+    return top_campaigns, group_top_files(files, top_names, sort_col, top_n_files)
+
+@timed('query_recommendations')
+def query_recommendations(snapshot, campaign_name='', min_engagement=0, sort_by='revenue', limit=10):
+    # (top files grouped per top campaign, campaign options) for the recommendations page and its API
+    # Apply filters
+    if min_engagement > 0:
+        # Engagement is a per-row threshold, so this ranking has to start from the rows
+        merged = snapshot.enriched_df
+        merged = merged[merged['engagement'] >= min_engagement]
+        rank = recommend_campaigns_with_datafiles
+    else:
+        merged = snapshot.pair_stats
+        rank = recommend_from_pair_stats
+    if campaign_name:
+        merged = merged[merged['campaign_name'].str.contains(campaign_name, na=False)]
+
+    # Generate recommendations
+    top_campaigns, grouped_files = rank(merged, sort_by, top_n_campaigns=limit, top_n_files=5)
+
+    # Campaign options for select
+    campaign_options = sorted(merged['campaign_name'].dropna().unique())
+    return grouped_files, campaign_options
+
+@timed('query_unused')
+def query_unused(snapshot, campaign_id, isp_selected='All', file_series_selected='All', days_slider=15):
+    # (unused datafile names, summary) for one campaign id, for the unused datafiles page and its API
+    campaign_df = snapshot.campaign_df
+    cutoff_date = datetime.today() - timedelta(days=days_slider)
+
+    campaign_match = campaign_df[campaign_df['campaign_id'].astype(str) == campaign_id]
+    if campaign_match.empty:
+        return [], {"error": "No campaign found with that ID."}
+    campaign_name = campaign_match.iloc[0]['campaign_name']
+
+    if query_backend == 'sqlite':
+        unused_datafiles = fact_store.unused_datafiles(campaign_name, cutoff_date, isp_selected, file_series_selected)
+    else:
+        unused_datafiles = snapshot.usage_index.unused(campaign_name, cutoff_date, isp_selected, file_series_selected)
+    summary = {
+        "campaign_id": campaign_id,
+        "campaign_name": campaign_name,
+        "days": days_slider,
+        "count": len(unused_datafiles)
+    }
+    return unused_datafiles, summary
+
+BEST_FILE_COLUMNS = ['matched_datafile', 'revenue', 'cpm', 'epc', 'clicks', 'sent']
+
+def best_files_from_stats(file_stats, sponsor_selected, category_selected, isp_selected, exclude_days, limit=None):
+    # (top `limit` files by revenue, filtered row count, distinct files) from one row per
+    # campaign/datafile/ISP/sponsor/category; the cutoff of exclude_days changes daily, so it is not in the cube
+    filtered_df = file_stats
+
+    # Apply filters safely (check column existence)
+    if 'sponsor' in filtered_df.columns and sponsor_selected != "All":
+        filtered_df = filtered_df[filtered_df['sponsor'] == sponsor_selected]
+    if 'category' in filtered_df.columns and category_selected != "All":
+        filtered_df = filtered_df[filtered_df['category'] == category_selected]
+    if 'ISP Name' in filtered_df.columns and isp_selected != "All":
+        filtered_df = filtered_df[filtered_df['ISP Name'] == isp_selected]
+
+    # Exclude last X days
+    if exclude_days > 0 and 'last_send_date' in filtered_df.columns:
+        cutoff_date = datetime.now() - timedelta(days=exclude_days)
+        filtered_df = filtered_df[
+            (filtered_df['last_send_date'].isna()) | (filtered_df['last_send_date'] < cutoff_date)
+        ]
+
+    # Drop NaN files for grouping
+    valid_df = filtered_df.dropna(subset=['matched_datafile'])
+    grouped = rollup(valid_df, 'matched_datafile')[BEST_FILE_COLUMNS]
+    top = grouped.iloc[top_positions(grouped['revenue'].to_numpy(dtype=float), limit)]
+    return top.reset_index(drop=True), int(filtered_df['rows'].sum()), len(grouped)
+
+def best_files_from_cube(offer_cube, sponsor_selected, category_selected, isp_selected, limit=None):
+    block = offer_cube.block('file', isp_selected, sponsor_selected, category_selected)
+    top = OfferCube.top(block, limit)[BEST_FILE_COLUMNS]
+    return top, int(block['rows'].sum()), int(block['matched_datafile'].notna().sum())
+
+@timed('query_best_files')
+def query_best_files(snapshot, sponsor_selected='All', category_selected='All', isp_selected='All',
+                     exclude_days=0, limit=15):
+    # (top `limit` files by revenue (None = all), filtered row count, distinct files)
+    if query_backend == 'sqlite':
+        # Filtered and grouped in SQL; only the top rows come back
+        cutoff_date = datetime.now() - timedelta(days=exclude_days) if exclude_days > 0 else None
+        return fact_store.best_files(sponsor_selected, category_selected, isp_selected, cutoff_date, limit=limit)
+    if exclude_days > 0:
+        return best_files_from_stats(
+            snapshot.file_stats, sponsor_selected, category_selected, isp_selected, exclude_days, limit)
+    return best_files_from_cube(snapshot.offer_cube, sponsor_selected, category_selected, isp_selected, limit)
+
+
+# ----- top offers pages -----
+OFFER_COLUMNS = ['campaign_name', 'revenue', 'cpm', 'epc', 'clicks', 'sent', 'rows']
+TOP_OFFER_SORTS = ['revenue', 'epc', 'cpm', 'clicks', 'perf']
+
+@timed('query_top_offers')
+def query_top_offers(snapshot, isp_selected='All', sponsor_selected='All', category_selected='All',
+                     sort_by='revenue', limit=15):
+    # (top `limit` offers by sort_by, filtered row count, distinct offers) from the offer cube
+    block = snapshot.offer_cube.block('offer', isp_selected, sponsor_selected, category_selected)
+    top = OfferCube.top(block, limit, sort_by)[OFFER_COLUMNS]
+    return top, int(block['rows'].sum()), int(block['campaign_name'].notna().sum())
+
+@timed('query_file_top_offers')
+def query_file_top_offers(snapshot, isp_selected='All', sponsor_selected='All', category_selected='All',
+                          datafile='', limit=15):
+    # With a datafile: its top `limit` offers by revenue. Without: the top `limit` files by revenue,
+    # each with its best offer (top_offer_* columns). Plus the filtered row count of the files.
+    cube = snapshot.offer_cube
+    slicer = (isp_selected, sponsor_selected, category_selected)
+    if datafile:
+        offers = cube.file_offers([datafile], *slicer)
+        return OfferCube.top(offers, limit)[['matched_datafile', *OFFER_COLUMNS]], int(offers['rows'].sum())
+    block = cube.block('file', *slicer)
+    files = OfferCube.top(block, limit)[[*BEST_FILE_COLUMNS, 'rows']]
+    # Offers of those files only, best first, so the first row per file is its top offer
+    offers = OfferCube.top(cube.file_offers(files['matched_datafile'], *slicer), None)
+    best = offers.drop_duplicates('matched_datafile')[['matched_datafile', 'campaign_name', 'revenue', 'epc']]
+    best.columns = ['matched_datafile', 'top_offer', 'top_offer_revenue', 'top_offer_epc']
+    return files.merge(best, on='matched_datafile', how='left'), int(block['rows'].sum())
+
+
+# ----- season page -----
+SEASON_METRICS = ['revenue', 'clicks', 'sent', 'epc', 'cpm', 'ctr']
+PERIOD_FORMATS = {'day': '%Y-%m-%d', 'week': 'Week of %Y-%m-%d', 'month': '%b %Y'}
+
+
+def period_label(bucket, grain):
+    return season_label(bucket) if grain == 'season' else bucket.strftime(PERIOD_FORMATS[grain])
+
+
+def with_ratios(frame):
+    # epc/cpm/ctr of summed metrics (not means of row ratios), zero divisors as 1 like the other pages
+    frame['epc'] = frame['revenue'] / frame['clicks'].replace(0, 1)
+    frame['cpm'] = frame['revenue'] / frame['sent'].replace(0, 1) * 1000
+    frame['ctr'] = frame['clicks'] / frame['sent'].replace(0, 1) * 100
+    return frame
+
+
+def season_options(rollups):
+    # The season table has every dimension value and is the smallest
+    table = rollups[rollups['grain'] == 'season']
+    return {
+        col: ['All'] + sorted(table[col].dropna().astype(str).unique().tolist())
+        for col in ['category', 'sponsor', 'ISP Name']
+    }
+
+
+@timed('query_season')
+def query_season(snapshot, grain='month', metric='revenue', category='All', sponsor='All', isp='All',
+                 date_from=None, date_to=None):
+    """Per-category trend of `metric` over `grain` buckets, read from the snapshot's rollups."""
+    rollups = snapshot.rollups
+    table = rollups[rollups['grain'] == grain]
+    for col, selected in [('category', category), ('sponsor', sponsor), ('ISP Name', isp)]:
+        if selected != 'All':
+            table = table[table[col].astype(str) == selected]
+    if date_from is not None:
+        table = table[table['bucket'] >= bucket_start([date_from], grain)[0]]
+    if date_to is not None:
+        table = table[table['bucket'] <= pd.Timestamp(date_to)]
+
+    grouped = table.groupby(['bucket', 'category'], dropna=False, observed=True)[['rows', *ROLLUP_METRICS]].sum()
+    grouped = with_ratios(grouped.reset_index())
+    grouped['category'] = grouped['category'].astype(object).fillna('Uncategorized')
+    totals = with_ratios(grouped.groupby('category')[['rows', *ROLLUP_METRICS]].sum())
+    # Categories by their revenue over the range; periods oldest first on the chart, newest first in the table
+    categories = totals.sort_values('revenue', ascending=False).index.tolist()
+    values = grouped.pivot(index='bucket', columns='category', values=metric).reindex(columns=categories).sort_index()
+    labels = [period_label(bucket, grain) for bucket in values.index]
+    matrix = [[None if pd.isna(value) else round(float(value), 4) for value in row] for row in values.to_numpy()]
+    return {
+        'categories': categories,
+        'chart': {'labels': labels, 'datasets': [
+            {'label': name, 'data': [row[idx] for row in matrix]} for idx, name in enumerate(categories)
+        ]},
+        'table': [{'period': label, 'values': row} for label, row in reversed(list(zip(labels, matrix)))],
+        'totals': [round(float(totals.loc[name, metric]), 4) for name in categories],
+        'rows': int(grouped['rows'].sum()),
+    }, season_options(rollups)
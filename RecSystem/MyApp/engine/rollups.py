@@ -0,0 +1,191 @@
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .dates import parse_dates
+from .ingest import _atomic_pickle
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Time-bucketed rollups----------------
+# -----------------------------------------------------------------------------------------------------
+# Report metrics (rows, revenue, clicks, sent) per bucket x category x sponsor x ISP, for four grains:
+#   day      the offer_date
+#   week     Monday of the week
+#   month    first of the month
+#   season   first day of the (meteorological) season: Winter Dec-Feb, Spring Mar-May,
+#            Summer Jun-Aug, Autumn Sep-Nov. December belongs to the winter of the next year
+# `bucket` is the start date of the bucket; rows without a valid offer_date are left out.
+# Sponsor/category come from the campaign feed, ISP from the master row of the matched datafile;
+# missing ones are groups of their own (NaN), so "All" filters still add up to the report.
+#
+# RollupStore keeps the tables in cache_dir and updates them like the report store: only the days
+# from (watermark - overlap_days) on are aggregated again, and the week/month/season buckets from
+# the one holding that day on are summed again from the day table. Everything is rebuilt when the
+# campaign dimensions, the master or the admin alias overrides change (old rows' datafile, hence
+# ISP, may differ), or when the report rows before the window no longer add up to the stored days
+# (history edited or backfilled).
+
+GRAINS = ('day', 'week', 'month', 'season')
+DIMENSIONS = ['category', 'sponsor', 'ISP Name']
+METRICS = ['revenue', 'clicks', 'sent']
+COLUMNS = ['bucket', *DIMENSIONS, 'rows', *METRICS]
+
+SEASONS = {12: 'Winter', 3: 'Spring', 6: 'Summer', 9: 'Autumn'}
+
+
+def bucket_start(days, grain: str) -> np.ndarray:
+    """Start date (datetime64[ns]) of the `grain` bucket holding each day."""
+    values = np.asarray(days, dtype='datetime64[D]')
+    if grain == 'week':
+        # 1970-01-01 was a Thursday
+        values = values - (values.astype(np.int64) + 3) % 7
+    elif grain == 'month':
+        values = values.astype('datetime64[M]').astype('datetime64[D]')
+    elif grain == 'season':
+        months = values.astype('datetime64[M]').astype(np.int64)
+        values = (months - (months + 1) % 3).astype('datetime64[M]').astype('datetime64[D]')
+    elif grain != 'day':
+        raise ValueError(f'Unknown grain {grain!r}')
+    return values.astype('datetime64[ns]')
+
+
+def season_label(start: pd.Timestamp) -> str:
+    if start.month == 12:
+        return f'Winter {start.year}-{(start.year + 1) % 100:02d}'
+    return f'{SEASONS[start.month]} {start.year}'
+
+
+def offer_days(report_df: pd.DataFrame) -> pd.Series:
+    if 'offer_date' not in report_df.columns:
+        return pd.Series(pd.NaT, index=report_df.index, dtype='datetime64[ns]')
+    return parse_dates(report_df['offer_date']).dt.normalize()
+
+
+def report_metrics(report_df: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        col: pd.to_numeric(report_df[col], errors='coerce').fillna(0).to_numpy() if col in report_df.columns
+        else np.zeros(len(report_df))
+        for col in METRICS
+    }, index=report_df.index)
+
+
+def dimensions_key(campaign_df: pd.DataFrame, master_version: str, alias_version: str = '') -> str:
+    # Changes whenever a campaign's sponsor/category, the master or the overrides (hence the ISPs) change
+    cols = [col for col in ['campaign_name', 'sponsor', 'category'] if col in campaign_df.columns]
+    campaigns = campaign_df[cols].astype(str)
+    return f'{master_version}:{alias_version}:{int(pd.util.hash_pandas_object(campaigns, index=False).sum())}'
+
+
+def day_rows(report_df, campaign_df, master_df, days, metrics) -> pd.DataFrame:
+    """Day table of the given report rows (days/metrics aligned with report_df)."""
+    rows = pd.DataFrame({'bucket': days.to_numpy()})
+    # Same name cleaning as the merged frame of the recommendations page
+    names = report_df['campaign_name'].astype(str).str.lower().str.strip().to_numpy()
+    campaigns = campaign_df.assign(
+        campaign_name=campaign_df['campaign_name'].astype(str).str.lower().str.strip()
+    ).drop_duplicates('campaign_name').set_index('campaign_name')
+    for col in ['category', 'sponsor']:
+        rows[col] = pd.Series(names).map(campaigns[col]).astype(object).to_numpy() if col in campaigns.columns else np.nan
+    isp = master_df.drop_duplicates('Data File Clean').set_index('Data File Clean')['ISP Name']
+    rows['ISP Name'] = pd.Series(report_df['matched_datafile'].to_numpy()).map(isp).astype(object).to_numpy()
+    for col in METRICS:
+        rows[col] = metrics[col].to_numpy()
+    return aggregate(rows.dropna(subset=['bucket']))
+
+
+def aggregate(rows: pd.DataFrame) -> pd.DataFrame:
+    if rows.empty:
+        return pd.DataFrame({col: rows[col] if col in rows.columns else pd.Series(dtype='int64') for col in COLUMNS})
+    grouped = rows.groupby(['bucket', *DIMENSIONS], dropna=False, observed=True)
+    sizes = grouped['rows'].sum() if 'rows' in rows.columns else grouped.size().rename('rows')
+    table = pd.concat([sizes, grouped[METRICS].sum()], axis=1).reset_index()
+    for col in DIMENSIONS:
+        table[col] = table[col].astype(object)
+    return table[COLUMNS]
+
+
+def update_tables(tables: dict, new_days: pd.DataFrame, window_start) -> dict:
+    """Replace the days from `window_start` on (None: all days) with `new_days`, and recompute the
+    week/month/season buckets from the one holding window_start on."""
+    day = tables.get('day')
+    if window_start is not None and day is not None:
+        day = pd.concat([day[day['bucket'] < window_start], new_days], ignore_index=True)
+    else:
+        day = new_days
+    day = day.sort_values('bucket', kind='stable').reset_index(drop=True)
+    updated = {'day': day}
+    for grain in GRAINS[1:]:
+        starts = bucket_start(day['bucket'], grain)
+        old = tables.get(grain)
+        if window_start is None or old is None:
+            updated[grain] = aggregate(day.assign(bucket=starts))
+            continue
+        # That first bucket also holds kept days, so it is summed again from the day table
+        cutoff = bucket_start([window_start], grain)[0]
+        recomputed = aggregate(day.assign(bucket=starts)[starts >= cutoff])
+        updated[grain] = pd.concat([old[old['bucket'] < cutoff], recomputed], ignore_index=True)
+    return updated
+
+
+def combine(tables: dict) -> pd.DataFrame:
+    # One frame for the snapshot: the grain tables stacked, with a 'grain' column
+    frames = [tables[grain].assign(grain=grain) for grain in GRAINS]
+    return pd.concat(frames, ignore_index=True)[['grain', *COLUMNS]]
+
+
+def build_rollups(report_df, campaign_df, master_df) -> pd.DataFrame:
+    """All rollups from scratch (no store)."""
+    new_days = day_rows(report_df, campaign_df, master_df, offer_days(report_df), report_metrics(report_df))
+    return combine(update_tables({}, new_days, None))
+
+
+class RollupStore:
+    """The grain tables in one pickle (tables + state, swapped in with os.replace)."""
+
+    def __init__(self, path, overlap_days: int = 2):
+        self.path = Path(path)
+        self.overlap_days = overlap_days
+        self.last_window = None  # start of the window the last update() aggregated (None: full build)
+
+    def _load(self) -> Optional[dict]:
+        try:
+            return pd.read_pickle(self.path)
+        except (OSError, ValueError, EOFError):
+            return None
+
+    @staticmethod
+    def _adds_up(day: pd.DataFrame, window_start, before, metrics: pd.DataFrame) -> bool:
+        stored = day[day['bucket'] < window_start]
+        if int(stored['rows'].sum()) != int(before.sum()):
+            return False
+        return all(np.isclose(stored[col].sum(), metrics.loc[before, col].sum(), rtol=1e-9, atol=1e-6)
+                   for col in METRICS)
+
+    def update(self, report_df, campaign_df, master_df, master_version: str = '',
+               alias_version: str = '') -> pd.DataFrame:
+        days = offer_days(report_df)
+        metrics = report_metrics(report_df)
+        key = dimensions_key(campaign_df, master_version, alias_version)
+        saved = self._load()
+
+        window_start = None
+        if saved and saved.get('key') == key and saved.get('watermark') is not None:
+            window_start = saved['watermark'] - pd.Timedelta(days=self.overlap_days)
+            if not self._adds_up(saved['tables']['day'], window_start, days < window_start, metrics):
+                window_start = None
+        changed = days.notna() if window_start is None else days >= window_start
+
+        new_days = day_rows(report_df[changed], campaign_df, master_df, days[changed], metrics[changed])
+        tables = update_tables(saved['tables'] if window_start is not None else {}, new_days, window_start)
+        watermark = days.max()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        _atomic_pickle({
+            'key': key,
+            'watermark': watermark if pd.notna(watermark) else None,
+            'tables': tables,
+        }, self.path)
+        self.last_window = window_start
+        return combine(tables)
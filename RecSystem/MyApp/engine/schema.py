@@ -0,0 +1,109 @@
+import logging
+
+import pandas as pd
+import numpy as np
+from pandas.api.types import is_float_dtype, is_integer_dtype, is_object_dtype
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Compact dtypes----------------
+# -----------------------------------------------------------------------------------------------------
+# Applied to every frame of a data version before it is published or held by a snapshot.
+#   dimensions   repeated name columns become categoricals. Columns holding the same kind of value
+#                share one sorted category list across all frames, so merges on them stay on codes,
+#                and sorting by codes is sorting by name
+#   numerics     integer columns get the smallest integer type that holds them, and so do the count
+#                columns (INTEGRAL_COLUMNS) that coercion left float64 when all their values are whole.
+#                Other float columns (revenue, cpm, epc, ...) stay float64: sums and ratios over
+#                float32 would no longer match the pages' numbers
+# Groupbys over these columns pass observed=True (only groups that have rows, as with strings).
+
+# column -> value domain
+DIMENSIONS = {
+    'campaign_name': 'campaign',
+    'matched_datafile': 'datafile',
+    'Data File Clean': 'datafile',
+    'ISP Name': 'isp',
+    'File Series': 'file_series',
+    'sponsor': 'sponsor',
+    'category': 'category',
+    'offer_date': 'offer_date',  # the report's date strings, a few hundred days over every row
+}
+
+# Counts that pd.to_numeric(...).fillna(0) leaves float64
+INTEGRAL_COLUMNS = {'clicks', 'sent'}
+
+# A domain is only encoded when it has at most this many distinct values per row
+MAX_DISTINCT_RATIO = 0.5
+
+
+def _strings(values) -> bool:
+    return all(isinstance(value, str) for value in values)
+
+
+def shared_categories(frames: dict) -> dict:
+    """Sorted category list per value domain over the dimension columns of all frames."""
+    values, counts = {}, {}
+    for frame in frames.values():
+        for col, domain in DIMENSIONS.items():
+            if col not in frame.columns:
+                continue
+            column = frame[col]
+            distinct = column.cat.categories if isinstance(column.dtype, pd.CategoricalDtype) else column.dropna().unique()
+            values.setdefault(domain, set()).update(distinct)
+            counts[domain] = counts.get(domain, 0) + len(column)
+
+    categories = {}
+    for domain, distinct in values.items():
+        # Mixed types would not sort like the strings they replace
+        if distinct and _strings(distinct) and len(distinct) <= counts[domain] * MAX_DISTINCT_RATIO:
+            categories[domain] = pd.CategoricalDtype(sorted(distinct))
+    return categories
+
+
+def downcast(series: pd.Series, integral: bool = False) -> pd.Series:
+    if integral and is_float_dtype(series.dtype):
+        values = series.to_numpy()
+        if np.isfinite(values).all() and (values == np.round(values)).all():
+            return pd.to_numeric(series, downcast='integer')
+        return series
+    if is_integer_dtype(series.dtype) and not isinstance(series.dtype, pd.CategoricalDtype):
+        smaller = pd.to_numeric(series, downcast='integer')
+        return series if smaller.dtype == series.dtype else smaller
+    return series
+
+
+def memory_mb(frame: pd.DataFrame) -> float:
+    return frame.memory_usage(deep=True).sum() / (1024 * 1024)
+
+
+def compact_frame(frame: pd.DataFrame, categories: dict) -> pd.DataFrame:
+    columns, changed = {}, False
+    for col in frame.columns:
+        series = frame[col]
+        dtype = categories.get(DIMENSIONS.get(col))
+        if dtype is not None and (is_object_dtype(series.dtype) or isinstance(series.dtype, pd.CategoricalDtype)):
+            columns[col] = series.astype(object).astype(dtype) if series.dtype != dtype else series
+        else:
+            columns[col] = downcast(series, integral=col in INTEGRAL_COLUMNS)
+        changed = changed or columns[col] is not series
+    # Already compact (e.g. a published version): keep the frame and its memory-mapped columns
+    return pd.DataFrame(columns, index=frame.index) if changed else frame
+
+
+def compact_frames(data: dict) -> dict:
+    """Compact every DataFrame in `data` (other values are left as they are).
+
+    Memory use before/after is logged at debug level only: measuring object columns walks every value.
+    """
+    frames = {name: value for name, value in data.items() if isinstance(value, pd.DataFrame)}
+    categories = shared_categories(frames)
+    measure = logger.isEnabledFor(logging.DEBUG)
+    for name, frame in frames.items():
+        before = memory_mb(frame) if measure else 0.0
+        data[name] = compact_frame(frame, categories)
+        if measure:
+            logger.debug("%s: %.2f MB -> %.2f MB", name, before, memory_mb(data[name]))
+    return data
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+import pandas as pd
+
+from ..metrics import cache_lookup, stage
+from .cube import OfferCube
+from .usage_index import UsageIndex
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Shared data snapshot----------------
+# -----------------------------------------------------------------------------------------------------
+# The analytics views (recommendations, unused files, best files) all work from the same three
+# frames: the report feed, the campaign feed and the master data file. Fetching, cleaning and
+# fuzzy matching them is the expensive part, so it is done once per snapshot and shared.
+# Frames held by a snapshot are read-only for callers: take a .copy() before mutating columns.
+# Name columns are categoricals (see schema.py): group by them with observed=True.
+# When the data comes from a published version (manage.py refresh_data), `source` names that
+# version and the snapshot is kept until a newer one is published, whatever the TTL.
+# invalidate() reaches every process through a stamp file (config.snapshot_stamp): it holds a random
+# token, rewritten on each invalidation, and a snapshot built under another token is stale. Writers
+# are invalidate(), `manage.py invalidate_snapshot` and DatafileAlias edits (signals.py).
+
+@dataclass(frozen=True)
+class DataSnapshot:
+    version: int
+    loaded_at: float
+    report_df: pd.DataFrame    # fuzzy-matched report rows (original_datafile_clean, matched_datafile, match_score)
+    campaign_df: pd.DataFrame
+    master_df: pd.DataFrame    # master rows with 'Data File Clean'
+    enriched_df: pd.DataFrame  # report ⋈ campaign ⋈ master ⋈ last_send with the metric columns
+    pair_stats: pd.DataFrame   # campaign x datafile aggregates of enriched_df (see aggregates.py)
+    file_stats: pd.DataFrame   # same aggregates over the best files page's rows
+    last_used: pd.DataFrame    # last send date per campaign/datafile
+    rollups: pd.DataFrame      # day/week/month/season report metrics per category, sponsor, ISP (rollups.py)
+    usage_index: UsageIndex    # last_used indexed for the unused datafiles page
+    offer_cube: OfferCube      # file_stats rolled up per slicer combination (cube.py)
+    source: Optional[str] = None
+
+    def age(self) -> float:
+        return time.time() - self.loaded_at
+
+    @property
+    def data_version(self) -> str:
+        # Published version name, or an id unique to this in-process build
+        return self.source or f'local-{self.loaded_at:.6f}-{self.version}'
+
+
+def read_stamp(path: Path) -> str:
+    try:
+        return path.read_text(encoding='utf-8')
+    except OSError:
+        return ''
+
+
+def write_stamp(path: Path) -> None:
+    """Make every snapshot built before now stale, in every process reading `path`."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'{path.name}.{uuid.uuid4().hex}.tmp')
+    tmp_path.write_text(uuid.uuid4().hex, encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+class SnapshotStore:
+    """Holds the current DataSnapshot and rebuilds it when the TTL expires or on invalidate().
+
+    `builder` returns a dict of DataSnapshot fields (the frames and, optionally, `source`).
+    A ttl of 0 or less disables expiry, so the snapshot is only rebuilt after an explicit
+    invalidate(). `probe`, when given, returns the current published version (or None); a
+    snapshot built from a published version stays until the probe reports another one.
+    `stamp`, when given, is the file shared with other processes for invalidate() (see the banner).
+    """
+
+    def __init__(self, builder: Callable[[], dict], ttl: float = 300,
+                 probe: Optional[Callable[[], Optional[str]]] = None, stamp: Optional[Path] = None):
+        self.builder = builder
+        self.ttl = ttl
+        self.probe = probe
+        self.stamp = stamp
+        self._snapshot: Optional[DataSnapshot] = None
+        self._built_stamp = ''  # stamp token when the current snapshot's build started
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, snapshot: Optional[DataSnapshot]) -> bool:
+        if snapshot is None:
+            return False
+        if self.stamp is not None and read_stamp(self.stamp) != self._built_stamp:
+            return False
+        if self.probe is not None:
+            source = self.probe()
+            if source != snapshot.source:
+                return False
+            if source is not None:
+                return True
+        return self.ttl <= 0 or snapshot.age() < self.ttl
+
+    def peek(self) -> Optional[DataSnapshot]:
+        """The current snapshot if it is still fresh, else None; never builds."""
+        snapshot = self._snapshot
+        return snapshot if self._is_fresh(snapshot) else None
+
+    @property
+    def latest(self) -> Optional[DataSnapshot]:
+        # Last built snapshot, fresh or not
+        return self._snapshot
+
+    def get(self) -> DataSnapshot:
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            cache_lookup('snapshot', hit=True)
+            return snapshot
+
+        # Only one thread rebuilds; the others wait and pick up its result
+        with self._lock:
+            snapshot = self._snapshot
+            if self._is_fresh(snapshot):
+                cache_lookup('snapshot', hit=True)
+                return snapshot
+            cache_lookup('snapshot', hit=False)
+            # Read before building: an invalidation during the build makes the result stale
+            built_stamp = read_stamp(self.stamp) if self.stamp is not None else ''
+            with stage('snapshot_build'):
+                fields = self.builder()
+            self._version += 1
+            snapshot = DataSnapshot(version=self._version, loaded_at=time.time(), **fields)
+            self._snapshot, self._built_stamp = snapshot, built_stamp
+            return snapshot
+
+    def invalidate(self) -> None:
+        """Rebuild on the next get(), here and (with a stamp) in every other process."""
+        if self.stamp is not None:
+            write_stamp(self.stamp)
+        with self._lock:
+            self._snapshot = None
+
+    @property
+    def version(self) -> int:
+        return self._version
@@ -0,0 +1,81 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .dates import parse_dates
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Per-campaign last-used index----------------
+# -----------------------------------------------------------------------------------------------------
+# Answers "which master datafiles has this campaign not used in the last N days" without touching
+# the report rows. Built once per data version:
+#   files            every master 'Data File Clean' name, sorted; a file's id is its position
+#   by_campaign      campaign_name -> (last send dates ascending, file ids in the same order)
+# A query takes the ids sent on or after the cutoff with one searchsorted, and the set difference
+# with the (cached) ids of the selected ISP / File Series is a sorted id array, i.e. sorted names.
+
+DATE_COLUMNS = ['date', 'offer_date', 'Offer Date', 'after_suppression_date', 'created_at']
+
+_NO_USE = (np.array([], dtype='datetime64[ns]'), np.array([], dtype=np.intp))
+
+
+def build_last_used(report_df: pd.DataFrame) -> pd.DataFrame:
+    """Last send date per (campaign_name, matched_datafile). Without a date column: no columns."""
+    date_col = next((col for col in DATE_COLUMNS if col in report_df.columns), None)
+    if date_col is None:
+        return pd.DataFrame()
+    rows = pd.DataFrame({
+        'campaign_name': report_df['campaign_name'].to_numpy(),
+        'matched_datafile': report_df['matched_datafile'].to_numpy(),
+        'last_date': parse_dates(report_df[date_col], strict=False, column=date_col).to_numpy(),
+    })
+    rows = rows.dropna(subset=['matched_datafile', 'last_date'])
+    return rows.groupby(['campaign_name', 'matched_datafile'], sort=False, observed=True)['last_date'].max().reset_index()
+
+
+class UsageIndex:
+    def __init__(self, last_used: pd.DataFrame, master_df: pd.DataFrame):
+        self.has_dates = 'last_date' in last_used.columns
+        self.master_df = master_df[['Data File Clean', 'ISP Name', 'File Series']]
+        self.files = np.array(sorted(self.master_df['Data File Clean'].dropna().unique()), dtype=object)
+        self.file_index = pd.Index(self.files)
+        self.isp_options = sorted(master_df['ISP Name'].dropna().unique().tolist())
+        self.file_series_options = sorted(master_df['File Series'].dropna().unique().tolist())
+
+        self.by_campaign = {}
+        if self.has_dates and len(last_used):
+            ids = self.file_index.get_indexer(last_used['matched_datafile'].astype(object))
+            used = last_used.assign(file_id=ids)[ids >= 0]  # files outside the master never count
+            used = used.sort_values(['campaign_name', 'last_date'], kind='mergesort')
+            for campaign_name, group in used.groupby('campaign_name', sort=False, observed=True):
+                self.by_campaign[campaign_name] = (
+                    group['last_date'].to_numpy(dtype='datetime64[ns]'),
+                    group['file_id'].to_numpy(dtype=np.intp),
+                )
+
+        self._candidates = {}
+        self._lock = threading.Lock()
+
+    def candidates(self, isp='All', file_series='All') -> np.ndarray:
+        """Sorted ids of the master files matching the ISP / File Series selection."""
+        key = (isp, file_series)
+        ids = self._candidates.get(key)
+        if ids is None:
+            master = self.master_df
+            if isp != "All":
+                master = master[master['ISP Name'] == isp]
+            if file_series != "All":
+                master = master[master['File Series'] == file_series]
+            ids = self.file_index.get_indexer(master['Data File Clean'].dropna().unique().astype(object))
+            ids = np.unique(ids)
+            with self._lock:
+                self._candidates[key] = ids
+        return ids
+
+    def unused(self, campaign_name, cutoff, isp='All', file_series='All') -> list:
+        """Sorted names of the selected master files the campaign has not sent since `cutoff`."""
+        dates, ids = self.by_campaign.get(campaign_name, _NO_USE)
+        recent = ids[np.searchsorted(dates, np.datetime64(cutoff, 'ns'), side='left'):]
+        return self.files[np.setdiff1d(self.candidates(isp, file_series), recent)].tolist()
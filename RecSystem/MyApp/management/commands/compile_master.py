@@ -0,0 +1,25 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from MyApp.engine.config import master_path as configured_master_path
+from MyApp.engine.master_cache import cache_dir_for, ensure_master_cache
+
+
+class Command(BaseCommand):
+    help = "Compile the master data workbook (master_path in .env) into its columnar cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help="Workbook to compile (defaults to master_path from .env).")
+        parser.add_argument('--force', action='store_true', help="Rebuild even if the workbook is unchanged.")
+
+    def handle(self, *args, **options):
+        master_path = options['path'] or configured_master_path
+        if not master_path or not Path(master_path).exists():
+            raise CommandError('Master data file not found at path from .env.')
+
+        meta = ensure_master_cache(master_path, force=options['force'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{meta['rows']} rows, {len(meta['columns'])} columns cached in {cache_dir_for(master_path)} "
+            f"(sha256 {meta['source_sha256'][:12]})"
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from MyApp.engine import config
+from MyApp.engine.snapshot import write_stamp
+
+
+class Command(BaseCommand):
+    help = ("Make every web worker rebuild its data snapshot on its next request (refetching the feeds, "
+            "or reloading the current published version). Needed with snapshot_ttl = 0.")
+
+    def handle(self, *args, **options):
+        write_stamp(config.snapshot_stamp)
+        self.stdout.write(self.style.SUCCESS(f"Snapshots invalidated ({config.snapshot_stamp})"))
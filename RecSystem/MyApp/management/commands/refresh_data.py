@@ -0,0 +1,74 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from MyApp import engine
+from MyApp.engine import config
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ("Fetch the feeds, match and merge them, and publish the result as a new dataset version "
+            "for the views. Runs once, or every --interval seconds with --loop.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep running and refresh on an interval.")
+        parser.add_argument('--interval', type=float, default=float(config.config.get('refresh_interval', 300)),
+                            help="Seconds between refreshes with --loop (default: refresh_interval from .env).")
+        parser.add_argument('--rollback', action='store_true',
+                            help="Make the previously published version current again and exit.")
+        parser.add_argument('--list', action='store_true', help="List the published versions and exit.")
+
+    def handle(self, *args, **options):
+        store = engine.pipeline.dataset_store
+
+        if options['list']:
+            current = store.current_version()
+            for version in store.versions():
+                manifest = store.read_manifest(version)
+                rows = manifest['frames'].get('enriched_df', {}).get('rows')
+                marker = '*' if version == current else ' '
+                self.stdout.write(f"{marker} {version}  {manifest['published_at']}  {rows} merged rows")
+            return
+
+        if options['rollback']:
+            try:
+                version = store.rollback()
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f"Current version is now {version}"))
+            return
+
+        if not config.report_url or not config.campaign_url:
+            raise CommandError('Report/Campaign URL not configured in .env.')
+        if not config.master_path:
+            raise CommandError('Master data file not found at path from .env.')
+
+        if not options['loop']:
+            self.refresh(store)
+            return
+
+        while True:
+            started = time.monotonic()
+            try:
+                self.refresh(store)
+            except KeyboardInterrupt:
+                raise
+            except Exception:
+                # Keep the last good version published and try again on the next tick
+                logger.exception('Data refresh failed')
+                self.stderr.write(self.style.ERROR('Refresh failed, keeping the current version.'))
+            try:
+                time.sleep(max(options['interval'] - (time.monotonic() - started), 0))
+            except KeyboardInterrupt:
+                return
+
+    def refresh(self, store):
+        started = time.monotonic()
+        data = engine.pipeline.build_data()
+        version = store.publish(data, meta={'build_seconds': round(time.monotonic() - started, 3)})
+        self.stdout.write(self.style.SUCCESS(
+            f"Published {version}: {len(data['enriched_df'])} merged rows in {time.monotonic() - started:.1f}s"
+        ))
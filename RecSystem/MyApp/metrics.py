@@ -0,0 +1,204 @@
+import bisect
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import HttpResponse
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Metrics----------------
+# -----------------------------------------------------------------------------------------------------
+# In-process counters and histograms, served at /metrics in the Prometheus text format:
+#   recsystem_stage_seconds          pipeline/query stage durations (fetch, read_excel, match, merge, ...)
+#   recsystem_stage_rows_total       rows processed per stage
+#   recsystem_view_seconds           request latency per view (MetricsMiddleware)
+#   recsystem_cache_requests_total   hits and misses per cache (snapshot, result, master, alias)
+#   recsystem_unparseable_dates_total  report rows whose date is in no known format, per column and mode
+# Code times a stage with
+#     with metrics.stage('merge') as timing:
+#         ...
+#         timing.rows = len(merged)
+# Each worker process keeps its own numbers; scrape every worker (the values add up).
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.label_names = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.label_names), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{_labels(self.label_names, key)} {_number(value)}' for key, value in items]
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.label_names = name, help_text, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            # Counts are per bucket here and made cumulative on output
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(entry)) for key, entry in self._values.items())
+        lines = []
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, key, [("le", bound)])} {cumulative}')
+            lines.append(f'{self.name}_bucket{_labels(self.label_names, key, [("le", "+Inf")])} {entry[-1]}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, key)} {_number(entry[-2])}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, key)} {entry[-1]}')
+        return lines
+
+
+STAGE_SECONDS = Histogram('recsystem_stage_seconds', 'Time spent in each pipeline or query stage.', ['stage'])
+STAGE_ROWS = Counter('recsystem_stage_rows_total', 'Rows processed by each stage.', ['stage'])
+VIEW_SECONDS = Histogram('recsystem_view_seconds', 'Request latency per view.', ['view', 'method', 'status'])
+CACHE_REQUESTS = Counter('recsystem_cache_requests_total', 'Cache lookups by cache and result.', ['cache', 'result'])
+UNPARSEABLE_DATES = Counter('recsystem_unparseable_dates_total', 'Report rows whose date is in no known format.',
+                            ['column', 'mode'])
+REGISTRY = [STAGE_SECONDS, STAGE_ROWS, VIEW_SECONDS, CACHE_REQUESTS, UNPARSEABLE_DATES]
+
+
+class StageTiming:
+    __slots__ = ('name', 'rows', 'seconds')
+
+    def __init__(self, name):
+        self.name, self.rows, self.seconds = name, None, None
+
+
+@contextmanager
+def stage(name, rows=None):
+    """Time a block as stage `name`; set `.rows` on the yielded object (or pass rows=) to count rows."""
+    timing = StageTiming(name)
+    timing.rows = rows
+    started = time.perf_counter()
+    try:
+        yield timing
+    finally:
+        timing.seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(timing.seconds, stage=name)
+        if timing.rows is not None:
+            STAGE_ROWS.inc(timing.rows, stage=name)
+
+
+def timed(name):
+    """Decorator form of stage() for whole functions."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def cache_lookup(cache, hit: bool, count: int = 1) -> None:
+    if count:
+        CACHE_REQUESTS.inc(count, cache=cache, result='hit' if hit else 'miss')
+
+
+def exposition() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+# ----- Django -----
+class MetricsMiddleware:
+    """Observes every request's latency under its URL name (streamed bodies: until the response is returned)."""
+
+    # Both, so the async pages under ASGI are not pushed onto a sync thread by this middleware
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    @staticmethod
+    def observe(request, response, started):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        VIEW_SECONDS.observe(time.perf_counter() - started, view=view, method=request.method,
+                             status=response.status_code)
+
+
+def metrics_view(request):
+    # Optional bearer token (metrics_token in .env) for scrapers outside the private network
+    from .engine.config import config
+
+    token = config.get('metrics_token')
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return HttpResponse('Unauthorized\n', status=401, content_type='text/plain')
+    return HttpResponse(exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MyApp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatafileAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name_clean', models.CharField(max_length=512, unique=True)),
+                ('matched_datafile', models.CharField(blank=True, max_length=512)),
+                ('score', models.FloatField(default=0)),
+                ('master_version', models.CharField(blank=True, max_length=64)),
+                ('is_override', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
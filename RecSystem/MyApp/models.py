@@ -12,4 +12,18 @@ class UserProfile(models.Model):
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return self.username
\ No newline at end of file
+        return self.username
+
+class DatafileAlias(models.Model):
+    # Normalized report datafile name -> best master 'Data File Clean' match
+    name_clean = models.CharField(max_length=512, unique=True)
+    matched_datafile = models.CharField(max_length=512, blank=True)
+    score = models.FloatField(default=0)
+    # sha256 of the master workbook the match was computed against
+    master_version = models.CharField(max_length=64, blank=True)
+    # Manual fixes from the admin: always used, never recomputed
+    is_override = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name_clean} -> {self.matched_datafile or '(no match)'}"
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import pickle
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Callable, Optional
+
+from django.http import HttpResponseNotModified
+
+from .metrics import cache_lookup
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Filter-keyed result cache----------------
+# -----------------------------------------------------------------------------------------------------
+# The analytics pages are a pure function of (data version, filters, today's date): today matters
+# because the "last N days" cutoffs move with it. Query results are cached under a hash of exactly
+# that, least recently used first out once the cache holds more than `max_bytes` of pickled
+# results, and dropped wholesale when the data version changes.
+# The same hash (plus the user) is the page's ETag, so a browser re-requesting a GET page with
+# unchanged data and filters gets a 304 without anything being computed or rendered.
+
+def result_key(name: str, data_version: str, params: dict) -> str:
+    payload = json.dumps([name, data_version, date.today().isoformat(), params], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+# What lookup() returns for a key that is not cached (None is a valid result)
+MISSING = object()
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._data_version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _reset_for(self, data_version: str) -> None:
+        if data_version != self._data_version:
+            self._entries.clear()
+            self._bytes = 0
+            self._data_version = data_version
+
+    def lookup(self, key: str, data_version: str):
+        """The cached value, or MISSING."""
+        with self._lock:
+            self._reset_for(data_version)
+            entry = self._entries.get(key)
+            cache_lookup('result', hit=entry is not None)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return MISSING
+
+    def get_or_compute(self, key: str, data_version: str, compute: Callable):
+        value = self.lookup(key, data_version)
+        return self.compute(key, data_version, compute) if value is MISSING else value
+
+    def compute(self, key: str, data_version: str, compute: Callable):
+        """Run compute() and store its value (after a lookup missed)."""
+        # Computed outside the lock; two requests racing on the same key both compute it once
+        value = compute()
+        size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return value
+        with self._lock:
+            if data_version != self._data_version or key in self._entries:
+                return value
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+def etag_for(key: str, user: str = '') -> str:
+    # Pages show the logged-in user, so the tag covers the session user as well as the result
+    return '"%s"' % hashlib.sha1(f'{key}:{user}'.encode()).hexdigest()
+
+
+def not_modified(request, etag: str) -> Optional[HttpResponseNotModified]:
+    """A 304 for a GET/HEAD whose If-None-Match already holds `etag`, else None."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    tags = [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]
+    hit = etag in tags or f'W/{etag}' in tags or '*' in tags
+    cache_lookup('etag', hit)
+    if hit:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    return None
+
+
+def with_etag(response, etag: str):
+    response['ETag'] = etag
+    # Cached, but revalidated on every use
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import DatafileAlias
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Snapshot invalidation----------------
+# -----------------------------------------------------------------------------------------------------
+# Only admin/manual edits to DatafileAlias get here (the matcher stores its aliases with bulk_create,
+# which sends no signals). Every worker rebuilds its snapshot on its next request, so an override
+# shows on the pages without waiting for snapshot_ttl.
+
+@receiver([post_save, post_delete], sender=DatafileAlias)
+def alias_changed(sender, **kwargs):
+    from .engine import config
+    from .engine.snapshot import write_stamp
+
+    write_stamp(config.snapshot_stamp)
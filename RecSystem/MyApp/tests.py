@@ -1,3 +1,1210 @@
-from django.test import TestCase
+import http.server
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from rapidfuzz import fuzz, process
+
+from . import api
+from .api import BadRequest, decode_cursor, encode_cursor
+from .engine.aggregates import build_pair_stats
+from .engine.cube import OfferCube, build_cube, top_positions
+from .engine.dates import parse_dates
+from .engine.fact_store import FactStore
+from .engine.feed_stream import iter_rows, rows_to_frame
+from .engine.normalize import normalize_cached, normalize_series, normalize_string, sponsor_list
+from .engine.ingest import ReportIngestor
+from .engine.matching import DatafileIndex, best_matches
+from .engine.master_cache import cache_dir_for, ensure_master_cache, load_master
+from .engine.publish import DatasetStore
+from .engine.queries import recommend_campaigns_with_datafiles, recommend_from_pair_stats
+from .engine.rollups import RollupStore, bucket_start, build_rollups, season_label
+from .engine.schema import compact_frames
+from .engine.snapshot import SnapshotStore, read_stamp
+from .engine.usage_index import UsageIndex, build_last_used
+from .metrics import UNPARSEABLE_DATES, Counter, Histogram
+from . import engine, views
+from .aliases import overrides_version, resolve_matches
+from .models import DatafileAlias
+from .result_cache import MISSING, ResultCache, etag_for, not_modified, result_key, with_etag
 
 # Create your tests here.
+
+
+class NormalizeParityTests(SimpleTestCase):
+    # The vectorized and memoized normalizers must return exactly what normalize_string returns
+
+    EDGE_CASES = [
+        '', '_', '__', 'Auto_Loan_BSK_1703', 'auto_loan_w4e', 'auto_w4_e', 'x_bsk_bsk_', '_w4e_w4',
+        'health_2024_002', '12_34', '12__a', '2024_12', '19٣٤_a', 'a_12\n_bsk', '  Travel_Madrivo_0  ',
+        'pdS_7_1999_x', None, 12, 1.5, float('nan'),
+    ]
+
+    def random_values(self, n=5000):
+        rng = random.Random(0)
+        pieces = ['_', '_', '1', '0', '19', '20', '2024', 'a', 'b', ' ', 'BSK', 'w4', 'W4E', 'madrivo', '\n', '٣', 'Ä']
+        return [''.join(rng.choice(pieces) for _ in range(rng.randint(0, 10))) for _ in range(n)]
+
+    def assert_parity(self, values, sponsors):
+        expected = [normalize_string(v, sponsors=sponsors) for v in values]
+        series = pd.Series(values, dtype=object, index=[i % 3 for i in range(len(values))])
+        result = normalize_series(series, sponsors=sponsors)
+        self.assertEqual(result.tolist(), expected)
+        self.assertTrue(result.index.equals(series.index))
+        self.assertEqual([normalize_cached(v, sponsors) for v in values], expected)
+
+    def test_edge_cases(self):
+        self.assert_parity(self.EDGE_CASES, sponsor_list)
+        self.assert_parity(self.EDGE_CASES, None)
+
+    def test_random_values(self):
+        values = self.random_values()
+        self.assert_parity(values, sponsor_list)
+        self.assert_parity(values, None)
+
+    def test_empty_series(self):
+        self.assertEqual(normalize_series(pd.Series([], dtype=object), sponsor_list).tolist(), [])
+
+
+class RecommendationParityTests(SimpleTestCase):
+    # The single-pass rankings (rows and pair_stats) must pick the campaigns and files the old
+    # per-campaign loop picked
+
+    SORTS = ['revenue', 'epc', 'cpm', 'performance']
+
+    @staticmethod
+    def per_campaign_loop(merged_df, sort_by, top_n_campaigns, top_n_files):
+        # The ranking as it was before build_pair_stats: one scan of merged_df per top campaign
+        sort_col = {'revenue': 'revenue', 'epc': 'epc', 'cpm': 'cpm', 'performance': 'perf'}[sort_by]
+        agg = 'sum' if sort_by == 'revenue' else 'mean'
+        merged_df = merged_df.copy()
+        merged_df['perf'] = merged_df['revenue'] / merged_df['sent'].replace(0, 1)
+        top_campaigns = (
+            merged_df.groupby('campaign_name')
+            .agg({sort_col: agg})
+            .reset_index()
+            .sort_values(by=sort_col, ascending=False)
+            .head(top_n_campaigns)
+        )
+        grouped = []
+        for camp in top_campaigns['campaign_name']:
+            sub = merged_df[merged_df['campaign_name'] == camp]
+            # (the old column list named cpm twice when sorting by cpm, which pandas rejects)
+            cols = list(dict.fromkeys(['matched_datafile', 'cpm', 'DF Count', 'last_send_date', sort_col]))
+            sub = sub[cols].dropna(subset=['matched_datafile'])
+            sub = sub.drop_duplicates(subset='matched_datafile')
+            sub = sub.groupby('matched_datafile').agg(
+                {sort_col: agg, 'cpm': 'mean', 'DF Count': 'first', 'last_send_date': 'max'}).reset_index()
+            sub = sub.sort_values(by=sort_col, ascending=False).head(top_n_files)
+            grouped.append({'campaign_name': camp, 'files': sub.to_dict('records')})
+        return top_campaigns, grouped
+
+    def random_rows(self, n=3000):
+        # Rows as build_enriched leaves them; continuous metrics, so rankings have no ties
+        rng = random.Random(0)
+        files = [f'file_{i}' for i in range(40)] + [None]
+        rows = pd.DataFrame([{
+            'campaign_name': f'camp_{rng.randint(0, 30)}',
+            'matched_datafile': rng.choice(files),
+            'ISP Name': rng.choice(['Gmail', 'RR', None]),
+            'sponsor': rng.choice(['s1', 's2']),
+            'category': rng.choice(['finance', 'health', None]),
+            'revenue': rng.random() * 100,
+            'clicks': rng.choice([0, rng.randint(1, 50)]),
+            'sent': rng.choice([0, rng.randint(1, 5000)]),
+            'cpm': rng.random() * 5,
+            'DF Count': rng.randint(1, 10 ** 6),
+            'last_send_date': rng.choice([pd.NaT, pd.Timestamp(2024, 1, 1) + pd.Timedelta(days=rng.randint(0, 400))]),
+        } for _ in range(n)])
+        rows['epc'] = rows['revenue'] / rows['clicks'].replace(0, 1)
+        return rows
+
+    def assert_parity(self, expected, result, sort_by):
+        sort_col = 'perf' if sort_by == 'performance' else sort_by
+        (expected_top, expected_groups), (top, groups) = expected, result
+        self.assertEqual(top['campaign_name'].tolist(), expected_top['campaign_name'].tolist())
+        self.assertTrue(np.allclose(top[sort_col], expected_top[sort_col]))
+        self.assertEqual([g['campaign_name'] for g in groups], [g['campaign_name'] for g in expected_groups])
+        for group, expected_group in zip(groups, expected_groups):
+            names = [f['matched_datafile'] for f in group['files']]
+            self.assertEqual(names, [f['matched_datafile'] for f in expected_group['files']])
+            for record, expected_record in zip(group['files'], expected_group['files']):
+                for col in [sort_col, 'cpm', 'DF Count']:
+                    self.assertAlmostEqual(record[col], expected_record[col])
+                self.assertIs(pd.isna(record['last_send_date']), pd.isna(expected_record['last_send_date']))
+                if pd.notna(expected_record['last_send_date']):
+                    self.assertEqual(record['last_send_date'], expected_record['last_send_date'])
+
+    def test_every_sort(self):
+        rows = self.random_rows()
+        pair_stats = build_pair_stats(rows)
+        compact_stats = compact_frames({'pair_stats': pair_stats})['pair_stats']
+        for sort_by in self.SORTS:
+            for top_n_campaigns, top_n_files in [(10, 5), (100, 100)]:
+                with self.subTest(sort_by=sort_by, top_n_campaigns=top_n_campaigns):
+                    expected = self.per_campaign_loop(rows, sort_by, top_n_campaigns, top_n_files)
+                    self.assert_parity(expected, recommend_campaigns_with_datafiles(
+                        rows, sort_by, top_n_campaigns, top_n_files), sort_by)
+                    self.assert_parity(expected, recommend_from_pair_stats(
+                        pair_stats, sort_by, top_n_campaigns, top_n_files), sort_by)
+                    self.assert_parity(expected, recommend_from_pair_stats(
+                        compact_stats, sort_by, top_n_campaigns, top_n_files), sort_by)
+
+    def test_filtered_pair_stats(self):
+        # query_recommendations filters pair_stats by campaign name before ranking
+        rows = self.random_rows()
+        keep = rows['campaign_name'].str.contains('camp_1')
+        pair_stats = build_pair_stats(rows)
+        pair_stats = pair_stats[pair_stats['campaign_name'].str.contains('camp_1', na=False)]
+        for sort_by in self.SORTS:
+            with self.subTest(sort_by=sort_by):
+                self.assert_parity(self.per_campaign_loop(rows[keep], sort_by, 10, 5),
+                                   recommend_from_pair_stats(pair_stats, sort_by, 10, 5), sort_by)
+
+
+class ScriptedFeedServer:
+    """Answers GETs with the next of `script`: an HTTP status, or seconds to stall before a 200."""
+
+    def __init__(self, script, body):
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(handler):
+                step = script.pop(0) if script else 200
+                self.requests += 1
+                if isinstance(step, float):
+                    time.sleep(step)
+                    step = 200
+                payload = body if step == 200 else b'{}'
+                handler.send_response(step)
+                handler.send_header('Content-Type', 'application/json')
+                handler.send_header('Content-Length', str(len(payload)))
+                handler.end_headers()
+                try:
+                    handler.wfile.write(payload)
+                except OSError:
+                    pass  # the client timed out and hung up
+
+            def log_message(handler, *args):
+                pass
+
+        self.requests = 0
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        host, port = self.server.server_address[:2]
+        self.url = f'http://{host}:{port}/report'
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FeedClientTests(SimpleTestCase):
+    body = json.dumps({'data': [
+        {'campaign_name': 'a', 'sent': 10, 'revenue': 1.5, 'extra': 'x'},
+        {'campaign_name': 'b', 'sent': 20, 'revenue': 2.5, 'extra': 'y'},
+    ]}).encode()
+
+    def serve(self, script):
+        server = ScriptedFeedServer(script, self.body)
+        self.addCleanup(server.stop)
+        return server
+
+    def test_submit_gzip(self):
+        from benchmarks.stub_server import StubFeedServer
+        from .engine.fetch import FeedClient
+
+        for gzip in (True, False):
+            client = FeedClient(gzip=gzip)
+            with StubFeedServer({'/report': self.body}) as server:
+                frame = client.submit(server.url('/report'), columns=['campaign_name', 'sent']).result(timeout=10)
+            self.assertEqual(frame.columns.tolist(), ['campaign_name', 'sent'])
+            self.assertEqual(frame['sent'].tolist(), [10, 20])
+
+    def test_retries_5xx(self):
+        from .engine.fetch import FeedClient, FetchError
+
+        server = self.serve([503, 502])
+        frame = FeedClient(retries=3, backoff=0).get_frame(server.url)
+        self.assertEqual(server.requests, 3)
+        self.assertEqual(frame['campaign_name'].tolist(), ['a', 'b'])
+
+        # Out of retries: the last 5xx is raised
+        server = self.serve([503, 503, 503])
+        with self.assertRaises(FetchError):
+            FeedClient(retries=1, backoff=0).get_frame(server.url)
+        self.assertEqual(server.requests, 2)
+
+    def test_timeout(self):
+        from .engine.fetch import FeedClient, FetchError
+
+        server = self.serve([1.0])
+        started = time.monotonic()
+        with self.assertRaises(FetchError):
+            FeedClient(read_timeout=0.2, retries=0).get_frame(server.url)
+        self.assertLess(time.monotonic() - started, 0.9)
+
+        # A stall followed by a quick answer is retried
+        server = self.serve([1.0])
+        frame = FeedClient(read_timeout=0.2, retries=1, backoff=0).get_frame(server.url)
+        self.assertEqual(len(frame), 2)
+
+
+class FeedStreamTests(SimpleTestCase):
+    # Decoding in chunks must give the same frame as json.loads + pd.DataFrame, wherever the cuts fall
+
+    ROWS = [
+        {'campaign_name': 'a "quoted" ü', 'clicks': 1.5e3, 'sent': 10, 'nested': {'x': [1, "]}"]}},
+        {'campaign_name': 'b', 'sent': -2},
+        {'campaign_name': None, 'clicks': 0.25, 'revenue': 3},
+    ]
+
+    def decode(self, raw, chunk_size, columns=None):
+        chunks = (raw[i:i + chunk_size] for i in range(0, len(raw), chunk_size))
+        return rows_to_frame(iter_rows(chunks), columns=columns)
+
+    def test_matches_dataframe(self):
+        doc = {'status': 'ok', 'meta': {'data': [9]}, 'data': self.ROWS, 'tail': 12.5}
+        raw = json.dumps(doc, ensure_ascii=False, indent=1).encode()
+        for chunk_size in (1, 3, 64, len(raw)):
+            pd.testing.assert_frame_equal(self.decode(raw, chunk_size), pd.DataFrame(self.ROWS))
+
+    def test_projection_and_empty(self):
+        raw = json.dumps({'data': self.ROWS}).encode()
+        self.assertEqual(self.decode(raw, 5, columns=['sent', 'revenue']).columns.tolist(), ['sent', 'revenue'])
+        self.assertEqual(self.decode(b'{"data": []}', 2).shape, (0, 0))
+
+    def test_numeric_buffers(self):
+        # Typed buffers (and their fallback to lists) give the dtypes and values pd.DataFrame gives
+        cases = [
+            [{'clicks': 1}, {'clicks': 2}, {'clicks': -3}],
+            [{'sent': 1}, {}, {'sent': 2}],
+            [{'revenue': 1}, {'revenue': 2.5}, {'revenue': 3}],
+            [{}, {'cpm': 1.5}, {'cpm': float('nan')}],
+            [{'epc': 1}, {'epc': '2.5'}, {'epc': 3}],
+            [{'clicks': 1}, {'clicks': None}, {'clicks': 2}],
+            [{'clicks': None}, {'clicks': None}],
+            [{'sent': True}, {'sent': 2}],
+            [{'sent': 2 ** 64}, {'sent': 1}],
+            [{'sent': 1, ' revenue ': 2}, {'sent': [1]}],
+        ]
+        for rows in cases:
+            with self.subTest(rows=rows):
+                raw = json.dumps({'data': rows}).encode()
+                pd.testing.assert_frame_equal(self.decode(raw, 3), pd.DataFrame(rows))
+        frame = self.decode(json.dumps({'data': [{'clicks': 1, 'sent': 2.0}] * 3}).encode(), 7)
+        self.assertEqual(frame.dtypes.tolist(), [np.int64, np.float64])
+
+    def test_truncated_feed(self):
+        raw = json.dumps({'data': self.ROWS}).encode()
+        with self.assertRaises(ValueError):
+            self.decode(raw[:-10], 4)
+
+
+class UsageIndexTests(SimpleTestCase):
+    master = pd.DataFrame({
+        'Data File Clean': ['c_file', 'a_file', 'b_file', None, 'a_file'],
+        'ISP Name': ['Gmail', 'Gmail', 'AOL', 'AOL', 'Yahoo'],
+        'File Series': ['A', 'B', 'A', 'A', 'B'],
+    })
+    report = pd.DataFrame({
+        'campaign_name': ['x', 'x', 'x', 'y', None],
+        'matched_datafile': ['a_file', 'a_file', 'b_file', 'c_file', 'c_file'],
+        'offer_date': ['01-03-2025', '20-03-2025', '10-03-2025', '15-03-2025', '15-03-2025'],
+    })
+
+    def test_unused_since_cutoff(self):
+        index = UsageIndex(build_last_used(self.report), self.master)
+        self.assertEqual(index.unused('x', datetime(2025, 3, 15)), ['b_file', 'c_file'])
+        self.assertEqual(index.unused('x', datetime(2025, 3, 1)), ['c_file'])
+        self.assertEqual(index.unused('x', datetime(2025, 3, 21)), ['a_file', 'b_file', 'c_file'])
+        self.assertEqual(index.unused('x', datetime(2025, 3, 15), isp='Gmail'), ['c_file'])
+        self.assertEqual(index.unused('x', datetime(2025, 3, 15), file_series='A'), ['b_file', 'c_file'])
+        self.assertEqual(index.unused('unknown', datetime(2025, 3, 1), isp='AOL'), ['b_file'])
+
+    def test_no_date_column(self):
+        index = UsageIndex(build_last_used(self.report.drop(columns='offer_date')), self.master)
+        self.assertFalse(index.has_dates)
+
+    def test_compacted_frames(self):
+        data = compact_frames({'master': self.master.copy(), 'last_used': build_last_used(self.report)})
+        self.assertIsInstance(data['last_used']['matched_datafile'].dtype, pd.CategoricalDtype)
+        index = UsageIndex(data['last_used'], data['master'])
+        self.assertEqual(index.unused('x', datetime(2025, 3, 15)), ['b_file', 'c_file'])
+        self.assertEqual(index.unused('x', datetime(2025, 3, 15), isp='Gmail'), ['c_file'])
+
+
+class SchemaTests(SimpleTestCase):
+    def test_shared_categories_and_downcast(self):
+        data = compact_frames({
+            'report': pd.DataFrame({'matched_datafile': ['b', 'a', 'b', 'a', None, 'b'], 'sent': [1, 2, 300, 4, 5, 6]}),
+            'master': pd.DataFrame({'Data File Clean': ['a', 'c', 'c', 'a'], 'DF Count': [1.5, 2.0, None, 4.0]}),
+            'notes': 'not a frame',
+        })
+        report, master = data['report'], data['master']
+        self.assertEqual(report['matched_datafile'].dtype, master['Data File Clean'].dtype)
+        self.assertEqual(list(report['matched_datafile'].cat.categories), ['a', 'b', 'c'])
+        self.assertEqual(report['matched_datafile'].isna().sum(), 1)
+        self.assertEqual(report['sent'].dtype, 'int16')
+        self.assertEqual(report['sent'].tolist(), [1, 2, 300, 4, 5, 6])
+        self.assertEqual(master['DF Count'].dtype, 'float64')
+        self.assertEqual(data['notes'], 'not a frame')
+        merged = report.merge(master, left_on='matched_datafile', right_on='Data File Clean')
+        self.assertIsInstance(merged['matched_datafile'].dtype, pd.CategoricalDtype)
+
+    def test_integral_counts(self):
+        from .engine import schema
+
+        frame = pd.DataFrame({
+            'clicks': [0.0, 3.0, 40000.0], 'sent': [1.0, 2.5, 3.0], 'revenue': [1.0, 2.0, 3.0],
+        })
+        with mock.patch.object(schema, 'memory_mb', wraps=schema.memory_mb) as measure:
+            compact = compact_frames({'report': frame})['report']
+        self.assertEqual(compact['clicks'].dtype, 'int32')
+        self.assertEqual(compact['clicks'].tolist(), [0, 3, 40000])
+        self.assertEqual(compact['sent'].dtype, 'float64')
+        self.assertEqual(compact['revenue'].dtype, 'float64')
+        self.assertEqual(measure.call_count, 0)  # only measured with debug logging on
+
+
+class DatasetStoreTests(SimpleTestCase):
+    def test_mapped_round_trip(self):
+        frames = compact_frames({
+            'report_df': pd.DataFrame({
+                'matched_datafile': ['b', 'a', 'b', 'a', 'b', 'a'],
+                'original_datafile': ['B_1', 'a', None, 'a', 'x', 'B_1'],
+                'clicks': ['1', 2, None, 4, 5, 6],
+                'sent': [1, 2, 300, 4, 5, 6],
+                'day': pd.to_datetime(['2025-01-01', None, '2025-01-03', '2025-01-04', '2025-01-05', '2025-01-06']),
+            }),
+            'enriched_df': pd.DataFrame({'original_datafile': ['a', float('nan'), 'y'], 'revenue': [1.5, None, 2.0]}),
+            'grouped': pd.DataFrame({'revenue': [1.0]}, index=['a']),
+        })
+        with tempfile.TemporaryDirectory() as root:
+            store = DatasetStore(root)
+            version = store.publish(frames)
+            loaded = store.load()
+            self.assertEqual(loaded['source'], version)
+            for name, frame in frames.items():
+                pd.testing.assert_frame_equal(loaded[name], frame)
+            self.assertIsNone(loaded['report_df']['original_datafile'][2])
+            # Columns are views of the read-only files; text values are written once per column name
+            self.assertFalse(loaded['report_df']['sent'].to_numpy().flags.writeable)
+            self.assertEqual(store.read_manifest(version)['text'], 1)
+
+
+class MatchingTests(SimpleTestCase):
+    choices = ['health travel', 'travel health', 'pet cash', 'pet cashback', 'auto loans', 'autos loan', 'news']
+
+    def extract_one(self, name, cutoff=80):
+        # The per-row matching best_matches replaces, match blanked below the threshold
+        choice, score, _ = process.extractOne(name, self.choices, scorer=fuzz.token_sort_ratio)
+        return (choice, score) if score >= cutoff else ('', score)
+
+    def test_best_matches_as_extract_one(self):
+        rng = random.Random(4)
+        names = ['health travel', 'travel  health', 'pet cashb', 'auto loan', 'zzz', '', 'cash']
+        names += [' '.join(rng.sample(['pet', 'cash', 'auto', 'loan', 'travel', 'x'], 2)) for _ in range(40)]
+        best = best_matches(names, self.choices, workers=1)
+        for name in names:
+            self.assertEqual(best[name], self.extract_one(name), name)
+        # Ties: 'health travel' and 'travel health' both score 100, the first choice wins
+        self.assertEqual(best['travel  health'], ('health travel', 100.0))
+        # Below the threshold the score is kept and only the match is blank
+        self.assertEqual(best['zzz'][0], '')
+        self.assertGreater(best['cash'][1], 0)
+        self.assertEqual(best['cash'][0], '')
+
+    def test_index_exact_and_near_miss(self):
+        index = DatafileIndex(self.choices)
+        # Same tokens in another order: exact table, first choice wins
+        self.assertEqual(index.best_match('health travel'), ('health travel', 100.0))
+        self.assertEqual(index.best_match('travel health'), ('health travel', 100.0))
+        # A typo is found through the shared trigrams, with extractOne's score
+        self.assertEqual(index.best_match('pet cashbak'), self.extract_one('pet cashbak'))
+        self.assertEqual(index.best_match('pet cashbak')[0], 'pet cashback')
+        # 'cash' is too short for any choice to reach the cutoff, so no candidate is left to score
+        self.assertEqual(best_matches(['auto loan', 'cash'], self.choices, index=index),
+                         {'auto loan': self.extract_one('auto loan'), 'cash': ('', 0)})
+        # No trigram in common: no candidate, nothing scored
+        self.assertEqual(index.best_match('qqq'), ('', 0))
+
+    def test_index_fallback_past_budget(self):
+        from .engine import matching
+
+        # The filler (too long to match) makes every trigram of 'cashback pet' common, so 'bak',
+        # only in 'bakery', is the rarest one: with a budget of one posting the shortlist misses
+        # 'cashback pet', and the exhaustive pass finds it
+        index = DatafileIndex(['cashback pet', 'bakery', 'cashback pet vv ww xx yy zz'])
+        with mock.patch.object(matching, 'POSTINGS_BUDGET', 1):
+            self.assertEqual(len(index.candidates('cashbak pet', 80)[0]), 0)
+            self.assertTrue(index.candidates('cashbak pet', 80)[1])
+            self.assertEqual(index.best_match('cashbak pet')[0], 'cashback pet')
+        with mock.patch.object(matching, 'MAX_CANDIDATES', 1):
+            self.assertEqual(index.best_match('cashbak pet')[0], 'cashback pet')
+
+
+class MasterCacheTests(SimpleTestCase):
+    def write_master(self, path, files):
+        pd.DataFrame({'Data File': files, 'Sponsor': ['s'] * len(files)}).to_excel(path, index=False)
+
+    def test_compiles_only_on_content_change(self):
+        from .engine import master_cache
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'Master.xlsx')
+            self.write_master(path, ['File_A', 'file b'])
+            with mock.patch.object(master_cache, 'compile_master', wraps=master_cache.compile_master) as compile_:
+                first = ensure_master_cache(path)
+                self.assertEqual(ensure_master_cache(path), first)
+                self.assertEqual(compile_.call_count, 1)
+
+                # mtime-only touch: same hash, no rebuild, new mtime recorded
+                stat = os.stat(path)
+                os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+                touched = ensure_master_cache(path)
+                self.assertEqual(compile_.call_count, 1)
+                self.assertEqual(touched['data_dir'], first['data_dir'])
+                self.assertEqual(touched['source_mtime_ns'], stat.st_mtime_ns + 10 ** 9)
+
+                self.write_master(path, ['File_A', 'file b', 'C'])
+                master_df, version = load_master(path)
+                self.assertEqual(compile_.call_count, 2)
+            self.assertNotEqual(version, first['source_sha256'])
+            self.assertEqual(master_df['Data File Clean'].tolist(), ['file_a', 'file b', 'c'])
+            dirs = [p.name for p in cache_dir_for(path).iterdir() if p.is_dir()]
+            self.assertEqual(dirs, [f'{version[:16]}.v{master_cache.CACHE_FORMAT}'])
+
+    def test_text_columns_map_codes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'Master.xlsx')
+            frame = pd.DataFrame({
+                'Data File': ['b_1', None, 'a_2', 'b_1'],
+                'ISP Name': [None, None, None, None],
+                'DF Count': [3, 1, 2, 5],
+                'Mixed': ['x', 1, None, 'y'],
+            })
+            frame.to_excel(path, index=False)
+            master_df, _ = load_master(path)
+            expected = pd.read_excel(path)
+            self.assertEqual(master_df['Data File'].dtype, pd.CategoricalDtype(['a_2', 'b_1']))
+            # The codes are (a view of) the mapped file
+            codes = master_df['Data File'].cat.codes.to_numpy()
+            while codes.base is not None and not isinstance(codes, np.memmap):
+                codes = codes.base
+            self.assertIsInstance(codes, np.memmap)
+            for col in ['Data File', 'ISP Name', 'Mixed', 'DF Count']:
+                self.assertEqual(master_df[col].astype(object).where(master_df[col].notna(), None).tolist(),
+                                 expected[col].astype(object).where(expected[col].notna(), None).tolist())
+            self.assertEqual(master_df['Data File Clean'].unique().tolist(), ['b', '', 'a'])
+
+    def test_keeps_newer_directories(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'Master.xlsx')
+            self.write_master(path, ['a'])
+            cache_dir = cache_dir_for(path)
+            cache_dir.mkdir()
+            # Another worker's compile in progress, started after this one
+            other = cache_dir / 'ffff.0000.tmp'
+            other.mkdir()
+            future = time.time() + 60
+            os.utime(other, (future, future))
+            meta = ensure_master_cache(path)
+            self.assertTrue(other.is_dir())
+            self.assertTrue((cache_dir / meta['data_dir']).is_dir())
+
+
+class FactStoreTests(SimpleTestCase):
+    rows = pd.DataFrame({
+        'campaign_name': ['c1', 'c1', 'c2', 'c2', 'c3'],
+        'matched_datafile': ['a', 'b', 'b', 'c', None],
+        'sponsor': ['s1', 's1', 's2', 's1', 's1'],
+        'category': ['x', 'y', 'x', 'x', 'x'],
+        'ISP Name': ['Gmail', 'Yahoo', 'Gmail', 'Gmail', None],
+        'offer_date': pd.to_datetime(['2025-01-01', '2025-01-05', '2025-01-10', '2025-01-02', '2025-01-03']),
+        'revenue': [5.0, 1.0, 2.0, 3.0, 9.0],
+        'cpm': [1.0, 2.0, 3.0, 4.0, 5.0],
+        'epc': [0.5, 0.5, 0.5, 0.5, 0.5],
+        'clicks': [1, 2, 3, 4, 5],
+        'sent': [10, 20, 30, 40, 50],
+    })
+    last_used = pd.DataFrame({
+        'campaign_name': ['c1', 'c1'], 'matched_datafile': ['a', 'b'],
+        'last_date': pd.to_datetime(['2025-01-01', '2025-01-05']),
+    })
+    master = pd.DataFrame({
+        'Data File Clean': ['a', 'b', 'c', 'd'], 'ISP Name': ['Gmail', 'Yahoo', 'Gmail', 'Gmail'],
+        'File Series': ['f1', 'f1', 'f2', 'f1'],
+    })
+
+    def store(self, tmp):
+        store = FactStore(os.path.join(tmp, 'facts.sqlite3'))
+        version = store.content_version(self.rows, self.last_used, self.master)
+        self.assertTrue(store.sync(version, self.rows, self.last_used, self.master))
+        return store
+
+    def test_best_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = self.store(tmp)
+            top, count, files = store.best_files()
+            self.assertEqual((count, files), (5, 3))
+            # Sorted by revenue (b: 1 + 2), rows without a file left out
+            self.assertEqual(top['matched_datafile'].tolist(), ['a', 'b', 'c'])
+            self.assertEqual(top['revenue'].tolist(), [5.0, 3.0, 3.0])
+            self.assertEqual(top.loc[1, 'cpm'], 2.5)
+            self.assertEqual(top.loc[1, 'sent'], 50)
+
+            top, count, files = store.best_files(sponsor='s1', isp='Gmail')
+            self.assertEqual((count, files), (2, 2))
+            self.assertEqual(top['matched_datafile'].tolist(), ['a', 'c'])
+
+            # Files sent on/after the cutoff are excluded
+            top, count, _ = store.best_files(cutoff=datetime(2025, 1, 5))
+            self.assertEqual(top['matched_datafile'].tolist(), ['a', 'c'])
+            self.assertEqual(count, 3)
+
+    def test_limit_and_unused(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = self.store(tmp)
+            self.assertEqual(store.best_files(limit=2)[0]['matched_datafile'].tolist(), ['a', 'b'])
+            self.assertEqual(len(store.best_files(limit=None)[0]), 3)
+            self.assertEqual(store.unused_datafiles('c1', datetime(2025, 1, 3)), ['a', 'c', 'd'])
+            self.assertEqual(store.unused_datafiles('c1', datetime(2025, 1, 1), isp='Gmail', file_series='f1'), ['d'])
+
+    def test_sync_by_content(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = self.store(tmp)
+            same = store.content_version(self.rows.copy(), self.last_used, self.master)
+            self.assertFalse(store.sync(same, self.rows, self.last_used, self.master))
+            changed = self.rows.assign(revenue=self.rows['revenue'] + 1)
+            self.assertNotEqual(store.content_version(changed, self.last_used, self.master), same)
+
+
+class PublishTests(SimpleTestCase):
+    def frames(self, n):
+        return {'report_df': pd.DataFrame({'sent': [n, n + 1]})}
+
+    def test_publish_switches_current_last(self):
+        with tempfile.TemporaryDirectory() as root:
+            store = DatasetStore(root)
+            self.assertEqual((store.versions(), store.current_version(), store.load()), ([], None, None))
+
+            def set_current(version):
+                # By now the version is complete and in place, and nothing temporary is left
+                self.assertEqual(store.read_manifest(version)['version'], version)
+                self.assertEqual([p for p in os.listdir(root) if p.endswith('.tmp')], [])
+                set_current.original(version)
+            set_current.original = store._set_current
+            with mock.patch.object(store, '_set_current', side_effect=set_current) as switched:
+                first = store.publish(self.frames(1), meta={'build_seconds': 1.5})
+            self.assertEqual(switched.call_count, 1)
+            self.assertEqual(store.current_version(), first)
+            self.assertEqual(store.read_manifest(first)['build_seconds'], 1.5)
+
+            # A failed write leaves the current version and no partial directory behind
+            with mock.patch('MyApp.engine.publish._save_frame', side_effect=OSError('disk full')):
+                with self.assertRaises(OSError):
+                    store.publish(self.frames(2))
+            self.assertEqual((store.versions(), store.current_version()), ([first], first))
+            self.assertEqual(sorted(os.listdir(root)), sorted([first, 'CURRENT']))
+            self.assertEqual(store.load()['report_df']['sent'].tolist(), [1, 2])
+
+    def test_rollback_and_prune(self):
+        with tempfile.TemporaryDirectory() as root:
+            store = DatasetStore(root, keep=5)
+            versions = [store.publish(self.frames(n)) for n in range(4)]
+            self.assertEqual(store.versions(), versions)
+            self.assertEqual(store.rollback(), versions[2])
+            self.assertEqual(store.load()['source'], versions[2])
+            self.assertEqual(store.rollback(), versions[1])
+
+            # Only the newest `keep` are kept, and never the current one
+            store.keep = 2
+            store.prune()
+            self.assertEqual(store.versions(), versions[1:])
+            self.assertEqual(store.current_version(), versions[1])
+            newest = store.publish(self.frames(9))
+            self.assertEqual(store.versions(), [versions[3], newest])
+
+            store.rollback()
+            with self.assertRaises(ValueError):
+                store.rollback()
+
+    def test_refresh_data_command(self):
+        from django.core.management import CommandError, call_command
+
+        from .engine import pipeline
+
+        with tempfile.TemporaryDirectory() as root:
+            store = DatasetStore(root)
+            with mock.patch.object(pipeline, 'dataset_store', store):
+                with self.assertRaises(CommandError):
+                    call_command('refresh_data', rollback=True, stdout=io.StringIO())
+                first, second = store.publish(self.frames(1)), store.publish(self.frames(2))
+                out = io.StringIO()
+                call_command('refresh_data', list=True, stdout=out)
+                self.assertIn(f'* {second}', out.getvalue())
+                call_command('refresh_data', rollback=True, stdout=io.StringIO())
+                self.assertEqual(store.current_version(), first)
+
+
+class SnapshotStoreTests(SimpleTestCase):
+    @staticmethod
+    def fields(builds, source=None):
+        builds.append(len(builds) + 1)
+        frame = pd.DataFrame()
+        return dict(report_df=frame, campaign_df=frame, master_df=frame, enriched_df=frame, pair_stats=frame,
+                    file_stats=frame, last_used=frame, rollups=frame, usage_index=None, offer_cube=None,
+                    source=source)
+
+    def test_ttl(self):
+        builds = []
+        store = SnapshotStore(lambda: self.fields(builds), ttl=60)
+        with mock.patch('MyApp.engine.snapshot.time.time', return_value=1000.0):
+            first = store.get()
+            self.assertIs(store.get(), first)
+        with mock.patch('MyApp.engine.snapshot.time.time', return_value=1059.0):
+            self.assertIs(store.get(), first)
+        with mock.patch('MyApp.engine.snapshot.time.time', return_value=1061.0):
+            self.assertIsNone(store.peek())
+            self.assertIsNot(store.get(), first)
+        self.assertEqual(len(builds), 2)
+
+        # ttl 0: kept until invalidated
+        store = SnapshotStore(lambda: self.fields(builds), ttl=0)
+        with mock.patch('MyApp.engine.snapshot.time.time', return_value=0.0):
+            first = store.get()
+        self.assertIs(store.get(), first)
+        store.invalidate()
+        self.assertIsNot(store.get(), first)
+        self.assertEqual(store.version, 2)
+
+    def test_probe(self):
+        builds, published = [], {'version': 'p1'}
+        store = SnapshotStore(lambda: self.fields(builds, source=published['version']), ttl=0.001,
+                              probe=lambda: published['version'])
+        first = store.get()
+        time.sleep(0.01)
+        self.assertIs(store.get(), first)  # a published version outlives the TTL
+        published['version'] = 'p2'
+        self.assertIsNone(store.peek())
+        self.assertEqual(store.get().source, 'p2')
+        self.assertEqual(store.latest.source, 'p2')
+        self.assertEqual(len(builds), 2)
+
+    def test_stamp_reaches_other_stores(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            stamp = Path(tmp) / 'cache' / 'snapshot.stamp'
+            builds = []
+            here = SnapshotStore(lambda: self.fields(builds), ttl=0, stamp=stamp)
+            there = SnapshotStore(lambda: self.fields(builds), ttl=0, stamp=stamp)
+            first, other = here.get(), there.get()
+            here.invalidate()
+            self.assertTrue(read_stamp(stamp))
+            self.assertIsNone(there.peek())
+            self.assertIsNot(there.get(), other)
+            self.assertIsNot(here.get(), first)
+            self.assertIs(there.get(), there.latest)
+            self.assertEqual(len(builds), 4)
+
+            # An invalidation while a build runs leaves that build stale
+            def invalidated_meanwhile():
+                there.invalidate()
+                return self.fields(builds)
+            during = SnapshotStore(invalidated_meanwhile, ttl=0, stamp=stamp)
+            during.get()
+            self.assertIsNone(during.peek())
+
+
+class FactStoreSyncTests(SimpleTestCase):
+    def test_published_version_skips_merge(self):
+        from .engine import pipeline
+
+        report = pd.DataFrame({
+            'offer_date': ['01-03-2025', '02-03-2025'], 'campaign_name': ['offer a', 'offer b'],
+            'matched_datafile': ['f1', 'f2'], 'revenue': [1.0, 2.0], 'clicks': [1, 2], 'sent': [10, 20],
+            'cpm': [0.1, 0.2],
+        })
+        campaigns = pd.DataFrame({'campaign_name': ['offer a', 'offer b'], 'sponsor': ['s1', 's2'],
+                                  'category': ['finance', 'auto']})
+        master = pd.DataFrame({'Data File Clean': ['f1', 'f2'], 'ISP Name': ['Gmail', 'Yahoo'],
+                               'File Series': ['x', 'y']})
+
+        # Published versions carry their aggregates
+        frames = pipeline.add_aggregates({'report_df': report, 'campaign_df': campaigns, 'master_df': master,
+                                          'enriched_df': pipeline.build_enriched(report, campaigns, master)})
+
+        def published(version):
+            return {**frames, 'source': version}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = FactStore(os.path.join(tmp, 'facts.sqlite3'))
+            versions = iter(['p1', 'p1', 'p2'])
+            with mock.patch.object(pipeline, 'query_backend', 'sqlite'), \
+                    mock.patch.object(pipeline, 'fact_store', store), \
+                    mock.patch.object(pipeline.dataset_store, 'load', lambda: published(next(versions))), \
+                    mock.patch.object(pipeline, 'build_best_file_rows', wraps=pipeline.build_best_file_rows) as rows:
+                pipeline.build_data_snapshot()
+                self.assertEqual(store.version(), 'p1')
+                self.assertEqual(rows.call_count, 1)
+                pipeline.build_data_snapshot()  # p1 again: nothing merged for the store
+                self.assertEqual(rows.call_count, 1)
+                pipeline.build_data_snapshot()
+                self.assertEqual(store.version(), 'p2')
+                self.assertEqual(rows.call_count, 2)
+
+
+class OffloadTests(SimpleTestCase):
+    def test_deadline(self):
+        from .engine import offload
+
+        started = time.monotonic()
+        with self.assertRaises(offload.DeadlineExceeded):
+            async_to_sync(offload.run)(time.sleep, 0.5, deadline=offload.new_deadline(0.05))
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(async_to_sync(offload.run)(sum, [1, 2], deadline=offload.new_deadline(5)), 3)
+
+    def test_cached_none(self):
+        cache = ResultCache()
+        self.assertIs(cache.lookup('k', 'v1'), MISSING)
+        self.assertIsNone(cache.compute('k', 'v1', lambda: None))
+        self.assertIsNone(cache.lookup('k', 'v1'))
+        self.assertIs(cache.lookup('k', 'v2'), MISSING)
+
+
+class RollupTests(SimpleTestCase):
+    def frames(self, days):
+        report = pd.DataFrame({
+            'offer_date': [d.strftime('%d-%m-%Y') for d in days],
+            'campaign_name': ['Offer A', 'offer b'] * (len(days) // 2),
+            'matched_datafile': ['f1', 'f2'] * (len(days) // 2),
+            'revenue': 1.5, 'clicks': 2, 'sent': 100,
+        })
+        campaigns = pd.DataFrame({'campaign_name': ['offer a', 'Offer B'], 'sponsor': ['s1', 's2'],
+                                  'category': ['finance', None]})
+        master = pd.DataFrame({'Data File Clean': ['f1', 'f2'], 'ISP Name': ['Gmail', 'RR']})
+        return report, campaigns, master
+
+    def test_buckets(self):
+        days = pd.to_datetime(['2024-12-01', '2025-02-28', '2025-03-01', '2025-01-05'])
+        self.assertEqual(list(bucket_start(days, 'season').astype('datetime64[D]').astype(str)),
+                         ['2024-12-01', '2024-12-01', '2025-03-01', '2024-12-01'])
+        # 2025-01-05 was a Sunday
+        self.assertEqual(str(bucket_start(days[3:], 'week')[0])[:10], '2024-12-30')
+        self.assertEqual(season_label(pd.Timestamp('2024-12-01')), 'Winter 2024-25')
+
+    def test_incremental_matches_full(self):
+        days = list(pd.date_range('2025-01-20', periods=40, freq='D'))
+        with tempfile.TemporaryDirectory() as tmp:
+            store = RollupStore(f'{tmp}/rollups.pkl', overlap_days=2)
+            store.update(*self.frames(days[:30]), 'm1')
+            report, campaigns, master = self.frames(days)
+            rollups = store.update(report, campaigns, master, 'm1')
+            self.assertIsNotNone(store.last_window)
+            full = build_rollups(report, campaigns, master)
+            key = ['grain', 'bucket', 'category', 'sponsor', 'ISP Name']
+            pd.testing.assert_frame_equal(
+                rollups.sort_values(key).reset_index(drop=True), full.sort_values(key).reset_index(drop=True))
+            self.assertEqual(rollups.loc[rollups['grain'] == 'season', 'rows'].sum(), 40)
+            # A changed campaign category rebuilds from scratch
+            store.update(report, campaigns.assign(category='travel'), master, 'm1')
+            self.assertIsNone(store.last_window)
+            # So does a changed admin override
+            store.update(report, campaigns.assign(category='travel'), master, 'm1', '1:2025-03-01')
+            self.assertIsNone(store.last_window)
+
+
+class OfferCubeTests(SimpleTestCase):
+    def test_blocks_match_filtered_rollup(self):
+        rng = random.Random(3)
+        rows = pd.DataFrame([{
+            'campaign_name': rng.choice(['c1', 'c2', 'c3', None]),
+            'matched_datafile': rng.choice(['f1', 'f2', 'f3', 'f4', None]),
+            'ISP Name': rng.choice(['Gmail', 'RR', None]),
+            'sponsor': rng.choice(['s1', 's2']),
+            'category': rng.choice(['finance', None]),
+            'revenue': rng.random() * 10, 'clicks': rng.randint(0, 5), 'sent': 100, 'cpm': 1.0, 'epc': 0.5,
+        } for _ in range(300)])
+        file_stats = compact_frames({'file_stats': build_pair_stats(rows)})['file_stats']
+        cube = OfferCube(*build_cube(file_stats), file_stats)
+        self.assertEqual(cube.options['ISP Name'], ['All', 'Gmail', 'RR'])
+        for isp, sponsor, category in [('All', 'All', 'All'), ('Gmail', 'All', 'All'), ('RR', 's2', 'finance')]:
+            expected = rows
+            for col, value in [('ISP Name', isp), ('sponsor', sponsor), ('category', category)]:
+                if value != 'All':
+                    expected = expected[expected[col] == value]
+            expected = expected.groupby('campaign_name')['revenue'].sum().sort_values(ascending=False)
+            top = OfferCube.top(cube.block('offer', isp, sponsor, category), 2)
+            self.assertEqual(top['campaign_name'].tolist(), expected.index[:2].tolist())
+            self.assertTrue(np.allclose(top['revenue'], expected.iloc[:2]))
+        offers = cube.file_offers(['f1'], 'Gmail')
+        self.assertAlmostEqual(offers['revenue'].sum(), rows.loc[
+            (rows['matched_datafile'] == 'f1') & (rows['ISP Name'] == 'Gmail') & rows['campaign_name'].notna(), 'revenue'].sum())
+
+    def test_top_positions(self):
+        values = np.array([3.0, 9.0, 1.0, 9.5, 4.0])
+        self.assertEqual(top_positions(values, 2).tolist(), [3, 1])
+        self.assertEqual(top_positions(values, None).tolist(), [3, 1, 4, 0, 2])
+        self.assertEqual(top_positions(values, 0).tolist(), [])
+
+
+class DateParsingTests(SimpleTestCase):
+    values = pd.Series(['05-03-2025', '2025-03-06', 'N/A', None, '', '05-03-2025', '31/12/2024'] * 3)
+
+    def test_matches_to_datetime(self):
+        expected = pd.to_datetime(self.values, format='%d-%m-%Y', errors='coerce')
+        pd.testing.assert_series_equal(parse_dates(self.values), expected)
+        pd.testing.assert_series_equal(parse_dates(self.values.astype('category')), expected)
+
+    def test_lenient_and_count(self):
+        before = UNPARSEABLE_DATES.value(column='test_date', mode='lenient')
+        parsed = parse_dates(self.values, strict=False, column='test_date')
+        self.assertEqual(parsed.iloc[:7].dt.strftime('%Y-%m-%d').fillna('-').tolist(),
+                         ['2025-03-05', '2025-03-06', '-', '-', '-', '2025-03-05', '2024-12-31'])
+        # Only 'N/A': missing and blank values are not counted
+        self.assertEqual(UNPARSEABLE_DATES.value(column='test_date', mode='lenient') - before, 3)
+
+
+class ETagTests(SimpleTestCase):
+    def test_key_per_day_and_user(self):
+        key = result_key('best_files', 'v1', ['All', 0])
+        self.assertEqual(key, result_key('best_files', 'v1', ['All', 0]))
+        self.assertNotEqual(key, result_key('best_files', 'v2', ['All', 0]))
+        with mock.patch('MyApp.result_cache.date') as fake_date:
+            fake_date.today.return_value = date(2030, 1, 2)
+            self.assertNotEqual(key, result_key('best_files', 'v1', ['All', 0]))
+        self.assertNotEqual(etag_for(key, 'alice'), etag_for(key, 'bob'))
+        self.assertTrue(etag_for(key, 'alice').startswith('"'))
+
+    def test_not_modified(self):
+        etag = etag_for('k', 'alice')
+        factory = RequestFactory()
+        response = not_modified(factory.get('/', HTTP_IF_NONE_MATCH=f'"other", W/{etag}'), etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertIsNone(not_modified(factory.get('/', HTTP_IF_NONE_MATCH='"other"'), etag))
+        self.assertIsNone(not_modified(factory.get('/'), etag))
+        self.assertIsNone(not_modified(factory.post('/', HTTP_IF_NONE_MATCH=etag), etag))
+        response = with_etag(HttpResponse('ok'), etag)
+        self.assertEqual((response['ETag'], response['Cache-Control']), (etag, 'private, no-cache'))
+
+
+class SessionViewTests(TestCase):
+    # An async page behind SessionMiddleware with a logged-in (database) session, sync and async clients
+    def setUp(self):
+        session = self.client.session
+        session['username'] = 'alice'
+        session.save()
+        self.async_client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+        report = pd.DataFrame({
+            'offer_date': ['01-03-2025', '02-03-2025'], 'campaign_name': ['offer a', 'offer a'],
+            'matched_datafile': ['f1', 'f1'], 'revenue': 1.0, 'clicks': 1, 'sent': 10,
+        })
+        campaigns = pd.DataFrame({'campaign_name': ['offer a'], 'sponsor': ['s1'], 'category': ['finance']})
+        master = pd.DataFrame({'Data File Clean': ['f1'], 'ISP Name': ['Gmail']})
+        snapshot = SimpleNamespace(data_version='v1', rollups=build_rollups(report, campaigns, master))
+
+        async def fake_snapshot(deadline):
+            return snapshot
+        for patcher in [mock.patch('MyApp.engine.offload.snapshot', fake_snapshot),
+                        mock.patch.multiple(views, report_url='http://feed', campaign_url='http://feed',
+                                            master_path=__file__)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        views.result_cache.clear()
+
+    def test_logged_in_page_and_304(self):
+        response = self.client.get('/season-performance/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'async context')
+        self.assertContains(response, 'finance')
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/season-performance/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = async_to_sync(self.async_client.get)('/season-performance/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_logout(self):
+        response = self.client.get('/logout/')
+        self.assertRedirects(response, '/login/', fetch_redirect_response=False)
+        self.assertNotIn('username', self.client.session)
+
+
+class AliasTests(TestCase):
+    def matcher(self, calls, results):
+        def match_new(names):
+            calls.append(sorted(names))
+            return {name: results[name] for name in names}
+        return match_new
+
+    def test_reuse_and_rematch(self):
+        calls = []
+        results = {'a': ('file_a', 90.0), 'b': ('', 40.0)}
+        first = resolve_matches(['a', 'b', 'a'], 'm1', self.matcher(calls, results))
+        self.assertEqual(first, {'a': ('file_a', 90.0, False), 'b': ('', 40.0, False)})
+
+        # Same master: both come from the table, one new name is matched
+        again = resolve_matches(['a', 'b', 'c'], 'm1', self.matcher(calls, {'c': ('file_c', 85.0)}))
+        self.assertEqual(calls, [['a', 'b'], ['c']])
+        self.assertEqual(again['a'], ('file_a', 90.0, False))
+
+        # A new master version invalidates the stored matches, which are rewritten
+        results = {'a': ('file_a2', 95.0), 'b': ('file_b', 88.0)}
+        rematched = resolve_matches(['a', 'b'], 'm2', self.matcher(calls, results))
+        self.assertEqual(calls[-1], ['a', 'b'])
+        self.assertEqual(rematched['b'], ('file_b', 88.0, False))
+        self.assertEqual(DatafileAlias.objects.get(name_clean='a').master_version, 'm2')
+        self.assertEqual(DatafileAlias.objects.count(), 3)
+
+    def test_override_wins(self):
+        calls = []
+        DatafileAlias.objects.create(name_clean='a', matched_datafile='manual', score=0, is_override=True)
+        resolved = resolve_matches(['a', 'b'], 'm1', self.matcher(calls, {'a': ('fuzzy', 99.0), 'b': ('file_b', 90.0)}))
+        self.assertEqual(calls, [['b']])
+        self.assertEqual(resolved['a'], ('manual', 0.0, True))
+        # Still used (and left as it is) after the master changes
+        resolve_matches(['a'], 'm2', self.matcher(calls, {}))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(DatafileAlias.objects.get(name_clean='a').matched_datafile, 'manual')
+
+        # Broadcast: an override is used whatever its score, fuzzy matches only above the threshold
+        from .engine.pipeline import fuzzy_match_datafiles
+
+        master = pd.DataFrame({'Data File': ['gm_file_one', 'other']})
+        report = pd.DataFrame({'original_datafile': ['gm_file_one']})
+        DatafileAlias.objects.create(name_clean='gm_file_one', matched_datafile='other', score=10, is_override=True)
+        report, _ = fuzzy_match_datafiles(report, master, master_version='m1')
+        self.assertEqual(report['matched_datafile'].tolist(), ['other'])
+
+
+class SnapshotInvalidationTests(TestCase):
+    def test_alias_edits_and_command(self):
+        from django.core.management import call_command
+
+        from .aliases import save_aliases
+        from .engine import config
+
+        with tempfile.TemporaryDirectory() as tmp:
+            stamp = Path(tmp) / 'snapshot.stamp'
+            with mock.patch.object(config, 'snapshot_stamp', stamp):
+                save_aliases({'a': ('file_a', 90.0)}, 'm1')  # the matcher's own writes
+                self.assertEqual(read_stamp(stamp), '')
+                alias = DatafileAlias.objects.get(name_clean='a')
+                alias.matched_datafile, alias.is_override = 'file_b', True
+                alias.save()
+                saved = read_stamp(stamp)
+                self.assertTrue(saved)
+                alias.delete()
+                deleted = read_stamp(stamp)
+                self.assertNotEqual(deleted, saved)
+                call_command('invalidate_snapshot', stdout=io.StringIO())
+                self.assertNotIn(read_stamp(stamp), ('', deleted))
+
+
+class IngestTests(SimpleTestCase):
+    @staticmethod
+    def match(names_df):
+        return names_df.assign(original_datafile_clean=names_df['original_datafile'].str.lower(),
+                               matched_datafile=names_df['original_datafile'].str.lower(), match_score=100.0)
+
+    def test_full_feed_stores_no_rows(self):
+        report = pd.DataFrame({'offer_date': ['01-03-2025', '02-03-2025'], 'original_datafile': ['A', 'B']})
+        calls = []
+        with tempfile.TemporaryDirectory() as tmp:
+            ingestor = ReportIngestor(tmp, fetch=lambda params: calls.append(params) or report)
+            matched = mock.Mock(side_effect=self.match)
+            ingestor.refresh(matched, 'm1')
+            rows = ingestor.refresh(matched, 'm1')
+            self.assertEqual(rows['matched_datafile'].tolist(), ['a', 'b'])
+            self.assertEqual(calls, [None, None])
+            self.assertEqual(matched.call_count, 1)  # names are still reused
+            self.assertFalse(os.path.exists(os.path.join(tmp, 'rows.pkl')))
+            self.assertTrue(os.path.exists(os.path.join(tmp, 'names.pkl')))
+
+    def test_window_keeps_undated_rows(self):
+        full = pd.DataFrame({
+            'offer_date': ['01-01-2025', 'n/a', '09-03-2025', '10-03-2025'],
+            'original_datafile': ['old', 'undated', 'recent', 'last'],
+        })
+        feeds = [
+            full,
+            # The window: the last days only, no undated rows
+            pd.DataFrame({'offer_date': ['09-03-2025', '10-03-2025', '11-03-2025'],
+                          'original_datafile': ['recent', 'last', 'new']}),
+            # Undated rows sent again: they replace the stored ones
+            pd.DataFrame({'offer_date': ['10-03-2025', '11-03-2025', ''], 'original_datafile': ['last', 'new', 'undated2']}),
+        ]
+        calls = []
+
+        def fetch(params):
+            calls.append(params)
+            return feeds[len(calls) - 1]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            ingestor = ReportIngestor(tmp, fetch=fetch, since_param='since', overlap_days=1)
+            ingestor.refresh(self.match, 'm1')
+            rows = ingestor.refresh(self.match, 'm1')
+            self.assertEqual(calls[1], {'since': '09-03-2025'})
+            self.assertEqual(sorted(rows['matched_datafile']), ['last', 'new', 'old', 'recent', 'undated'])
+            rows = ingestor.refresh(self.match, 'm1')
+            self.assertEqual(sorted(rows['matched_datafile']), ['last', 'new', 'old', 'recent', 'undated2'])
+
+
+class IngestAliasTests(TestCase):
+    def test_override_reaches_stored_names(self):
+        from .engine.pipeline import fuzzy_match_datafiles
+
+        master = pd.DataFrame({'Data File': ['gm_file_one', 'gm_file_two'], 'ISP Name': ['Gmail', 'Gmail']})
+        report = pd.DataFrame({'offer_date': ['01-03-2025'] * 2, 'original_datafile': ['GM_FILE_ONE_123', 'gm_file_two']})
+        matched = []
+
+        def match(names_df):
+            matched.append(len(names_df))
+            return fuzzy_match_datafiles(names_df, master.copy(), master_version='m1')[0]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            ingestor = ReportIngestor(tmp, fetch=lambda params: report)
+            rows = ingestor.refresh(match, 'm1', overrides_version())
+            self.assertEqual(rows['matched_datafile'].tolist(), ['gm_file_one', 'gm_file_two'])
+            ingestor.refresh(match, 'm1', overrides_version())
+            self.assertEqual(matched, [2])  # the second refresh reused the stored names
+
+            DatafileAlias.objects.filter(name_clean='gm_file_one').update(
+                matched_datafile='gm_file_two', score=100, is_override=True)
+            rows = ingestor.refresh(match, 'm1', overrides_version())
+            self.assertEqual(rows['matched_datafile'].tolist(), ['gm_file_two', 'gm_file_two'])
+
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        cursor = encode_cursor('20250101T000000-abc', 300)
+        self.assertNotIn('=', cursor)
+        self.assertEqual(decode_cursor(cursor), ('20250101T000000-abc', 300))
+
+    def test_invalid(self):
+        for cursor in ('garbage', encode_cursor('v', 1)[:-3], 'e30'):
+            with self.assertRaises(BadRequest):
+                decode_cursor(cursor)
+
+
+class LazyImportTests(SimpleTestCase):
+    def test_urls_do_not_load_pandas(self):
+        # manage.py check / autoreload load the URLconf; the data stack loads on first use
+        code = ("import django, sys; django.setup(); import MyApp.urls; "
+                "sys.exit('pandas' in sys.modules or 'rapidfuzz' in sys.modules)")
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'RecSystem.settings'}
+        result = subprocess.run([sys.executable, '-c', code], cwd=settings.BASE_DIR, env=env, capture_output=True)
+        self.assertEqual(result.returncode, 0, result.stderr.decode())
+
+
+class ApiTests(TestCase):
+    # JSON pages and exports of the best files result, with the query and the snapshot faked
+    def setUp(self):
+        session = self.client.session
+        session['username'] = 'alice'
+        session.save()
+        self.files = pd.DataFrame({
+            'matched_datafile': ['f1', 'f2', 'f3', 'f4', 'f5'], 'revenue': [5.0, 4.0, 3.0, 2.0, 1.0],
+            'day': pd.to_datetime(['2025-03-01'] * 5),
+        })
+        self.query = mock.Mock(return_value=(self.files, 9, 5))
+
+        async def fake_snapshot(deadline):
+            return SimpleNamespace(data_version='v1')
+        for patcher in [mock.patch('MyApp.engine.offload.snapshot', fake_snapshot),
+                        mock.patch('MyApp.engine.queries.query_best_files', self.query),
+                        mock.patch.multiple(api.config, report_url='http://feed', campaign_url='http://feed',
+                                            master_path=__file__)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        views.result_cache.clear()
+
+    def test_pages(self):
+        body = self.client.get('/best-files/api/', {'sponsor': 's1', 'page_size': 2}).json()
+        self.assertEqual((body['count'], body['record_count'], body['data_version']), (5, 9, 'v1'))
+        self.assertEqual([row['matched_datafile'] for row in body['results']], ['f1', 'f2'])
+        self.assertEqual(body['results'][0]['day'], '2025-03-01T00:00:00.000')
+        seen = []
+        while body['next_cursor']:
+            body = self.client.get('/best-files/api/', {'sponsor': 's1', 'page_size': 2, 'cursor': body['next_cursor']}).json()
+            seen += [row['matched_datafile'] for row in body['results']]
+        self.assertEqual(seen, ['f3', 'f4', 'f5'])
+        # One query for the three pages: the frame comes from the result cache
+        self.assertEqual(self.query.call_count, 1)
+        self.assertEqual(self.query.call_args[0][1:4], ('s1', 'All', 'All'))
+
+    def test_bad_requests(self):
+        stale = encode_cursor('v0', 2)
+        self.assertEqual(self.client.get('/best-files/api/', {'cursor': stale}).status_code, 409)
+        self.assertEqual(self.client.get('/best-files/api/', {'exclude_days': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/best-files/export/', {'format': 'pdf'}).status_code, 400)
+        self.client.session.flush()
+        self.client.cookies.clear()
+        self.assertEqual(self.client.get('/best-files/api/').status_code, 401)
+
+    def test_deadline(self):
+        async def late_snapshot(deadline):
+            raise engine.offload.DeadlineExceeded('late')
+        with mock.patch('MyApp.engine.offload.snapshot', late_snapshot):
+            response = self.client.get('/best-files/api/')
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(response.json()['error'], views.TOO_SLOW)
+
+    def test_csv_export(self):
+        with mock.patch.object(api, 'CSV_CHUNK_ROWS', 2):
+            response = self.client.get('/best-files/export/')
+            chunks = [chunk.decode() for chunk in response.streaming_content]
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('best_files.csv', response['Content-Disposition'])
+        self.assertEqual(len(chunks), 3)
+        lines = ''.join(chunks).splitlines()
+        self.assertEqual(lines[0], 'matched_datafile,revenue,day')
+        self.assertEqual(lines[1:], [f'f{i},{6 - i}.0,2025-03-01' for i in range(1, 6)])
+
+    def test_xlsx_export(self):
+        from io import BytesIO
+
+        from openpyxl import load_workbook
+
+        response = self.client.get('/best-files/export/', {'format': 'xlsx'})
+        self.assertIn('best_files.xlsx', response['Content-Disposition'])
+        sheet = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        rows = list(sheet.values)
+        self.assertEqual(rows[0], ('matched_datafile', 'revenue', 'day'))
+        self.assertEqual(rows[1], ('f1', 5, datetime(2025, 3, 1)))
+        self.assertEqual(len(rows), 6)
+
+
+class MetricsTests(SimpleTestCase):
+    def test_text_format(self):
+        histogram = Histogram('t_seconds', 'help', ['stage'], buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, stage='a"b')
+        self.assertEqual(histogram.samples(), [
+            't_seconds_bucket{stage="a\\"b",le="0.1"} 2',
+            't_seconds_bucket{stage="a\\"b",le="1.0"} 3',
+            't_seconds_bucket{stage="a\\"b",le="+Inf"} 4',
+            't_seconds_sum{stage="a\\"b"} 3.65',
+            't_seconds_count{stage="a\\"b"} 4',
+        ])
+        counter = Counter('t_total', 'help', ['cache', 'result'])
+        counter.inc(cache='result', result='hit')
+        counter.inc(2, cache='result', result='hit')
+        self.assertEqual(counter.samples(), ['t_total{cache="result",result="hit"} 3'])
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, metrics, views
 
 urlpatterns = [
     path('', views.user_login, name='login'),  # root URL goes to login page
@@ -8,8 +8,21 @@ urlpatterns = [
     path('logout/', views.user_logout, name='logout'),
     path('recommendations/', views.recommendations, name='recommendations'),
     path('unused-ds/', views.unuse_DS, name='unuse_DS'),
-    path('logout/', views.user_logout, name='logout'),
     path('best-files/', views.best_files_view, name='best_files'),
+    path('top-offers/', views.top_offers, name='top_offers'),
+    path('file-top-offers/', views.file_top_offers, name='file_top_offers'),
+    path('season-performance/', views.season_performance, name='season_performance'),
+
+    # JSON (cursor-paginated) and CSV/Excel exports of the same results
+    path('recommendations/api/', api.recommendations_api, name='recommendations_api'),
+    path('recommendations/export/', api.recommendations_export, name='recommendations_export'),
+    path('unused-ds/api/', api.unused_ds_api, name='unuse_DS_api'),
+    path('unused-ds/export/', api.unused_ds_export, name='unuse_DS_export'),
+    path('best-files/api/', api.best_files_api, name='best_files_api'),
+    path('best-files/export/', api.best_files_export, name='best_files_export'),
+
+    # Prometheus text format, for the scrapers
+    path('metrics', metrics.metrics_view, name='metrics'),
     
 
 ]
@@ -2,84 +2,20 @@
 #-------Import-----------
 #----------------------------------------------------------------------------------------------------------
 
+from asgiref.sync import sync_to_async
 from django.http import HttpResponse
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth.hashers import make_password, check_password
-from django.contrib.auth import logout as auth_logout
 from .models import UserProfile
-import pandas as pd
-import re
-from rapidfuzz import process, fuzz
-import requests
-from datetime import datetime, timedelta
+from datetime import date
 from pathlib import Path
-from typing import Dict, Any
-
-# Enhanced function to parse .env file
-def load_env(env_path: str = '.env') -> Dict[str, str]:
-    config = {}
-    if not Path(env_path).exists():
-        print(f"Warning: {env_path} not found. Using empty config.")
-        return config
-    
-    with open(env_path, 'r', encoding='utf-8') as f:
-        in_multiline = False
-        current_key = None
-        current_value = []
-        
-        for line_num, line in enumerate(f, 1):
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue  # Skip empty or comment lines
-            
-            # Handle multiline values (basic, ends at next key or EOF)
-            if in_multiline:
-                if '=' in line and not line.startswith(' ' * (len(current_key) + 1)):  # New key starts
-                    config[current_key] = ' '.join(current_value).strip().strip('"\'')
-                    current_key = None
-                    in_multiline = False
-                else:
-                    current_value.append(line)
-                    continue
-            
-            if '=' in line:
-                parts = line.split('=', 1)
-                key = parts[0].strip()
-                value_part = parts[1].strip()
-                
-                # Handle quoted values
-                if (value_part.startswith('"') and value_part.endswith('"')) or \
-                   (value_part.startswith("'") and value_part.endswith("'")):
-                    value = value_part[1:-1]
-                else:
-                    value = value_part
-                
-                if value.endswith('\\'):  # Simple multiline indicator
-                    in_multiline = True
-                    current_key = key
-                    current_value = [value[:-1]]  # Remove \
-                else:
-                    config[key] = value
-            else:
-                print(f"Warning: Invalid line {line_num}: {line}")
-    
-    # Handle any pending multiline
-    if current_key:
-        config[current_key] = ' '.join(current_value).strip().strip('"\'')
-    
-    return config
-
-# Load config from .env once at module level
-config = load_env()
-report_url = config.get('report_url')
-campaign_url = config.get('campaign_url')
-master_path = config.get('master_path')
-
-print("Loaded config:")
-for k, v in config.items():
-    print(f"  {k}: {v}") 
 
+# The data logic lives in MyApp.engine; its submodules (pandas, rapidfuzz, requests) load on first use
+from . import engine
+from .engine.config import campaign_url, config, master_path, report_url
+from .metrics import stage
+from .result_cache import ResultCache, etag_for, not_modified, result_key, with_etag
 
 # --------------------------------------------------------------------------------------
                   #--------------login page----------------      
@@ -118,17 +54,6 @@ def user_login(request):
 
 #---------------------------------------------------------------------------------------------------------
                             #---------------------logout------------------------
-#----------------------------------------------------------------------------------------------------------
-
-def user_logout(request):
-    auth_logout(request)  # Use Django's logout to clear session and auth
-    # Clear custom session key as well
-    if 'username' in request.session:
-        del request.session['username']
-    request.session.flush()  # Fully clear the session
-    messages.info(request, 'You have been logged out successfully.')
-    return redirect('login')
-
 
 
 # -----------------------------------------------------------------------------------------------------   
@@ -152,305 +77,35 @@ def user_logout(request):
     return redirect('login')
 
 
-
-
 #---------------------------------------------------------------------------------------------------------
-                            #-------comman variables  starts-----------
+                            #-------shared data snapshot-----------
 #----------------------------------------------------------------------------------------------------------
+# The snapshot itself is engine.pipeline.data_snapshot
 
+# Query results per (data version, filters, day), LRU within result_cache_mb of pickled results
+result_cache = ResultCache(max_bytes=int(float(config.get('result_cache_mb', 64)) * 1024 * 1024))
+
+async def page_cache(request, name, snapshot, params):
+    # Result cache key and ETag of one analytics page for these filters. The session is loaded
+    # from the DB on first access, so the async views read it with aget()
+    key = result_key(name, snapshot.data_version, params)
+    user = await request.session.aget('username', '') if hasattr(request, 'session') else ''
+    return key, etag_for(key, user)
+
+
+# The analytics pages are async views: waiting on the snapshot or a query (run on
+# engine.offload's thread pools, within request_deadline) does not hold a server thread
+async def render_async(*args, **kwargs):
+    # Templates and their context processors may use the session/DB, so they render as sync code
+    return await sync_to_async(render)(*args, **kwargs)
+
+TOO_SLOW = 'The report data is taking too long to load, please try again in a moment.'
 
-sponsor_list = ['BSK','CFW','DAG','DFO','EFL','GWM','LLS','Madrivo','NIW','PDS','W4','W4E']
-
-# Normalization
-def normalize_string(s, sponsors=None):
-    import re
-
-    if not isinstance(s, str):
-        s = str(s)
-
-    s = s.lower().strip()
-
-    # Remove sponsor tags (same as your original)
-    if sponsors:
-        for sponsor in sponsors:
-            s = s.replace(f"_{sponsor.lower()}_", "_")
-            s = s.replace(f"_{sponsor.lower()}", "")
-
-    # ✅ Remove trailing numeric suffixes (e.g., _1703, _002, etc.)
-    s = re.sub(r'_\d+$', '', s)
-
-    # Split into parts
-    parts = s.split('_')
-    cleaned_parts = []
-
-    for part in parts:
-        # Keep numbers that are internal (like 2024), skip meaningless numeric parts
-        if re.fullmatch(r'\d+', part):
-            # Skip only if it's not a year-like pattern (e.g., not 2024)
-            if not (len(part) == 4 and part.startswith(('19', '20'))):
-                continue
-        cleaned_parts.append(part)
-
-    return '_'.join(cleaned_parts)
-
-
-# Fuzzy match
-def fuzzy_match_datafiles(report_df, master_df, threshold=80):
-    report_df['original_datafile_clean'] = report_df['original_datafile'].fillna('').apply(
-        lambda x: normalize_string(x, sponsors=sponsor_list)
-    )
-    master_df['Data File Clean'] = master_df['Data File'].fillna('').apply(lambda x: normalize_string(x))
-    all_files = master_df['Data File Clean'].unique().tolist()
-    matches, scores = [], []
-    for df_name in report_df['original_datafile_clean']:
-        match, score, _ = process.extractOne(df_name, all_files, scorer=fuzz.token_sort_ratio)
-        matches.append(match if score >= threshold else '')
-        scores.append(score)
-    report_df['matched_datafile'] = matches
-    report_df['match_score'] = scores
-    return report_df
-
-import re  # Move this to top-level imports if not already
-
-def normalize_string(s, sponsors=None):
-    if not isinstance(s, str):
-        s = str(s)
-
-    s = s.lower().strip()
-
-    # Remove sponsor tags
-    if sponsors:
-        for sponsor in sponsors:
-            s = s.replace(f"_{sponsor.lower()}_", "_")
-            s = s.replace(f"_{sponsor.lower()}", "")
-
-    # Remove trailing numeric suffixes
-    s = re.sub(r'_\d+$', '', s)
-
-    # Split into parts
-    parts = s.split('_')
-    cleaned_parts = []
-
-    for part in parts:
-        # Keep numbers that are internal (like 2024), skip meaningless numeric parts
-        if re.fullmatch(r'\d+', part):
-            # Skip only if it's not a year-like pattern
-            if not (len(part) == 4 and part.startswith(('19', '20'))):
-                continue
-        cleaned_parts.append(part)
-
-    return '_'.join(cleaned_parts)
-
-# Fuzzy match (fixed unpacking and return both DataFrames)
-def fuzzy_match_datafiles(report_df, master_df, threshold=80):
-    report_df['original_datafile_clean'] = report_df['original_datafile'].fillna('').apply(
-        lambda x: normalize_string(x, sponsors=sponsor_list)
-    )
-    master_df['Data File Clean'] = master_df['Data File'].fillna('').apply(lambda x: normalize_string(x))
-    all_files = master_df['Data File Clean'].unique().tolist()
-    matches, scores = [], []
-    for df_name in report_df['original_datafile_clean']:
-        result = process.extractOne(df_name, all_files, scorer=fuzz.token_sort_ratio)
-        if result:
-            # Robust unpack: handle 2 or 3 elements
-            match = result[0]
-            score = result[1]
-        else:
-            match, score = '', 0
-        matches.append(match if score >= threshold else '')
-        scores.append(score)
-    report_df['matched_datafile'] = matches
-    report_df['match_score'] = scores
-    return report_df, master_df
-
-
-
-def normalize_string(s, sponsors=None):
-    import re
-
-    if not isinstance(s, str):
-        s = str(s)
-
-    s = s.lower().strip()
-
-    # Remove sponsor tags (same as your original)
-    if sponsors:
-        for sponsor in sponsors:
-            s = s.replace(f"_{sponsor.lower()}_", "_")
-            s = s.replace(f"_{sponsor.lower()}", "")
-
-    # ✅ Remove trailing numeric suffixes (e.g., _1703, _002, etc.)
-    s = re.sub(r'_\d+$', '', s)
-
-    # Split into parts
-    parts = s.split('_')
-    cleaned_parts = []
-
-    for part in parts:
-        # Keep numbers that are internal (like 2024), skip meaningless numeric parts
-        if re.fullmatch(r'\d+', part):
-            # Skip only if it's not a year-like pattern (e.g., not 2024)
-            if not (len(part) == 4 and part.startswith(('19', '20'))):
-                continue
-        cleaned_parts.append(part)
-
-    return '_'.join(cleaned_parts)
-
-def fuzzy_match_datafiles(report_df, master_df, threshold=80):
-    report_df['original_datafile_clean'] = report_df['original_datafile'].fillna('').apply(
-        lambda x: normalize_string(x, sponsors=sponsor_list)
-    )
-    master_df['Data File Clean'] = master_df['Data File'].fillna('').apply(lambda x: normalize_string(x))
-    all_files = master_df['Data File Clean'].unique().tolist()
-    matches, scores = [], []
-    for df_name in report_df['original_datafile_clean']:
-        match, score, _ = process.extractOne(df_name, all_files, scorer=fuzz.token_sort_ratio)
-        matches.append(match if score >= threshold else '')
-        scores.append(score)
-    report_df['matched_datafile'] = matches
-    report_df['match_score'] = scores
-    return report_df
-
-
-
-#--------------------------------------------AI Recommentation-----------------------------------------------
 
 #---------------------------------------------------------------------------------------------------------
                             #-------recommendation Logic-----------
 #----------------------------------------------------------------------------------------------------------
-# Updated recommendation logic
-import os
-import requests
-import pandas as pd
-from pathlib import Path
-from typing import Dict, Any
-
-# Enhanced function to parse .env file (add this if not already in your views.py)
-def load_env(env_path: str = '.env') -> Dict[str, str]:
-    config = {}
-    if not Path(env_path).exists():
-        print(f"Warning: {env_path} not found. Using empty config.")
-        return config
-    
-    with open(env_path, 'r', encoding='utf-8') as f:
-        in_multiline = False
-        current_key = None
-        current_value = []
-        
-        for line_num, line in enumerate(f, 1):
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue  # Skip empty or comment lines
-            
-            # Handle multiline values (basic, ends at next key or EOF)
-            if in_multiline:
-                if '=' in line and not line.startswith(' ' * (len(current_key) + 1)):  # New key starts
-                    config[current_key] = ' '.join(current_value).strip().strip('"\'')
-                    current_key = None
-                    in_multiline = False
-                else:
-                    current_value.append(line)
-                    continue
-            
-            if '=' in line:
-                parts = line.split('=', 1)
-                key = parts[0].strip()
-                value_part = parts[1].strip()
-                
-                # Handle quoted values
-                if (value_part.startswith('"') and value_part.endswith('"')) or \
-                   (value_part.startswith("'") and value_part.endswith("'")):
-                    value = value_part[1:-1]
-                else:
-                    value = value_part
-                
-                if value.endswith('\\'):  # Simple multiline indicator
-                    in_multiline = True
-                    current_key = key
-                    current_value = [value[:-1]]  # Remove \
-                else:
-                    config[key] = value
-            else:
-                print(f"Warning: Invalid line {line_num}: {line}")
-    
-    # Handle any pending multiline
-    if current_key:
-        config[current_key] = ' '.join(current_value).strip().strip('"\'')
-    
-    return config
-
-# Load config from .env once (module-level, assuming this is in views.py)
-config = load_env()
-report_url = config.get('report_url')
-campaign_url = config.get('campaign_url')
-master_path = config.get('master_path')  # Note: Your code uses File2.xlsx; adjust env if needed or use this
-
-print("Loaded config:")
-for k, v in config.items():
-    print(f"  {k}: {v}")
-
-def recommend_campaigns_with_datafiles(merged_df, sort_by, top_n_campaigns=10, top_n_files=5):
-    merged_df = merged_df.copy()
-    merged_df['clicks'] = pd.to_numeric(merged_df.get('clicks', 0), errors='coerce').fillna(0)
-    merged_df['sent'] = pd.to_numeric(merged_df.get('sent', 0), errors='coerce').fillna(0)
-    merged_df['revenue'] = pd.to_numeric(merged_df.get('revenue', 0), errors='coerce').fillna(0)
-    merged_df['cpm'] = pd.to_numeric(merged_df['cpm'], errors='coerce').fillna(0)
-    merged_df['epc'] = merged_df['revenue'] / merged_df['clicks'].replace(0, 1)
-    if sort_by == 'performance':
-        merged_df['perf'] = merged_df['revenue'] / merged_df['sent'].replace(0, 1)
-
-    # Determine aggregation for campaigns
-    if sort_by == 'revenue':
-        agg_dict = {'revenue': 'sum'}
-        sort_col = 'revenue'
-        file_sort_col = 'revenue'
-        file_agg = 'sum'
-    elif sort_by == 'epc':
-        agg_dict = {'epc': 'mean'}
-        sort_col = 'epc'
-        file_sort_col = 'epc'
-        file_agg = 'mean'
-    elif sort_by == 'cpm':
-        agg_dict = {'cpm': 'mean'}
-        sort_col = 'cpm'
-        file_sort_col = 'cpm'
-        file_agg = 'mean'
-    elif sort_by == 'performance':
-        agg_dict = {'perf': 'mean'}
-        sort_col = 'perf'
-        file_sort_col = 'perf'
-        file_agg = 'mean'
-
-    top_campaigns = (
-        merged_df.groupby('campaign_name')
-        .agg(agg_dict)
-        .reset_index()
-        .sort_values(by=sort_col, ascending=False)
-        .head(top_n_campaigns)
-    )
-
-    all_files = []
-    for camp in top_campaigns['campaign_name']:
-        sub = merged_df[merged_df['campaign_name'] == camp].copy()
-        sub = sub[['matched_datafile', 'cpm', 'DF Count', 'last_send_date', file_sort_col]].dropna(subset=['matched_datafile'])
-        sub = sub.drop_duplicates(subset='matched_datafile')
-
-        # Aggregate per file if needed
-        agg_cols = {
-            file_sort_col: file_agg,
-            'cpm': 'mean',
-            'DF Count': 'first',  # Consistent from master
-            'last_send_date': 'max'
-        }
-        sub_agg = sub.groupby('matched_datafile').agg(agg_cols).reset_index()
-        sub_agg = sub_agg.sort_values(by=file_sort_col, ascending=False).head(top_n_files)
-        sub_agg['campaign_name'] = camp
-        all_files.append(sub_agg)
-
-    all_files_df = pd.concat(all_files, ignore_index=True) if all_files else pd.DataFrame()
-    return top_campaigns, all_files_df
-
-def recommendations(request):
+async def recommendations(request):
     if request.method == 'POST':
         campaign_name = request.POST.get('campaign_name', '').lower().strip()
         min_engagement_str = request.POST.get('min_engagement', '')
@@ -467,69 +122,28 @@ def recommendations(request):
 
     # Load data using .env vars
     if not master_path or not Path(master_path).exists():
-        return render(request, 'recommendations.html', {'error': 'Master data file not found at path from .env.'})
-    master_df = pd.read_excel(master_path)
-    master_df.rename(columns=lambda x: x.strip(), inplace=True)
-    master_df['Data File Clean'] = master_df['Data File'].fillna('').apply(lambda x: normalize_string(x))
-
+        return await render_async(request, 'recommendations.html', {'error': 'Master data file not found at path from .env.'})
     if not report_url:
-        return render(request, 'recommendations.html', {'error': 'Report URL not configured in .env.'})
-    report_resp = requests.get(report_url)
-    report_resp.raise_for_status()  # Raise error on bad status
-    report = pd.DataFrame(report_resp.json()['data'])
-    
+        return await render_async(request, 'recommendations.html', {'error': 'Report URL not configured in .env.'})
     if not campaign_url:
-        return render(request, 'recommendations.html', {'error': 'Campaign URL not configured in .env.'})
-    campaign_resp = requests.get(campaign_url)
-    campaign_resp.raise_for_status()  # Raise error on bad status
-    campaign = pd.DataFrame(campaign_resp.json()['data'])
-
-    # Clean
-    report, _ = fuzzy_match_datafiles(report, master_df)  # Unpack both, ignore master
-    report['offer_date'] = pd.to_datetime(report['offer_date'], format='%d-%m-%Y', errors='coerce')
-    report['campaign_name'] = report['campaign_name'].astype(str).str.lower().str.strip()
-    campaign['campaign_name'] = campaign['campaign_name'].astype(str).str.lower().str.strip()
-
-    merged = pd.merge(report, campaign, on='campaign_name', how='inner')
-    merged = pd.merge(merged, master_df, left_on='matched_datafile', right_on='Data File Clean', how='left')
-
-    last_send = (
-        merged.dropna(subset=['campaign_name', 'matched_datafile', 'offer_date'])
-        .groupby(['campaign_name', 'matched_datafile'])['offer_date']
-        .max()
-        .reset_index()
-        .rename(columns={'offer_date': 'last_send_date'})
-    )
-    merged = pd.merge(merged, last_send, on=['campaign_name', 'matched_datafile'], how='left')
-
-    # Compute metrics
-    merged['clicks'] = pd.to_numeric(merged.get('clicks', 0), errors='coerce').fillna(0)
-    merged['sent'] = pd.to_numeric(merged.get('sent', 0), errors='coerce').fillna(0)
-    merged['revenue'] = pd.to_numeric(merged.get('revenue', 0), errors='coerce').fillna(0)
-    merged['epc'] = merged['revenue'] / merged['clicks'].replace(0, 1)
-    merged['engagement'] = (merged['clicks'] / merged['sent'].replace(0, 1)) * 100
-    merged['cpm'] = pd.to_numeric(merged['cpm'], errors='coerce').fillna(0)
-
-    # Apply filters
-    if min_engagement > 0:
-        merged = merged[merged['engagement'] >= min_engagement]
-    if campaign_name:
-        merged = merged[merged['campaign_name'].str.contains(campaign_name, na=False)]
-
-    # Generate recommendations
-    top_campaigns, all_files_df = recommend_campaigns_with_datafiles(merged, sort_by, top_n_campaigns=limit, top_n_files=5)
-
-    # Group files by campaign for template
-    grouped_files = []
-    for camp in top_campaigns['campaign_name']:
-        camp_files = all_files_df[all_files_df['campaign_name'] == camp].to_dict('records')
-        grouped_files.append({
-            'campaign_name': camp,
-            'files': camp_files
-        })
-
-    # Campaign options for select
-    campaign_options = sorted(merged['campaign_name'].dropna().unique())
+        return await render_async(request, 'recommendations.html', {'error': 'Campaign URL not configured in .env.'})
+
+    # Fetched, cleaned and fuzzy matched once per snapshot
+    deadline = engine.offload.new_deadline()
+    try:
+        snapshot = await engine.offload.snapshot(deadline)
+        params = {'campaign_name': campaign_name, 'min_engagement': min_engagement, 'sort_by': sort_by, 'limit': limit}
+        key, etag = await page_cache(request, 'recommendations', snapshot, params)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        grouped_files, campaign_options = await engine.offload.cached(
+            result_cache, key, snapshot.data_version,
+            lambda: engine.queries.query_recommendations(snapshot, **params), deadline)
+    except engine.fetch.FetchError as e:
+        return await render_async(request, 'recommendations.html', {'error': f'Could not fetch the report/campaign feeds: {e}'})
+    except engine.offload.DeadlineExceeded:
+        return await render_async(request, 'recommendations.html', {'error': TOO_SLOW}, status=504)
 
     context = {
         'grouped_files': grouped_files,
@@ -542,7 +156,9 @@ def recommendations(request):
             'notes': notes,
         }
     }
-    return render(request, 'recommendations.html', context)
+    with stage('render'):
+        response = await render_async(request, 'recommendations.html', context)
+    return with_etag(response, etag) if request.method == 'GET' else response
 
 #--------------------------------------------AI Recommentation Ends-----------------------------------------------
 
@@ -552,56 +168,39 @@ def recommendations(request):
 # -----------------------------
 # Mail Logic
 # -----------------------------
-def unuse_DS(request):
+async def unuse_DS(request):
     # Use loaded .env vars (assuming config is loaded at module level)
     if not master_path or not Path(master_path).exists():
-        return render(request, 'unuse_DS.html', {'error': 'Master data file not found at path from .env.'})
-    master_df = pd.read_excel(master_path)
-    master_df.columns = master_df.columns.str.strip()
-
-    # Fetch APIs using .env vars
+        return await render_async(request, 'unuse_DS.html', {'error': 'Master data file not found at path from .env.'})
     if not report_url:
-        return render(request, 'unuse_DS.html', {'error': 'Report URL not configured in .env.'})
-    report_resp = requests.get(report_url)
-    report_resp.raise_for_status()  # Raise error on bad status
-    report_df = pd.DataFrame(report_resp.json()['data'])
-    
+        return await render_async(request, 'unuse_DS.html', {'error': 'Report URL not configured in .env.'})
     if not campaign_url:
-        return render(request, 'unuse_DS.html', {'error': 'Campaign URL not configured in .env.'})
-    campaign_resp = requests.get(campaign_url)
-    campaign_resp.raise_for_status()  # Raise error on bad status
-    campaign_df = pd.DataFrame(campaign_resp.json()['data'])
-
-    # Date handling
-    possible_date_cols = ['date', 'offer_date', 'Offer Date', 'after_suppression_date', 'created_at']
-    date_col = next((col for col in possible_date_cols if col in report_df.columns), None)
-    if date_col:
-        report_df['date'] = pd.to_datetime(report_df[date_col], errors='coerce', dayfirst=True)
-        report_df = report_df.dropna(subset=['date']).sort_values(by='date', ascending=False).reset_index(drop=True)
-    else:
-        return render(request, 'unuse_DS.html', {'error': 'No valid date column found in report data.'})
+        return await render_async(request, 'unuse_DS.html', {'error': 'Campaign URL not configured in .env.'})
 
-    # Step 1: Fuzzy Match
-    report_df, master_df = fuzzy_match_datafiles(report_df, master_df, threshold=80)
-
-    # Step 2: Merge with Master
-    merged_df = pd.merge(
-        report_df, master_df,
-        left_on='matched_datafile', right_on='Data File Clean', how='left'
-    )
-
-    # Step 3: Merge with Campaign
-    merged_df = pd.merge(
-        merged_df, campaign_df,
-        on='campaign_name', how='left', suffixes=('', '_campaign')
-    )
+    # Fetched, cleaned and fuzzy matched once per snapshot
+    deadline = engine.offload.new_deadline()
+    try:
+        snapshot = await engine.offload.snapshot(deadline)
+    except engine.fetch.FetchError as e:
+        return await render_async(request, 'unuse_DS.html', {'error': f'Could not fetch the report/campaign feeds: {e}'})
+    except engine.offload.DeadlineExceeded:
+        return await render_async(request, 'unuse_DS.html', {'error': TOO_SLOW}, status=504)
+    # Last send per campaign/datafile, indexed once per data version
+    usage = snapshot.usage_index
+    if not usage.has_dates:
+        return await render_async(request, 'unuse_DS.html', {'error': 'No valid date column found in report data.'})
 
     # Filter options
-    isp_options = sorted(master_df['ISP Name'].dropna().unique().tolist())
-    file_series_options = sorted(master_df['File Series'].dropna().unique().tolist())
+    isp_options = usage.isp_options
+    file_series_options = usage.file_series_options
 
     unused_datafiles = []
     summary = None
+    # A GET is the bare form: its ETag only depends on the data version
+    key, etag = await page_cache(request, 'unuse_DS', snapshot, {})
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
 
     if request.method == "POST":
         campaign_id = request.POST.get("campaign_id", "").strip()
@@ -609,35 +208,15 @@ def unuse_DS(request):
         file_series_selected = request.POST.get("file_series_selected", "All")
         days_slider = int(request.POST.get("days_slider", 15))
 
-        cutoff_date = datetime.today() - timedelta(days=days_slider)
-
         if campaign_id:
-            campaign_match = campaign_df[campaign_df['campaign_id'].astype(str) == campaign_id]
-            if not campaign_match.empty:
-                campaign_name = campaign_match.iloc[0]['campaign_name']
-
-                filtered_master_df = master_df.copy()
-                if isp_selected != "All":
-                    filtered_master_df = filtered_master_df[filtered_master_df['ISP Name'] == isp_selected]
-                if file_series_selected != "All":
-                    filtered_master_df = filtered_master_df[filtered_master_df['File Series'] == file_series_selected]
-
-                all_datafiles = filtered_master_df['Data File Clean'].dropna().unique()
-
-                recent_used_files = report_df[
-                    (report_df['campaign_name'] == campaign_name) &
-                    (report_df['date'] >= cutoff_date)
-                ]['matched_datafile'].dropna().unique()
-
-                unused_datafiles = sorted(list(set(all_datafiles) - set(recent_used_files)))
-                summary = {
-                    "campaign_id": campaign_id,
-                    "campaign_name": campaign_name,
-                    "days": days_slider,
-                    "count": len(unused_datafiles)
-                }
-            else:
-                summary = {"error": "No campaign found with that ID."}
+            params = [campaign_id, isp_selected, file_series_selected, days_slider]
+            key, _ = await page_cache(request, 'unuse_DS', snapshot, params)
+            try:
+                unused_datafiles, summary = await engine.offload.cached(
+                    result_cache, key, snapshot.data_version,
+                    lambda: engine.queries.query_unused(snapshot, *params), deadline)
+            except engine.offload.DeadlineExceeded:
+                return await render_async(request, 'unuse_DS.html', {'error': TOO_SLOW}, status=504)
 
     context = {
         "isp_options": isp_options,
@@ -646,13 +225,9 @@ def unuse_DS(request):
         "summary": summary,
     }
 
-    return render(request, "unuse_DS.html", context)
-
-def logout(request):
-    raise NotImplementedError
-
-def logout(request):
-    raise NotImplementedError
+    with stage('render'):
+        response = await render_async(request, "unuse_DS.html", context)
+    return with_etag(response, etag) if request.method == 'GET' else response
 
 
 #------------------------------------------------------------------------------------------------------------
@@ -668,61 +243,24 @@ def logout(request):
 #------------------------------------------------------------------------------------------------------------
 
 
-def best_files_view(request):
+async def best_files_view(request):
     # Use loaded .env vars (assuming config is loaded at module level)
     if not report_url:
-        return render(request, "best_files.html", {"error": 'Report URL not configured in .env.'})
+        return await render_async(request, "best_files.html", {"error": 'Report URL not configured in .env.'})
     if not campaign_url:
-        return render(request, "best_files.html", {"error": 'Campaign URL not configured in .env.'})
+        return await render_async(request, "best_files.html", {"error": 'Campaign URL not configured in .env.'})
     if not master_path or not Path(master_path).exists():
-        return render(request, "best_files.html", {"error": 'Master data file not found at path from .env.'})
+        return await render_async(request, "best_files.html", {"error": 'Master data file not found at path from .env.'})
 
     context = {"error": None, "results": None, "message": None}
+    status = 200
 
     try:
-        # Load data using .env vars
-        report_resp = requests.get(report_url)
-        report_resp.raise_for_status()  # Raise error on bad status
-        campaign_resp = requests.get(campaign_url)
-        campaign_resp.raise_for_status()  # Raise error on bad status
-        campaign_df = pd.DataFrame(campaign_resp.json()['data'])
-        report_df = pd.DataFrame(report_resp.json()['data'])
-        master_df = pd.read_excel(master_path)
-
-        # Clean column names
-        campaign_df.columns = campaign_df.columns.str.strip()
-        report_df.columns = report_df.columns.str.strip()
-        master_df.columns = master_df.columns.str.strip()
-
-        # Fuzzy match (now returns both)
-        report_df, master_df = fuzzy_match_datafiles(report_df, master_df)
-
-        # Parse offer_date
-        if 'offer_date' in report_df.columns:
-            report_df['offer_date'] = pd.to_datetime(report_df['offer_date'], format='%d-%m-%Y', errors='coerce')
-
-        # Merge report and campaign
-        merged_df = pd.merge(report_df, campaign_df, on='campaign_name', how='left')
-
-        # Merge with master for ISP
-        isp_merge = master_df[['Data File Clean', 'ISP Name']].drop_duplicates()
-        merged_df = pd.merge(
-            merged_df,
-            isp_merge,
-            left_on='matched_datafile',
-            right_on='Data File Clean',
-            how='left'
-        )
-
-        # Compute last send date
-        if 'offer_date' in merged_df.columns and 'matched_datafile' in merged_df.columns:
-            last_send_df = (
-                merged_df.dropna(subset=['matched_datafile', 'offer_date'])
-                .groupby('matched_datafile')['offer_date']
-                .max()
-                .reset_index(name='last_send_date')
-            )
-            merged_df = pd.merge(merged_df, last_send_df, on='matched_datafile', how='left')
+        # Fetched, cleaned (column names stripped) and fuzzy matched once per snapshot
+        deadline = engine.offload.new_deadline()
+        snapshot = await engine.offload.snapshot(deadline)
+        campaign_df = snapshot.campaign_df
+        master_df = snapshot.master_df
 
         # Filters from GET params
         sponsor_selected = request.GET.get("sponsor", "All")
@@ -730,74 +268,54 @@ def best_files_view(request):
         isp_selected = request.GET.get("isp", "All")
         exclude_days = int(request.GET.get("exclude_days", 0))
 
-        filtered_df = merged_df.copy()
-
-        # Apply filters safely (check column existence)
-        if 'sponsor' in filtered_df.columns and sponsor_selected != "All":
-            filtered_df = filtered_df[filtered_df['sponsor'] == sponsor_selected]
-        if 'category' in filtered_df.columns and category_selected != "All":
-            filtered_df = filtered_df[filtered_df['category'] == category_selected]
-        if 'ISP Name' in filtered_df.columns and isp_selected != "All":
-            filtered_df = filtered_df[filtered_df['ISP Name'] == isp_selected]
-
-        # Exclude last X days
-        if exclude_days > 0 and 'last_send_date' in filtered_df.columns:
-            cutoff_date = datetime.now() - timedelta(days=exclude_days)
-            filtered_df = filtered_df[
-                (filtered_df['last_send_date'].isna()) | (filtered_df['last_send_date'] < cutoff_date)
-            ]
-
-        # Convert numeric columns safely
-        numeric_cols = ['revenue', 'cpm', 'epc', 'clicks', 'sent']
-        for col in numeric_cols:
-            if col in filtered_df.columns:
-                filtered_df[col] = pd.to_numeric(filtered_df[col], errors='coerce').fillna(0)
+        params = [sponsor_selected, category_selected, isp_selected, exclude_days]
+        key, etag = await page_cache(request, 'best_files', snapshot, params)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        grouped, record_count, unique_files = await engine.offload.cached(
+            result_cache, key, snapshot.data_version,
+            lambda: engine.queries.query_best_files(snapshot, *params), deadline)
 
         # Group and summarize
-        if not filtered_df.empty and 'matched_datafile' in filtered_df.columns:
-            # Drop NaN files for grouping
-            valid_df = filtered_df.dropna(subset=['matched_datafile'])
-            if not valid_df.empty:
-                grouped = valid_df.groupby('matched_datafile').agg({
-                    'revenue': 'sum',
-                    'cpm': 'mean',
-                    'epc': 'mean',
-                    'clicks': 'sum',
-                    'sent': 'sum'
-                }).reset_index().sort_values(by='revenue', ascending=False)
-
-                top_records = grouped.head(15).to_dict(orient='records')
-                best_file = grouped.iloc[0]['matched_datafile'] if not grouped.empty else None
-
-                # Filter options (with "All")
-                sponsor_options = ["All"] + sorted(campaign_df['sponsor'].dropna().unique().tolist()) if 'sponsor' in campaign_df.columns else ["All"]
-                category_options = ["All"] + sorted(campaign_df['category'].dropna().unique().tolist()) if 'category' in campaign_df.columns else ["All"]
-                isp_options = ["All"] + sorted(master_df['ISP Name'].dropna().unique().tolist()) if 'ISP Name' in master_df.columns else ["All"]
-
-                # Restructure context to match template (filters dict)
-                filters = {
-                    'sponsors': sponsor_options,
-                    'categories': category_options,
-                    'isps': isp_options,
-                    'selected': {
-                        'sponsor': sponsor_selected,
-                        'category': category_selected,
-                        'isp': isp_selected,
-                        'exclude_days': exclude_days
-                    }
+        if not grouped.empty:
+            top_records = grouped.head(15).to_dict(orient='records')
+            best_file = grouped.iloc[0]['matched_datafile']
+
+            # Filter options (with "All")
+            sponsor_options = ["All"] + sorted(campaign_df['sponsor'].dropna().unique().tolist()) if 'sponsor' in campaign_df.columns else ["All"]
+            category_options = ["All"] + sorted(campaign_df['category'].dropna().unique().tolist()) if 'category' in campaign_df.columns else ["All"]
+            isp_options = ["All"] + sorted(master_df['ISP Name'].dropna().unique().tolist()) if 'ISP Name' in master_df.columns else ["All"]
+
+            # Restructure context to match template (filters dict)
+            filters = {
+                'sponsors': sponsor_options,
+                'categories': category_options,
+                'isps': isp_options,
+                'selected': {
+                    'sponsor': sponsor_selected,
+                    'category': category_selected,
+                    'isp': isp_selected,
+                    'exclude_days': exclude_days
                 }
-
-                context.update({
-                    "results": top_records,
-                    "best_file": best_file,
-                    "record_count": len(filtered_df),
-                    "unique_files": len(grouped),
-                    "filters": filters  # This fixes the dropdown listing
-                })
-                return render(request, "best_files.html", context)
+            }
+
+            context.update({
+                "results": top_records,
+                "best_file": best_file,
+                "record_count": record_count,
+                "unique_files": unique_files,
+                "filters": filters  # This fixes the dropdown listing
+            })
+            with stage('render'):
+                response = await render_async(request, "best_files.html", context)
+            return with_etag(response, etag)
 
         context["message"] = "No data found for the selected filters."
 
+    except engine.offload.DeadlineExceeded:
+        context["error"] = TOO_SLOW
+        status = 504
     except Exception as e:
         context["error"] = str(e)
 
@@ -814,7 +332,7 @@ def best_files_view(request):
         }
     }
 
-    return render(request, "best_files.html", context)
+    return await render_async(request, "best_files.html", context, status=status)
 
 
 
@@ -823,4 +341,165 @@ def best_files_view(request):
 #------------------------------------------------------------------------------------------------------------
 
 
+#------------------------------------------------------------------------------------------------------------
+#------------------------------------------top offers / file wise top offer---------------------------------
+#------------------------------------------------------------------------------------------------------------
+# Both are answered from the offer cube: a slicer combination is one precomputed block
+
+TOP_OFFER_SORTS = {'revenue': 'Revenue', 'epc': 'EPC', 'cpm': 'CPM', 'clicks': 'Clicks', 'perf': 'Performance'}
+
+def _offer_slicer(request):
+    return {
+        'isp': request.GET.get("isp", "All"),
+        'sponsor': request.GET.get("sponsor", "All"),
+        'category': request.GET.get("category", "All"),
+    }
+
+async def _offer_page(request, template, name, selected, query):
+    # Shared body of the two pages: config checks, snapshot, cached query, filters, 504 on the deadline.
+    # query(snapshot) returns (records frame, extra context)
+    if not report_url:
+        return await render_async(request, template, {"error": 'Report URL not configured in .env.'})
+    if not campaign_url:
+        return await render_async(request, template, {"error": 'Campaign URL not configured in .env.'})
+    if not master_path or not Path(master_path).exists():
+        return await render_async(request, template, {"error": 'Master data file not found at path from .env.'})
+
+    context = {
+        "error": None, "results": None, "message": None, "sorts": TOP_OFFER_SORTS, "selected": selected,
+        "filters": {'isps': ["All"], 'sponsors': ["All"], 'categories': ["All"]},
+    }
+    status = 200
+    try:
+        deadline = engine.offload.new_deadline()
+        snapshot = await engine.offload.snapshot(deadline)
+        key, etag = await page_cache(request, name, snapshot, selected)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        results, extra = await engine.offload.cached(
+            result_cache, key, snapshot.data_version, lambda: query(snapshot), deadline)
+
+        options = snapshot.offer_cube.options
+        context["filters"] = {'isps': options['ISP Name'], 'sponsors': options['sponsor'], 'categories': options['category']}
+        if not results.empty:
+            context.update({"results": results.to_dict(orient='records'), **extra})
+            with stage('render'):
+                response = await render_async(request, template, context)
+            return with_etag(response, etag)
+        context["message"] = "No data found for the selected filters."
+
+    except engine.offload.DeadlineExceeded:
+        context["error"] = TOO_SLOW
+        status = 504
+    except Exception as e:
+        context["error"] = str(e)
+
+    return await render_async(request, template, context, status=status)
+
+async def top_offers(request):
+    selected = _offer_slicer(request)
+    selected['sort_by'] = request.GET.get("sort_by", "revenue")
+    if selected['sort_by'] not in TOP_OFFER_SORTS:
+        selected['sort_by'] = "revenue"
+
+    def query(snapshot):
+        top, record_count, offer_count = engine.queries.query_top_offers(
+            snapshot, selected['isp'], selected['sponsor'], selected['category'], selected['sort_by'])
+        chart = {
+            'labels': top['campaign_name'].astype(str).tolist(),
+            'values': [round(float(value), 4) for value in top[selected['sort_by']]],
+            'label': TOP_OFFER_SORTS[selected['sort_by']],
+        }
+        return top, {"record_count": record_count, "offer_count": offer_count, "chart": chart}
+    return await _offer_page(request, "top_offers.html", 'top_offers', selected, query)
+
+async def file_top_offers(request):
+    selected = _offer_slicer(request)
+    # Matched names are the master's cleaned (lower case) names
+    selected['datafile'] = request.GET.get("datafile", "").strip().lower()
+
+    def query(snapshot):
+        rows, record_count = engine.queries.query_file_top_offers(
+            snapshot, selected['isp'], selected['sponsor'], selected['category'], selected['datafile'])
+        return rows, {"record_count": record_count}
+    return await _offer_page(request, "file_top_offers.html", 'file_top_offers', selected, query)
+
+
+#------------------------------------------------------------------------------------------------------------
+#--------------------------------------season wise category performance-------------------------------------
+#------------------------------------------------------------------------------------------------------------
+
+SEASON_GRAINS = ['season', 'month', 'week', 'day']
+SEASON_METRIC_LABELS = {'revenue': 'Revenue', 'clicks': 'Clicks', 'sent': 'Sent', 'epc': 'EPC', 'cpm': 'CPM', 'ctr': 'CTR %'}
+
+def _date_param(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+async def season_performance(request):
+    if not report_url:
+        return await render_async(request, "season_performance.html", {"error": 'Report URL not configured in .env.'})
+    if not campaign_url:
+        return await render_async(request, "season_performance.html", {"error": 'Campaign URL not configured in .env.'})
+    if not master_path or not Path(master_path).exists():
+        return await render_async(request, "season_performance.html", {"error": 'Master data file not found at path from .env.'})
+
+    # Filters from GET params (unknown grain/metric fall back to the defaults)
+    grain = request.GET.get("grain", "season")
+    grain = grain if grain in SEASON_GRAINS else "season"
+    metric = request.GET.get("metric", "revenue")
+    metric = metric if metric in SEASON_METRIC_LABELS else "revenue"
+    category_selected = request.GET.get("category", "All")
+    sponsor_selected = request.GET.get("sponsor", "All")
+    isp_selected = request.GET.get("isp", "All")
+    date_from = _date_param(request.GET.get("date_from"))
+    date_to = _date_param(request.GET.get("date_to"))
+
+    context = {
+        "error": None, "result": None, "message": None,
+        "grains": SEASON_GRAINS, "metrics": SEASON_METRIC_LABELS,
+        "filters": {'categories': ["All"], 'sponsors': ["All"], 'isps': ["All"]},
+        "selected": {
+            'grain': grain, 'metric': metric, 'category': category_selected, 'sponsor': sponsor_selected,
+            'isp': isp_selected, 'date_from': date_from or '', 'date_to': date_to or '',
+        },
+    }
+    status = 200
+
+    try:
+        # Answered from the snapshot's rollups, never from the report rows
+        deadline = engine.offload.new_deadline()
+        snapshot = await engine.offload.snapshot(deadline)
+        params = [grain, metric, category_selected, sponsor_selected, isp_selected, date_from, date_to]
+        key, etag = await page_cache(request, 'season_performance', snapshot, params)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        result, options = await engine.offload.cached(
+            result_cache, key, snapshot.data_version,
+            lambda: engine.queries.query_season(snapshot, *params), deadline)
+
+        context["filters"] = {'categories': options['category'], 'sponsors': options['sponsor'], 'isps': options['ISP Name']}
+        if result['table']:
+            context.update({
+                "result": result,
+                "chart_type": "bar" if grain == "season" else "line",
+                "metric_label": SEASON_METRIC_LABELS[metric],
+                "totals": list(zip(result['categories'], result['totals'])),
+            })
+            with stage('render'):
+                response = await render_async(request, "season_performance.html", context)
+            return with_etag(response, etag)
+
+        context["message"] = "No data found for the selected filters."
+
+    except engine.offload.DeadlineExceeded:
+        context["error"] = TOO_SLOW
+        status = 504
+    except Exception as e:
+        context["error"] = str(e)
 
+    return await render_async(request, "season_performance.html", context, status=status)
@@ -0,0 +1,11 @@
+# -----------------------------------------------------------------------------------------------------
+#--------------Benchmarks----------------
+# -----------------------------------------------------------------------------------------------------
+# Reproducible timings of the analytics pages against generated data:
+#   generators.py   synthetic master workbook, campaign feed and report feed at any size
+#   stub_server.py  local HTTP server answering report_url / campaign_url with the generated feeds
+#   run.py          times every stage of recommendations, unuse_DS and best_files_view, writes a JSON report
+#
+# From RecSystem/:
+#   python -m benchmarks.run --rows 100000
+#   python -m benchmarks.run --rows 100000 --baseline benchmarks/results/<earlier run>.json
@@ -0,0 +1,122 @@
+from datetime import date
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from MyApp.engine.normalize import sponsor_list
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Synthetic feeds----------------
+# -----------------------------------------------------------------------------------------------------
+# Same shapes as the real sources, deterministic for a given seed:
+#   master     'agm_aug22_rr_ops_ab' style names: prefix, month, ISP code, file type, chunk suffix;
+#              File Series is the name without the chunk suffix
+#   campaigns  campaign_id, campaign_name, sponsor, category
+#   report     one row per send over the last `days` days. Datafile names are noisy the way the
+#              feed's are: sponsor tags and numeric suffixes, upper case, sponsor prefixes, a few
+#              names matching nothing and a few missing. Popular files and campaigns get most rows.
+
+ISP_CODES = {'RR': 'rr', 'Gmail': 'gm', 'Yahoo': 'yh', 'AOL': 'ol', 'Outlook': 'ms'}
+FILE_TYPES = {'NORMAL': '', 'CLS': '_cls', 'OPS': '_ops'}
+MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+CATEGORIES = ['finance', 'health', 'insurance', 'travel', 'education', 'home', None]
+LETTERS = list('abcdefghijklmnopqrstuvwxyz')
+
+
+def _skewed(rng, n, size, exponent=0.8):
+    # Indices in [0, n) with a long tail: a few items get most of the draws
+    weights = 1 / np.arange(1, n + 1) ** exponent
+    weights = rng.permutation(weights / weights.sum())
+    return rng.choice(n, size=size, p=weights)
+
+
+def generate_master(n_files: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    prefixes = [''.join(rng.choice(LETTERS, 3)) for _ in range(max(8, n_files // 40))]
+    rows, seen = [], set()
+    while len(rows) < n_files:
+        isp = str(rng.choice(list(ISP_CODES)))
+        file_type = str(rng.choice(list(FILE_TYPES), p=[0.6, 0.2, 0.2]))
+        series = (f"{rng.choice(prefixes)}_{rng.choice(MONTHS)}{rng.integers(20, 26)}"
+                  f"_{ISP_CODES[isp]}{FILE_TYPES[file_type]}")
+        if series in seen:
+            continue
+        seen.add(series)
+        count = int(rng.integers(500, 60_000))
+        for chunk in range(min(int(rng.integers(1, 6)), n_files - len(rows))):
+            rows.append({
+                'ISP Name': isp,
+                'Data File': f'{series}_{LETTERS[chunk // 26]}{LETTERS[chunk % 26]}',
+                'File Series': series,
+                'DF Count': count,
+                'FILE TYPE': file_type,
+            })
+    return pd.DataFrame(rows)
+
+
+def generate_campaigns(n_campaigns: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed + 1)
+    ids = np.arange(1000, 1000 + n_campaigns)
+    sponsors = rng.choice(sponsor_list, n_campaigns)
+    return pd.DataFrame({
+        'campaign_id': ids,
+        'campaign_name': [f'{sponsor} Offer {campaign_id}' for sponsor, campaign_id in zip(sponsors, ids)],
+        'sponsor': sponsors,
+        'category': rng.choice(np.array(CATEGORIES, dtype=object), n_campaigns),
+    })
+
+
+def generate_report(n_rows: int, master: pd.DataFrame, campaigns: pd.DataFrame, seed: int = 0,
+                    days: int = 365, end: Optional[date] = None) -> pd.DataFrame:
+    rng = np.random.default_rng(seed + 2)
+    end = pd.Timestamp(end or date.today())
+
+    # Datafile names, noisy
+    files = master['Data File'].to_numpy(dtype=object)
+    names = pd.Series(files[_skewed(rng, len(files), n_rows)])
+    numbers = pd.Series(rng.integers(1, 10_000, n_rows)).astype(str)
+    sponsors = pd.Series(rng.choice(sponsor_list, n_rows))
+    kind = rng.random(n_rows)
+    noisy = names.copy()
+    tagged = kind < 0.35
+    noisy[tagged] = names[tagged] + '_' + sponsors[tagged] + '_' + numbers[tagged]
+    upper = (kind >= 0.35) & (kind < 0.5)
+    noisy[upper] = names[upper].str.upper() + '_' + numbers[upper]
+    prefixed = (kind >= 0.5) & (kind < 0.6)
+    noisy[prefixed] = sponsors[prefixed] + '_' + names[prefixed]
+    unknown = (kind >= 0.6) & (kind < 0.63)
+    noisy[unknown] = 'tmp_' + numbers[unknown] + '_misc'
+    noisy[(kind >= 0.63) & (kind < 0.65)] = None
+
+    # Campaign names, with the feed's casing/whitespace drift and a few unknown campaigns
+    campaign_names = pd.Series(campaigns['campaign_name'].to_numpy(dtype=object)[_skewed(rng, len(campaigns), n_rows)])
+    drift = rng.random(n_rows)
+    campaign_names[drift < 0.05] = campaign_names[drift < 0.05].str.upper()
+    campaign_names[(drift >= 0.05) & (drift < 0.08)] = campaign_names[(drift >= 0.05) & (drift < 0.08)] + ' '
+    campaign_names[drift >= 0.99] = 'Archived Offer ' + numbers[drift >= 0.99]
+
+    offer_dates = (end - pd.to_timedelta(rng.integers(0, days, n_rows), unit='D')).strftime('%d-%m-%Y')
+    offer_dates = pd.Series(offer_dates, dtype=object)
+    offer_dates[rng.random(n_rows) < 0.005] = 'N/A'
+
+    # Metrics: clicks from a per-row CTR, revenue from a per-row EPC
+    sent = rng.integers(1_000, 200_000, n_rows)
+    clicks = rng.binomial(sent, rng.beta(2, 400, n_rows))
+    revenue = np.round(clicks * rng.gamma(2.0, 0.25, n_rows), 2)
+    return pd.DataFrame({
+        'offer_date': offer_dates,
+        'campaign_name': campaign_names,
+        'original_datafile': noisy,
+        'clicks': clicks,
+        'sent': sent,
+        'revenue': revenue,
+        'cpm': np.round(revenue / sent * 1000, 2),
+        'epc': np.round(revenue / np.maximum(clicks, 1), 3),
+    })
+
+
+def feed_bytes(frame: pd.DataFrame) -> bytes:
+    # The feeds' envelope: {"status": ..., "data": [row, ...]}, NaN as null
+    return b'{"status":"ok","data":' + frame.to_json(orient='records').encode() + b'}'
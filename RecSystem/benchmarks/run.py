@@ -0,0 +1,332 @@
+import argparse
+import functools
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent  # RecSystem/
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.generators import feed_bytes, generate_campaigns, generate_master, generate_report  # noqa: E402
+from benchmarks.stub_server import StubFeedServer  # noqa: E402
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Benchmark runner----------------
+# -----------------------------------------------------------------------------------------------------
+# 1. generates the master workbook and both feeds into a scratch directory
+# 2. serves the feeds from a stub server and writes a .env there pointing at it (the engine reads
+#    .env from the working directory), with its own cache_dir and auth database
+# 3. builds the data snapshot once, timing each pipeline stage
+# 4. calls each page scenario `--repeats` times with the result cache cleared (so the query runs),
+#    timing the query and the render, then once more to time a result cache hit
+# 5. writes a JSON report; with --baseline, prints the change against an earlier report
+# Stages nest (ingest includes fetch_report and match; build_data includes most of the others),
+# so stage times do not add up to the total.
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+
+class StageTimer:
+    """Replaces functions with timed wrappers; durations are collected per stage name."""
+
+    def __init__(self):
+        self.records = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.records[stage].append(seconds)
+
+    def wrap(self, owner, attr, stage=None):
+        fn = getattr(owner, attr)
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            name = stage(*args, **kwargs) if callable(stage) else (stage or attr)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - started)
+        setattr(owner, attr, timed)
+
+    def take(self) -> dict:
+        # Seconds per stage since the last take (summed over calls)
+        with self._lock:
+            totals = {stage: round(sum(values), 6) for stage, values in self.records.items()}
+            self.records.clear()
+        return totals
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time the analytics pages against generated data.")
+    parser.add_argument('--rows', type=int, default=100_000, help="Report rows (default 100000).")
+    parser.add_argument('--campaigns', type=int, default=500, help="Campaigns in the campaign feed.")
+    parser.add_argument('--files', type=int, default=2_000, help="Datafiles in the master workbook.")
+    parser.add_argument('--days', type=int, default=365, help="Days of report history.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=5, help="Timed calls per page scenario.")
+    parser.add_argument('--backend', choices=['pandas', 'sqlite'], default='pandas', help="query_backend.")
+    parser.add_argument('--published', action='store_true',
+                        help="Publish with refresh_data first, so the snapshot loads the published version.")
+    parser.add_argument('--out', type=Path, help="Report path (default benchmarks/results/<time>-<rows>rows.json).")
+    parser.add_argument('--baseline', type=Path, help="Earlier report to compare against.")
+    parser.add_argument('--workdir', type=Path, help="Scratch directory (default: a temporary one, removed after).")
+    return parser.parse_args(argv)
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def generate(args, workdir: Path):
+    master = generate_master(args.files, seed=args.seed)
+    campaigns = generate_campaigns(args.campaigns, seed=args.seed)
+    report = generate_report(args.rows, master, campaigns, seed=args.seed, days=args.days)
+    master.to_excel(workdir / 'master.xlsx', index=False)
+    return master, campaigns, report
+
+
+def setup_django(workdir: Path, env: dict):
+    with open(workdir / '.env', 'w', encoding='utf-8') as f:
+        for key, value in env.items():
+            f.write(f'{key} = "{value}"\n')
+    os.chdir(workdir)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RecSystem.settings')
+
+    import django
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = workdir / 'db.sqlite3'
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def instrument(views, pipeline, queries, timer: StageTimer, errors: list):
+    timer.wrap(pipeline.feed_client, 'get_frame', lambda *a, **k: f"fetch_{k.get('name', 'feed')}")
+    timer.wrap(pipeline.report_ingestor, 'refresh', 'ingest')
+    timer.wrap(pipeline.dataset_store, 'load', 'load_published')
+    timer.wrap(pipeline.fact_store, 'sync', 'fact_store_sync')
+    timer.wrap(pipeline.rollup_store, 'update', 'rollups')
+    for attr, stage in [
+        ('load_master', 'load_master'), ('fuzzy_match_datafiles', 'match'), ('build_enriched', 'build_enriched'),
+        ('add_aggregates', 'add_aggregates'), ('compact_frames', 'compact_frames'), ('UsageIndex', 'usage_index'),
+        ('build_data', 'build_data'),
+    ]:
+        timer.wrap(pipeline, attr, stage)
+    for attr in ('query_recommendations', 'query_unused', 'query_best_files', 'query_top_offers', 'query_file_top_offers',
+                 'query_season'):
+        timer.wrap(queries, attr, 'query')
+
+    render = views.render
+
+    def checked_render(request, template, context=None, *args, **kwargs):
+        # A page that rendered its error message did not do the work being timed
+        if context and context.get('error'):
+            errors.append(f"{template}: {context['error']}")
+        return render(request, template, context, *args, **kwargs)
+    views.render = checked_render
+    timer.wrap(views, 'render', 'render')
+
+
+def scenarios(campaigns, report):
+    # A campaign and a sponsor that actually occur in the report
+    busiest = report['campaign_name'].value_counts().index[0]
+    row = campaigns[campaigns['campaign_name'] == busiest].iloc[0]
+    campaign_id, sponsor = str(row['campaign_id']), row['sponsor']
+    return [
+        ('recommendations', 'recommendations', 'get', {}),
+        ('recommendations_engagement', 'recommendations', 'post',
+         {'sort_by': 'epc', 'min_engagement': '50', 'limit': '20'}),
+        ('recommendations_search', 'recommendations', 'post', {'campaign_name': 'offer 10', 'sort_by': 'performance'}),
+        ('unuse_DS', 'unuse_DS', 'post', {'campaign_id': campaign_id, 'days_slider': '30'}),
+        ('unuse_DS_isp', 'unuse_DS', 'post', {'campaign_id': campaign_id, 'isp_selected': 'Gmail', 'days_slider': '90'}),
+        ('best_files', 'best_files_view', 'get', {}),
+        ('best_files_filtered', 'best_files_view', 'get', {'sponsor': sponsor, 'isp': 'Gmail', 'exclude_days': '30'}),
+        ('top_offers', 'top_offers', 'get', {}),
+        ('top_offers_filtered', 'top_offers', 'get', {'sponsor': sponsor, 'isp': 'Gmail', 'sort_by': 'epc'}),
+        ('file_top_offers', 'file_top_offers', 'get', {}),
+        ('season_performance', 'season_performance', 'get', {}),
+        ('season_performance_weekly', 'season_performance', 'get', {'grain': 'week', 'metric': 'epc', 'sponsor': sponsor}),
+    ]
+
+
+def run_scenario(views, timer, errors, view_name, method, params, repeats):
+    from asgiref.sync import async_to_sync
+    from django.test import RequestFactory
+
+    # The pages are async views; each call runs in its own event loop, like a WSGI request
+    view = async_to_sync(getattr(views, view_name))
+    factory = RequestFactory()
+    path = f'/{view_name}/'
+
+    def call():
+        request = getattr(factory, method)(path, params)
+        started = time.perf_counter()
+        view(request)
+        return time.perf_counter() - started
+
+    totals, stages = [], defaultdict(list)
+    error_count = len(errors)
+    for _ in range(repeats):
+        views.result_cache.clear()
+        timer.take()
+        totals.append(call())
+        for stage, seconds in timer.take().items():
+            stages[stage].append(seconds)
+    cached = call()
+    timer.take()
+    return {
+        'view': view_name,
+        'method': method.upper(),
+        'params': params,
+        'seconds': {
+            'median': round(statistics.median(totals), 6),
+            'min': round(min(totals), 6),
+            'max': round(max(totals), 6),
+        },
+        'stages': {stage: round(statistics.median(values), 6) for stage, values in stages.items()},
+        'cached_seconds': round(cached, 6),
+        'errors': sorted(set(errors[error_count:])),
+    }
+
+
+def compare(baseline: dict, current: dict) -> list:
+    """Lines comparing two reports: snapshot build and scenario medians, baseline -> current."""
+    def line(name, old, new):
+        if old is None or new is None:
+            return f'  {name:<32} {"-" if old is None else f"{old:9.4f}s"} -> {"-" if new is None else f"{new:9.4f}s"}'
+        ratio = new / old if old else float('inf')
+        return f'  {name:<32} {old:9.4f}s -> {new:9.4f}s  x{ratio:.2f}'
+
+    lines = [f"baseline {baseline['meta'].get('git_commit')} ({baseline['meta']['rows']} rows) -> "
+             f"current {current['meta'].get('git_commit')} ({current['meta']['rows']} rows)"]
+    lines.append(line('snapshot', baseline['snapshot']['seconds'], current['snapshot']['seconds']))
+    stages = dict.fromkeys([*baseline['snapshot']['stages'], *current['snapshot']['stages']])
+    for stage in stages:
+        lines.append(line(f'  {stage}', baseline['snapshot']['stages'].get(stage),
+                          current['snapshot']['stages'].get(stage)))
+    for name in dict.fromkeys([*baseline['scenarios'], *current['scenarios']]):
+        old = baseline['scenarios'].get(name, {}).get('seconds', {}).get('median')
+        new = current['scenarios'].get(name, {}).get('seconds', {}).get('median')
+        lines.append(line(name, old, new))
+    return lines
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix='recsystem-bench-'))
+    workdir.mkdir(parents=True, exist_ok=True)
+    workdir = workdir.resolve()
+    out = (args.out or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{args.rows}rows.json").resolve()
+    cwd = os.getcwd()
+
+    try:
+        log(f'Generating {args.rows} report rows, {args.campaigns} campaigns, {args.files} datafiles in {workdir}')
+        started = time.perf_counter()
+        master, campaigns, report = generate(args, workdir)
+        routes = {'/report': feed_bytes(report), '/campaigns': feed_bytes(campaigns)}
+        generate_seconds = time.perf_counter() - started
+
+        with StubFeedServer(routes) as server:
+            setup_django(workdir, {
+                'report_url': server.url('/report'),
+                'campaign_url': server.url('/campaigns'),
+                'master_path': workdir / 'master.xlsx',
+                'cache_dir': workdir / 'cache',
+                'query_backend': args.backend,
+                'snapshot_ttl': 0,
+            })
+            from MyApp import views
+            from MyApp.engine import pipeline, queries
+
+            timer, errors = StageTimer(), []
+            instrument(views, pipeline, queries, timer, errors)
+
+            if args.published:
+                from django.core.management import call_command
+                log('Publishing with refresh_data')
+                started = time.perf_counter()
+                call_command('refresh_data')
+                publish_seconds = time.perf_counter() - started
+                publish_stages = timer.take()
+
+            log('Building the data snapshot')
+            started = time.perf_counter()
+            pipeline.data_snapshot.get()
+            snapshot = {'seconds': round(time.perf_counter() - started, 6), 'stages': timer.take()}
+            if args.published:
+                snapshot['publish'] = {'seconds': round(publish_seconds, 6), 'stages': publish_stages}
+
+            results = {}
+            for name, view_name, method, params in scenarios(campaigns, report):
+                log(f'Timing {name}')
+                results[name] = run_scenario(views, timer, errors, view_name, method, params, args.repeats)
+
+        import numpy
+        import pandas
+        report_json = {
+            'meta': {
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'git_commit': git_commit(),
+                'python': platform.python_version(),
+                'pandas': pandas.__version__,
+                'numpy': numpy.__version__,
+                'cpus': os.cpu_count(),
+                'rows': args.rows,
+                'campaigns': args.campaigns,
+                'files': args.files,
+                'days': args.days,
+                'seed': args.seed,
+                'repeats': args.repeats,
+                'query_backend': args.backend,
+                'published': args.published,
+                'feed_bytes': {path: len(body) for path, body in routes.items()},
+            },
+            'generate_seconds': round(generate_seconds, 6),
+            'snapshot': snapshot,
+            'scenarios': results,
+        }
+    finally:
+        os.chdir(cwd)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report_json, f, indent=2, default=str)
+    log(f'Report written to {out}')
+
+    print(f"snapshot {snapshot['seconds']:.3f}s")
+    for name, result in results.items():
+        flag = '  ERRORS: ' + '; '.join(result['errors']) if result['errors'] else ''
+        print(f"{name:<32} median {result['seconds']['median']:.4f}s  cached {result['cached_seconds']:.4f}s{flag}")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            print('\n'.join(compare(json.load(f), report_json)))
+    return report_json
+
+
+if __name__ == '__main__':
+    main()
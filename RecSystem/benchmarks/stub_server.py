@@ -0,0 +1,62 @@
+import gzip
+import http.server
+import threading
+from urllib.parse import urlsplit
+
+
+# -----------------------------------------------------------------------------------------------------
+#--------------Stub feed server----------------
+# -----------------------------------------------------------------------------------------------------
+# Serves fixed payloads on 127.0.0.1 so the pages fetch generated feeds over real HTTP. Bodies are
+# gzipped once up front and sent compressed when the client accepts gzip, like the real endpoints.
+# Query strings are ignored: a dated refresh gets the full feed, which the ingestor diffs.
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        payload = self.server.routes.get(urlsplit(self.path).path)
+        if payload is None:
+            self.send_error(404)
+            return
+        raw, compressed = payload
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        body = compressed if use_gzip else raw
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubFeedServer:
+    """`with StubFeedServer({'/report': body, ...}) as server:` then server.url('/report')."""
+
+    def __init__(self, routes: dict, port: int = 0):
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        self._server.daemon_threads = True
+        self._server.routes = {path: (body, gzip.compress(body, compresslevel=5)) for path, body in routes.items()}
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def url(self, path: str) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}{path}'
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()